@@ -0,0 +1,61 @@
+""" Times the queries of the evaluation history of cli/history.py on a large store.
+
+Run from the root of the repository:
+    python benchmarks/history_benchmark.py [runs] [utterances_per_run]
+"""
+
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import sys
+
+sys.path.insert(0, '.')
+
+from cli.history import EvaluationHistory
+
+WORDS = ['custom', 'speech', 'model', 'watson', 'training', 'corpus', 'acoustic', 'language', 'the', 'a']
+
+def make_results(text: str, confidence: float) -> dict:
+    return {'result_index': 0,
+            'results': [{'final': True,
+                         'alternatives': [{'transcript': text,
+                                           'confidence': confidence,
+                                           'word_confidence': [[word, confidence] for word in text.split()]}]}]}
+
+def main(runs=200, utterances=1000):
+    random = Random(0)
+    references = {f"utterance-{i}.wav": " ".join(random.choice(WORDS) for _ in range(12)) for i in range(utterances)}
+
+    with TemporaryDirectory() as directory:
+        history = EvaluationHistory(f"{directory}/history.sqlite3")
+
+        start = perf_counter()
+        for run in range(runs):
+            evaluations = []
+
+            for utterance, reference in references.items():
+                # every run gets a few words of every utterance wrong
+                words = reference.split()
+                for _ in range(random.randint(0, 3)):
+                    words[random.randrange(len(words))] = random.choice(WORDS)
+
+                evaluations.append((utterance, make_results(" ".join(words), random.random())))
+
+            last = history.record(f"model-{run % 10}", evaluations, references=references)
+
+        print(f"Recorded {runs} runs of {utterances} utterances in {perf_counter() - start:.1f}s")
+
+        for name, query in (("previous best", lambda: history.best(before=last)),
+                            ("compare with the previous best", lambda: history.compare(last)),
+                            ("history of an utterance", lambda: history.utterance("utterance-42.wav")),
+                            ("runs of a model", lambda: history.runs(customization_id="model-3"))):
+            start = perf_counter()
+            for _ in range(10):
+                query()
+
+            print(f"{name:<32} {(perf_counter() - start) * 100:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,76 @@
+""" Load-tests the concurrency paths of the client offline with the ReplayTransport of cli/transport.py.
+
+Every transcription is answered from a fixture with a long tailed latency, and a share of the requests
+is throttled or fails. The batch is run with more and more workers, with and without hedging.
+
+Run from the root of the repository:
+    python benchmarks/load_simulation.py [fixtures.jsonl]
+
+Without a fixture file (recorded with mode = record in the [TRANSPORT] section of keys/conf.ini),
+synthetic recognitions are used.
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+import json
+import sys
+
+sys.path.insert(0, '.')
+
+from cli.batch import evaluate
+from cli.hedge import HedgedTranscriber
+from cli.scheduler import RequestScheduler
+from cli.transport import ReplayTransport, lognormal
+
+FILES = 64
+
+def make_replay(fixtures, directory):
+    """ The replay transport and the audio files the interactions were recorded with """
+
+    replay = ReplayTransport(fixtures, latency=lognormal(0.05, 0.8), throttle_rate=0.05, failure_rate=0.02,
+                             retry_after=0.1, max_concurrent=16, seed=0)
+    audio_files = []
+
+    for index in range(FILES):
+        audio = Path(directory) / f"audio{index}.wav"
+        audio.write_bytes(b"RIFF%d" % index)
+        audio_files.append(str(audio))
+
+        if fixtures is None:
+            body = {'result_index': 0, 'results': [{'final': True, 'alternatives': [{'transcript': f"file {index} "}]}]}
+            replay.add({'request': {'method': 'post', 'path': '/v1/recognize', 'params': [], 'body': None},
+                        'status_code': 200, 'headers': {}, 'body': json.dumps(body), 'elapsed': 0.0})
+
+    return replay, audio_files
+
+
+def run(fixtures, workers, hedge):
+    with TemporaryDirectory() as directory:
+        replay, audio_files = make_replay(fixtures, directory)
+        RequestScheduler._shared = RequestScheduler(rate=200, max_retries=10, backoff=0.05, transport=replay)
+        transcriber = HedgedTranscriber(url="http://replay", initial_delay=0.15) if hedge else None
+
+        start = perf_counter()
+        failed = sum(error is not None for *_, error in evaluate("http://replay", audio_files, ["1234"],
+                                                                 pool=transcriber, workers=workers))
+        elapsed = perf_counter() - start
+
+        if transcriber is not None:
+            transcriber.close()
+
+    stats = replay.stats()
+    print(f"{workers:>3} workers{' + hedge' if hedge else '':<8} {elapsed:8.2f} s  "
+          f"{stats['requests']:>4} requests  {stats['throttled']:>3} throttled  {stats['failed']:>3} failed  "
+          f"{failed} transcriptions lost")
+
+
+if __name__ == "__main__":
+    fixtures = sys.argv[1] if len(sys.argv) > 1 else None
+
+    print(f"{FILES} transcriptions, lognormal latency (median 50 ms), 5% throttled, 2% failed, 16 concurrent at most")
+    for workers in (1, 4, 16, 32):
+        run(fixtures, workers, hedge=False)
+
+    run(fixtures, 16, hedge=True)
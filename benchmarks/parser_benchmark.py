@@ -0,0 +1,81 @@
+""" Compares json.loads with the streaming parser of cli/response_parser.py on large recognition responses.
+
+Run from the root of the repository:
+    python benchmarks/parser_benchmark.py [size_in_mb]
+"""
+
+from random import Random
+from time import perf_counter
+
+import json
+import sys
+import tracemalloc
+
+sys.path.insert(0, '.')
+
+from cli.response_parser import iter_results
+
+WORDS = ['custom', 'speech', 'model', 'watson', 'training', 'corpus', 'acoustic', 'language', 'the', 'a']
+
+def make_response(size_mb: float) -> bytes:
+    """ A response with timestamps, word confidences and word alternatives of roughly size_mb megabytes """
+
+    random = Random(0)
+    results = []
+    size = 0
+    start = 0.0
+
+    while size < size_mb * 1024 * 1024:
+        words = [random.choice(WORDS) for _ in range(20)]
+        timestamps = []
+
+        for word in words:
+            timestamps.append([word, round(start, 2), round(start + 0.3, 2)])
+            start += 0.3
+
+        result = {'final': True,
+                  'alternatives': [{'transcript': " ".join(words) + " ",
+                                    'confidence': round(random.random(), 3),
+                                    'timestamps': timestamps,
+                                    'word_confidence': [[word, round(random.random(), 3)] for word in words]}],
+                  'word_alternatives': [{'start_time': timestamp[1],
+                                         'end_time': timestamp[2],
+                                         'alternatives': [{'word': random.choice(WORDS), 'confidence': round(random.random(), 3)}
+                                                          for _ in range(3)]} for timestamp in timestamps]}
+
+        results.append(result)
+        size += len(json.dumps(result))
+
+    return json.dumps({'result_index': 0, 'results': results}).encode('utf-8')
+
+
+def measure(name, function):
+    tracemalloc.start()
+    start = perf_counter()
+
+    function()
+
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<40} {elapsed:8.3f} s {peak / 1024 / 1024:10.1f} MB peak")
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 8
+    body = make_response(size_mb)
+    chunks = [body[i:i + 65536] for i in range(0, len(body), 65536)]
+
+    print(f"Response of {len(body) / 1024 / 1024:.1f} MB ({len(chunks)} chunks of 64 KB)")
+
+    # the transcripts are kept, as a caller would
+    measure("json.loads(response.text)", lambda: [result['alternatives'][0]['transcript']
+                                                  for result in json.loads(body.decode('utf-8'))['results']])
+    measure("iter_results(chunks)", lambda: [result['alternatives'][0]['transcript']
+                                             for result in iter_results(chunks)])
+    measure("iter_results(chunks, fields=...)", lambda: list(iter_results(chunks, fields=('transcript', 'confidence'))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from configparser import ConfigParser
+from pathlib import Path
+
+import json
+import tarfile
+import zlib
+
+from progress.spinner import PixelSpinner
+
+from cli.deadline import DEFAULT_TIMEOUT, Cancelled, Deadline
+from cli.scheduler import RequestScheduler
+from cli.status_watcher import StatusWatcher
+from cli.stt import AUDIO_SUFFIXES
+
+# the STT API accepts audio resources of at most 100 MB
+MAX_RESOURCE_SIZE = 100 * 1024 * 1024
+
+class AudioArchive(object):
+    """ A gzipped tar archive of recordings, built while it is uploaded.
+
+    Iterating over the archive yields its compressed bytes: every recording is read, wrapped in tar
+    headers and compressed a chunk at a time, so neither the archive nor a whole recording is ever
+    held in memory. Every iteration builds the archive again, which lets a failed upload be retried.
+
+    Attributes:
+        paths: list of the paths of the recordings, all of the same audio type
+        chunk_size: number of bytes read from a recording at a time
+    """
+
+    def __init__(self, paths, chunk_size=65536):
+        self.paths = [Path(path) for path in paths]
+        self.chunk_size = chunk_size
+
+        if len(self.paths) == 0:
+            raise ValueError("An archive needs at least one recording")
+
+        suffixes = {path.suffix.lower() for path in self.paths}
+        if len(suffixes) != 1:
+            raise ValueError("The recordings of an archive must all be of the same audio type")
+
+    @property
+    def content_type(self) -> str:
+        """ The type of the recordings, sent as the 'Contained-Content-Type' of the archive """
+
+        return f"audio/{self.paths[0].suffix.lower().replace('.', '')}"
+
+    def size(self) -> int:
+        """ The size of the recordings, before compression """
+
+        return sum(path.stat().st_size for path in self.paths)
+
+    def __iter__(self):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # 31: with a gzip header
+        written = 0
+
+        def compress(data):
+            compressed = compressor.compress(data)
+            return [compressed] if compressed else []
+
+        for path in self.paths:
+            info = tarfile.TarInfo(path.name)
+            stat = path.stat()
+            info.size = stat.st_size
+            info.mtime = int(stat.st_mtime)
+
+            header = info.tobuf(format=tarfile.PAX_FORMAT)
+            written += len(header)
+            yield from compress(header)
+
+            with open(path, 'rb') as recording:
+                while True:
+                    chunk = recording.read(self.chunk_size)
+                    if not chunk:
+                        break
+
+                    written += len(chunk)
+                    yield from compress(chunk)
+
+            padding = -info.size % tarfile.BLOCKSIZE
+            written += padding
+            yield from compress(b"\0" * padding)
+
+        # two empty blocks end the archive, which is padded to a whole record
+        end = 2 * tarfile.BLOCKSIZE
+        end += -(written + end) % tarfile.RECORDSIZE
+        yield from compress(b"\0" * end)
+
+        yield compressor.flush()
+
+
+def archives(paths, max_size=MAX_RESOURCE_SIZE, prefix="audio") -> dict:
+    """ Groups the recordings into archives of at most max_size bytes of audio.
+
+    Args:
+        paths: paths of the recordings, or of directories holding them. Only the audio files of a directory are taken
+        max_size: maximum size of the recordings of an archive
+        prefix: prefix of the names of the archives
+
+    Returns:
+        a dictionary of the name of every audio resource and its AudioArchive
+
+    Raises:
+        ValueError: a recording is larger than max_size on its own, and would be rejected once uploaded
+    """
+
+    recordings = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            recordings.extend(sorted(child for child in path.iterdir()
+                                     if child.is_file() and child.suffix.lower() in AUDIO_SUFFIXES))
+        elif path.is_file():
+            recordings.append(path)
+        else:
+            raise FileExistsError(f"Cannot find the recordings {path}")
+
+    for recording in recordings:
+        if recording.stat().st_size > max_size:
+            raise ValueError(f"The recording {recording} is larger than the {max_size} bytes of an audio resource")
+
+    groups = {}
+    for recording in recordings:
+        # recordings of different types go to different archives
+        groups.setdefault(recording.suffix.lower(), []).append(recording)
+
+    resources = {}
+    for suffix, group in groups.items():
+        batch, size = [], 0
+
+        for recording in group:
+            if batch and size + recording.stat().st_size > max_size:
+                resources[f"{prefix}-{len(resources) + 1}"] = AudioArchive(batch)
+                batch, size = [], 0
+
+            batch.append(recording)
+            size += recording.stat().st_size
+
+        resources[f"{prefix}-{len(resources) + 1}"] = AudioArchive(batch)
+
+    return resources
+
+
+class WatsonAcousticSTT(object):
+    """ The wrapper class around the acoustic customization endpoints of the IBM Watson STT API.
+
+    Acoustic models adapt the base model to the acoustic conditions of the audio (accents, noise,
+    channel), from audio resources instead of corpora.
+
+    Attributes:
+        API_KEY: reads from the conf.ini file if not passed
+        url: url of the instance
+        customization_id: customization id of the acoustic model
+        status: the last status of the model
+        scheduler: the RequestScheduler every request is sent through
+        timeout: seconds a single request may wait on the socket
+        deadline: the Deadline shared by every step of the operation
+    """
+
+    ENDPOINT = 'acoustic_customizations'
+
+    def __init__(self, url, customization_id=None, scheduler=None, api_key=None, timeout=DEFAULT_TIMEOUT, deadline=None):
+        if api_key is None:
+            config = ConfigParser()
+            config.read('keys/conf.ini')
+            api_key = config['API_KEY']['WATSON_STT_API']
+
+        self.API_KEY = api_key
+
+        self.url = url
+        self.customization_id = customization_id
+        self.status = None
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler.shared()
+        self.timeout = timeout
+        self.deadline = deadline if deadline is not None else Deadline()
+
+    def _request(self, method, url, **kwargs):
+        return self.scheduler.request(method, url, timeout=self.timeout, deadline=self.deadline, **kwargs)
+
+    def _model_url(self) -> str:
+        if self.customization_id is None:
+            raise ValueError("No customization id provided!")
+
+        return f'{self.url}/v1/{self.ENDPOINT}/{self.customization_id}'
+
+    def create_model(self, name: str, descr: str, model="en-US_NarrowbandModel") -> str:
+        """Creates an acoustic model on top of the base model.
+
+        Args:
+            name: name of the model
+            descr: description of the model
+            model: the base model. Acoustic customization needs a previous generation model
+
+        Returns:
+            customization_id: a unique identifier for the model
+        """
+
+        if type(name) != str:
+            raise TypeError("The \'name\' of the model must be a \'str\'")
+
+        if type(descr) != str:
+            raise TypeError("The \'descr\' of the model must be a \'str\'")
+
+        response = self._request('post',
+                                 f'{self.url}/v1/{self.ENDPOINT}',
+                                 headers={'Content-Type': 'application/json'},
+                                 data=json.dumps({"name": name, "base_model_name": model, "description": descr}),
+                                 auth=('apikey', self.API_KEY))
+
+        if response.status_code == 201:
+            self.customization_id = json.loads(response.text)['customization_id']
+            self.status = 'pending'
+
+            print("Acoustic model created with id: ", self.customization_id)
+
+            return self.customization_id
+
+        else:
+            raise Exception(response.text)
+
+    def add_audio(self, name: str, audio) -> None:
+        """ Adds an audio resource to the model: a single recording or an AudioArchive.
+
+        Args:
+            name: name of the audio resource
+            audio: path of a recording or an AudioArchive, streamed to the API
+        """
+
+        if isinstance(audio, AudioArchive):
+            headers = {'Content-Type': 'application/gzip', 'Contained-Content-Type': audio.content_type}
+            data = audio
+        else:
+            path = Path(audio)
+            if not path.is_file():
+                raise FileExistsError("The path of the audio is invalid")
+
+            headers = {'Content-Type': f"audio/{path.suffix.lower().replace('.', '')}"}
+            data = path.read_bytes()
+
+        # the resource is overwritten, so uploading it twice is safe
+        response = self._request('post',
+                                 f'{self._model_url()}/audio/{name}',
+                                 idempotent=True,
+                                 headers=headers,
+                                 data=data,
+                                 params=(('allow_overwrite', 'true'),),
+                                 auth=('apikey', self.API_KEY))
+
+        if response.status_code != 201:
+            raise Exception(response.text)
+
+    def add_audio_resources(self, resources: dict, workers=4, callback=None) -> dict:
+        """ Uploads several audio resources at the same time.
+
+        Args:
+            resources: dictionary of the name of every resource and its path or AudioArchive
+            workers: number of uploads running at the same time
+            callback: optional function called with the name of every resource and the error of its upload, if any
+
+        Returns:
+            a dictionary of the name of every resource that failed to upload and its error
+        """
+
+        errors = {}
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.add_audio, name, audio): name for name, audio in resources.items()}
+
+            try:
+                for future in as_completed(futures):
+                    name = futures[future]
+                    error = future.exception()
+
+                    if isinstance(error, Cancelled):
+                        raise error
+
+                    if error is not None:
+                        errors[name] = error
+
+                    if callback is not None:
+                        callback(name, error)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        return errors
+
+    def audio_status(self) -> dict:
+        """ The processing status of every audio resource of the model
+
+        Returns:
+            a dictionary of the name of every resource and its status ('ok', 'being_processed' or 'invalid')
+        """
+
+        response = self._request('get', f'{self._model_url()}/audio', auth=('apikey', self.API_KEY))
+
+        if response.status_code == 200:
+            return {resource['name']: resource['status'] for resource in json.loads(response.text).get('audio', [])}
+
+        else:
+            raise Exception(response.text)
+
+    def wait_for_audio(self, names=None, interval=5.0) -> dict:
+        """ Waits until the API has processed the audio resources.
+
+        Args:
+            names: the names of the resources to wait for, every resource of the model by default
+            interval: seconds between two checks
+
+        Returns:
+            a dictionary of the name of every resource and its final status ('ok' or 'invalid')
+        """
+
+        with PixelSpinner("Processing the audio resources ") as bar:
+            while True:
+                statuses = self.audio_status()
+
+                if names is not None:
+                    statuses = {name: statuses.get(name, 'being_processed') for name in names}
+
+                if all(status != 'being_processed' for status in statuses.values()):
+                    return statuses
+
+                self.deadline.sleep(interval)
+                bar.next()
+
+    def model_status(self) -> str:
+        response = self._request('get', self._model_url(), auth=('apikey', self.API_KEY))
+
+        if response.status_code == 200:
+            return json.loads(response.text)['status']
+
+        else:
+            raise Exception(response.text)
+
+    def training(self, custom_language_model_id=None, watcher=None):
+        """Trains the acoustic model once its audio resources are processed.
+
+        Args:
+            custom_language_model_id: optional language model trained along, whose words help the acoustic training
+            watcher: the StatusWatcher tracking the model. Defaults to the watcher of the acoustic models of the instance
+
+        Returns:
+            the response of the API
+        """
+
+        if watcher is None:
+            watcher = StatusWatcher.for_instance(self.url, self.API_KEY, endpoint=self.ENDPOINT, scheduler=self.scheduler)
+
+        self.status = self._wait(watcher, "Allocating resources to begin training ", 'ready')
+
+        params = (('custom_language_model_id', custom_language_model_id),) if custom_language_model_id else ()
+        response = self._request('post', f'{self._model_url()}/train', params=params, auth=('apikey', self.API_KEY))
+
+        if response.status_code == 200:
+            print("Training Beginning")
+
+            self.status = self._wait(watcher, "Training the acoustic model ", 'available')
+
+            print("Training has finished")
+
+            return json.loads(response.text)
+
+        else:
+            raise Exception(response.text)
+
+    def _wait(self, watcher, message, *targets) -> str:
+        """ Spins until the watcher sees the model in one of the target states """
+
+        status = watcher.watch(self.customization_id, targets=targets)
+
+        try:
+            with PixelSpinner(message) as bar:
+                while not status.done():
+                    self.deadline.sleep(0.1)
+                    bar.next()
+        except (Cancelled, KeyboardInterrupt):
+            status.cancel()
+            raise
+
+        return status.result()
+
+    def delete_model(self) -> bool:
+        """ Deletes the acoustic model
+
+        Returns:
+            True once the model is deleted
+        """
+
+        response = self._request('delete', self._model_url(), auth=('apikey', self.API_KEY))
+
+        if response.status_code in (200, 204, 404):
+            print(f"Acoustic model {self.customization_id} Succesfully Deleted")
+            return True
+
+        else:
+            raise Exception(response.text)
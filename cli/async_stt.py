@@ -0,0 +1,317 @@
+from base64 import b64encode
+from configparser import ConfigParser
+from pathlib import Path
+from random import uniform
+
+import asyncio
+import json
+
+import aiohttp
+
+from cli.scheduler import RequestScheduler
+from cli.transcript import Transcript
+
+class AsyncWatsonSTT(object):
+    """ The asyncio counterpart of WatsonSTT.
+
+    Every instance owns a pooled aiohttp session, so thousands of transcriptions can run
+    concurrently on a single event loop. Use it as an async context manager to close the session:
+
+        async with AsyncWatsonSTT(url, customization_id) as stt:
+            results = await stt.transcribe('audio.wav')
+
+    Attributes:
+        url: url of the instance
+        customization_id: customization id of the model
+        status: the last status of the model seen by the client
+        limit: maximum number of simultaneous connections to the instance
+        max_retries: maximum number of retries of a throttled or failed request
+    """
+
+    def __init__(self, url, customization_id=None, api_key=None, limit=100, max_retries=5, session=None):
+        """ Inits the class variables.
+        Args:
+        url: url of the STT instance
+        customization_id: id of the model
+        api_key: the API key of the instance. Read from the conf.ini file if not passed
+        limit: size of the connection pool
+        max_retries: maximum number of retries of a request
+        session: an aiohttp.ClientSession to share between clients
+        """
+
+        if api_key is None:
+            config = ConfigParser()
+            config.read('keys/conf.ini')
+            api_key = config['API_KEY']['WATSON_STT_API']
+
+        self.url = url
+        self.customization_id = customization_id
+        self.status = None
+        self.limit = limit
+        self.max_retries = max_retries
+
+        credentials = b64encode(f'apikey:{api_key}'.encode('utf-8')).decode('ascii')
+        self._authorization = f'Basic {credentials}'
+        self._session = session
+        self._owns_session = session is None
+
+    async def __aenter__(self):
+        self._get_session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._owns_session = True
+
+        return self._session
+
+    async def close(self) -> None:
+        """ Closes the connection pool if the client created it """
+
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _request(self, method: str, path: str, idempotent=None, **kwargs) -> tuple:
+        """ Sends a request, retrying it when it was throttled or, for idempotent calls, when it failed.
+
+        Args:
+            method: http method
+            path: the path of the endpoint on the instance
+            idempotent: whether the request can be safely repeated
+            kwargs: passed to aiohttp
+
+        Returns:
+            (status, text) of the last response
+        """
+
+        method = method.lower()
+        if idempotent is None:
+            idempotent = method in RequestScheduler.IDEMPOTENT_METHODS
+
+        session = self._get_session()
+        kwargs['headers'] = dict(kwargs.get('headers') or {}, Authorization=self._authorization)
+
+        attempt = 0
+        while True:
+            try:
+                async with session.request(method, f"{self.url}{path}", **kwargs) as response:
+                    status = response.status
+                    text = await response.text()
+                    retry_after = RequestScheduler._retry_after(response)
+
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+
+                await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            retry = status == 429 or (status in RequestScheduler.RETRY_STATUS_CODES and idempotent)
+            if retry and attempt < self.max_retries:
+                await asyncio.sleep(retry_after if retry_after is not None else self._backoff(attempt))
+                attempt += 1
+                continue
+
+            return status, text
+
+    @staticmethod
+    def _backoff(attempt) -> float:
+        return uniform(0, min(30.0, 0.5 * (2 ** attempt)))
+
+    async def create_model(self, name: str, descr: str, model="en-US_ShortForm_NarrowbandModel") -> str:
+        """ Creates a model with the name and descr parameters on top of the base model.
+
+        Returns:
+            customization_id: a unique identifier for the model
+        """
+
+        if type(name) != str:
+            raise TypeError("The \'name\' of the model must be a \'str\'")
+
+        if type(descr) != str:
+            raise TypeError("The \'descr\' of the model must be a \'str\'")
+
+        data = {"name": name,
+                "base_model_name": model,
+                "description": descr}
+
+        status, text = await self._request('post', '/v1/customizations', json=data)
+
+        if status == 201:
+            response = json.loads(text)
+
+            if 'customization_id' not in response.keys():
+                raise Exception("The Watson STT request failed. Please try again.")
+
+            self.customization_id = response['customization_id']
+            self.status = 'pending'
+
+            return self.customization_id
+
+        else:
+            raise Exception(text)
+
+    async def add_corpus(self, corpus_path: str) -> None:
+        """ Adds corpus/grammar/oov to a model. A customization id is required. """
+
+        if type(corpus_path) != str:
+            raise TypeError("The path must be a string")
+
+        path = Path(corpus_path)
+        if not path.exists() and not path.is_file():
+            raise FileExistsError("The path of the file is invalid")
+
+        data = await asyncio.get_running_loop().run_in_executor(None, path.read_bytes)
+
+        status, text = await self._request('post',
+                                           f'/v1/customizations/{self.customization_id}/corpora/{path.stem}',
+                                           idempotent=True,
+                                           data=data,
+                                           params={'allow_overwrite': 'true'})
+
+        if status != 201:
+            raise Exception(text)
+
+    async def model_status(self) -> str:
+        """ Returns the status of the model """
+
+        if self.customization_id is None:
+            raise ValueError("Create a custom model first by calling the create_model method.")
+
+        status, text = await self._request('get', f'/v1/customizations/{self.customization_id}')
+
+        if status == 200:
+            self.status = json.loads(text)['status']
+            return self.status
+
+        else:
+            raise Exception(text)
+
+    async def wait_for_status(self, *targets, interval=1.0, timeout=None) -> str:
+        """ Waits until the model reaches one of the target states without blocking the event loop.
+
+        Args:
+            targets: the states to wait for (i.e. 'ready', 'available')
+            interval: seconds between two status checks
+            timeout: seconds after which asyncio.TimeoutError is raised, None to wait forever
+
+        Returns:
+            the status reached
+        """
+
+        async def poll():
+            while True:
+                status = await self.model_status()
+
+                if status in targets:
+                    return status
+
+                if status == 'failed':
+                    raise Exception(f"Model {self.customization_id} failed")
+
+                await asyncio.sleep(interval)
+
+        return await asyncio.wait_for(poll(), timeout)
+
+    async def training(self, interval=1.0, timeout=None) -> dict:
+        """ Waits for the model to be 'ready', trains it and waits until it is 'available' """
+
+        if self.customization_id is None:
+            raise ValueError("No customization id provided!")
+
+        await self.wait_for_status('ready', 'available', interval=interval, timeout=timeout)
+
+        status, text = await self._request('post', f'/v1/customizations/{self.customization_id}/train')
+
+        if status != 200:
+            raise Exception(text)
+
+        await self.wait_for_status('available', interval=interval, timeout=timeout)
+
+        return json.loads(text)
+
+    async def transcribe(self, path_to_audio_file, timestamps=False, word_confidence=False, parse=False):
+        """ Transcribes the audio file with the model.
+
+        Returns:
+            the json object of the transcription, or a Transcript when parse is set
+        """
+
+        path = Path(path_to_audio_file)
+        if not path.exists() and not path.is_file():
+            raise FileExistsError("The path of the audio is invalid")
+
+        audio_file = await asyncio.get_running_loop().run_in_executor(None, path.read_bytes)
+
+        params = {}
+        if self.customization_id is not None:
+            params['language_customization_id'] = self.customization_id
+
+        if timestamps:
+            params['timestamps'] = 'true'
+
+        if word_confidence:
+            params['word_confidence'] = 'true'
+
+        content_type = path.suffix.replace('.', '')
+        status, text = await self._request('post',
+                                           '/v1/recognize',
+                                           idempotent=True,
+                                           data=audio_file,
+                                           params=params,
+                                           headers={'Content-Type': f'audio/{content_type}'})
+
+        if status == 200:
+            response = json.loads(text)
+            return Transcript.from_response(response) if parse else response
+
+        else:
+            raise Exception(text)
+
+    async def all_model_status(self) -> dict:
+        """ Returns the states for ALL models created on the instance """
+
+        status, text = await self._request('get', '/v1/customizations')
+
+        if status == 200:
+            return json.loads(text)
+
+        else:
+            raise Exception(text)
+
+    async def delete_model(self, customization_id=None, interval=0.5, timeout=None) -> bool:
+        """ Deletes the model and waits until the instance no longer knows it.
+
+        Args:
+            customization_id: the model to delete, defaults to the model of the client
+        Returns:
+            True once the model is deleted
+        """
+
+        customization_id = customization_id or self.customization_id
+
+        status, text = await self._request('delete', f'/v1/customizations/{customization_id}')
+
+        if status != 200:
+            raise Exception(text)
+
+        async def deleted():
+            while True:
+                status, text = await self._request('get', f'/v1/customizations/{customization_id}')
+
+                # mirrors WatsonSTT.model_deletion_checker, plus 404 once the id is gone
+                if status in (200, 401, 404):
+                    return True
+
+                if status in (400, 500):
+                    raise Exception(text)
+
+                await asyncio.sleep(interval)
+
+        return await asyncio.wait_for(deleted(), timeout)
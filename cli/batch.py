@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+
+from cli.acoustic import WatsonAcousticSTT, archives
+from cli.deadline import Cancelled, Deadline, DeadlineExceeded
+from cli.stt import WatsonSTT
+
+def train_model(url, corpus_paths, name=None, descr=None, customization_id=None, journal=None, deadline=None) -> str:
+    """ Creates (or updates) a model, uploads the corpora and trains it.
+
+    Every step is recorded in the journal, so rerunning the job after a crash or a Ctrl-C does
+    not create a second model or upload the same corpus twice.
+
+    Args:
+        url: url of the instance
+        corpus_paths: list of paths of the corpora to upload
+        name: name of the model to create. Ignored when a customization_id is passed
+        descr: description of the model to create
+        customization_id: id of an existing model to update
+        journal: optional JobJournal of the job
+        deadline: optional Deadline shared by every step, from creating the model to the end of training
+
+    Returns:
+        customization_id: the id of the trained model
+    """
+
+    if customization_id is None and journal is not None and journal.is_done('create', name):
+        customization_id = journal.result('create', name)
+        print(f"Resuming job {journal.job_id} with model id: {customization_id}")
+
+    stt = WatsonSTT(url=url, customization_id=customization_id, deadline=deadline)
+
+    if customization_id is None:
+        customization_id = stt.create_model(name=name, descr=descr)
+
+        if journal is not None:
+            journal.record('create', name, result=customization_id)
+
+    for corpus_path in corpus_paths:
+        if journal is not None and journal.is_done('corpus', customization_id, corpus_path):
+            continue
+
+        stt.add_corpus(corpus_path)
+
+        if journal is not None:
+            journal.record('corpus', customization_id, corpus_path)
+
+    if journal is None or not journal.is_done('train', customization_id):
+        stt.training()
+
+        if journal is not None:
+            journal.record('train', customization_id)
+
+    return customization_id
+
+
+def train_acoustic_model(url, audio_paths, name=None, descr=None, customization_id=None, custom_language_model_id=None,
+                         workers=4, journal=None, deadline=None) -> str:
+    """ Creates (or updates) an acoustic model, uploads the recordings and trains it.
+
+    The recordings are grouped into archives built while they are uploaded, several at a time. The
+    model is trained once the API has processed every archive. Every step is recorded in the journal,
+    so rerunning the job does not create a second model or upload the same archive twice.
+
+    Args:
+        url: url of the instance
+        audio_paths: paths of the recordings, or of directories holding them
+        name: name of the model to create. Ignored when a customization_id is passed
+        descr: description of the model to create
+        customization_id: id of an existing acoustic model to update
+        custom_language_model_id: optional id of a language model used during the training
+        workers: number of archives uploaded at the same time
+        journal: optional JobJournal of the job
+        deadline: optional Deadline shared by every step
+
+    Returns:
+        customization_id: the id of the trained acoustic model
+    """
+
+    if customization_id is None and journal is not None and journal.is_done('acoustic_create', name):
+        customization_id = journal.result('acoustic_create', name)
+        print(f"Resuming job {journal.job_id} with acoustic model id: {customization_id}")
+
+    stt = WatsonAcousticSTT(url=url, customization_id=customization_id, deadline=deadline)
+
+    if customization_id is None:
+        customization_id = stt.create_model(name=name, descr=descr)
+
+        if journal is not None:
+            journal.record('acoustic_create', name, result=customization_id)
+
+    resources = archives(audio_paths)
+    pending = {name: archive for name, archive in resources.items()
+               if journal is None or not journal.is_done('audio', customization_id, name, *map(str, archive.paths))}
+
+    def uploaded(name, error):
+        if error is not None:
+            print(f"Uploading {name} failed: {error}")
+        else:
+            print(f"Uploaded {name}")
+
+            if journal is not None:
+                journal.record('audio', customization_id, name, *map(str, resources[name].paths))
+
+    print(f"Uploading {len(pending)} audio archives...")
+    errors = stt.add_audio_resources(pending, workers=workers, callback=uploaded)
+
+    if errors:
+        raise Exception(f"Could not upload the audio resources {', '.join(sorted(errors))}")
+
+    statuses = stt.wait_for_audio(names=list(resources))
+    invalid = sorted(name for name, status in statuses.items() if status == 'invalid')
+
+    if invalid:
+        raise Exception(f"The API could not process the audio resources {', '.join(invalid)}")
+
+    if journal is None or not journal.is_done('acoustic_train', customization_id):
+        stt.training(custom_language_model_id=custom_language_model_id)
+
+        if journal is not None:
+            journal.record('acoustic_train', customization_id)
+
+    return customization_id
+
+
+def evaluate(url, audio_files, customization_ids, journal=None, pool=None, workers=1, deadline=None):
+    """ Transcribes every audio file with every model.
+
+    Transcriptions already in the journal are returned without calling the API again. Failed
+    transcriptions are not journaled, so they are retried on the next run.
+
+    Args:
+        url: url of the instance. Ignored when a pool is passed
+        audio_files: list of paths of the audio files
+        customization_ids: list of the ids of the models
+        journal: optional JobJournal of the job
+        pool: optional InstancePool spreading the transcriptions over several instances, or
+            HedgedTranscriber hedging the slow ones
+        workers: number of transcriptions running at the same time
+        deadline: optional Deadline of the whole batch. When it expires, or when the batch is
+            interrupted, the queued transcriptions are dropped and the running ones stop at their next check
+
+    Yields:
+        (audio_file, customization_id, results, error) for every file and model, where results is the
+        json object of the transcription and error the exception raised, if any. With more than one
+        worker the transcriptions are yielded in the order they complete.
+    """
+
+    deadline = deadline if deadline is not None else Deadline()
+    # the batch is stopped on its own, without cancelling the other steps sharing the deadline
+    batch = deadline.child()
+
+    units = []
+    for customization_id in customization_ids:
+        for audio_file in audio_files:
+            if journal is not None and journal.is_done('evaluate', audio_file, customization_id):
+                yield audio_file, customization_id, journal.result('evaluate', audio_file, customization_id), None
+            else:
+                units.append((audio_file, customization_id))
+
+    def run(audio_file, customization_id):
+        batch.check()
+
+        try:
+            if pool is not None:
+                results = pool.transcribe(audio_file, customization_id, deadline=batch)
+            else:
+                results = WatsonSTT(url=url, customization_id=customization_id, deadline=batch).transcribe(audio_file)
+        except Cancelled:
+            raise
+        except Exception as e:
+            return audio_file, customization_id, None, e
+
+        if journal is not None:
+            journal.record('evaluate', audio_file, customization_id, result=results)
+
+        return audio_file, customization_id, results, None
+
+    if workers <= 1:
+        for unit in units:
+            yield run(*unit)
+
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [executor.submit(run, *unit) for unit in units]
+
+    try:
+        for future in as_completed(futures, timeout=batch.remaining()):
+            yield future.result()
+    except TimeoutError:
+        raise DeadlineExceeded(f"The operation did not complete within {batch.seconds} seconds")
+    finally:
+        # on Ctrl-C, an expired deadline or an early exit of the caller, stop the remaining work
+        if not all(future.done() for future in futures):
+            batch.cancel()
+
+            for future in futures:
+                future.cancel()
+
+        executor.shutdown(wait=False)
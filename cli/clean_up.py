@@ -4,14 +4,20 @@ from configparser import ConfigParser
 
 from cli.stt import WatsonSTT
 
-def clean_up(url, customization_ids):
+def clean_up(url, customization_ids, deadline=None, confirmed=False):
+    """ Deletes the models. Deleting 'all' asks for a confirmation, unless the caller already asked for it
+    (i.e. visual mode, where the deletion runs on a dashboard thread that cannot prompt) """
+
     config = ConfigParser()
     config.read('keys/conf.ini')
     api_key = config['API_KEY']['WATSON_STT_API']
 
     if customization_ids[0] == 'all':
-        confirmation = input('Are you sure you want to delete all of the trained models? (y/N): ')
-        confirmation = confirmation.strip().lower()
+        if confirmed:
+            confirmation = 'yes'
+        else:
+            confirmation = input('Are you sure you want to delete all of the trained models? (y/N): ')
+            confirmation = confirmation.strip().lower()
         
         if confirmation in ('y', 'yes'):
             models = WatsonSTT.all_model_status(url=url, api_key=api_key)
@@ -20,7 +26,7 @@ def clean_up(url, customization_ids):
                 
                 for model in tqdm(models, desc="Deleting All Models", leave=False):
                     _id = model['customization_id']
-                    WatsonSTT.delete_model(url, api_key, _id)
+                    WatsonSTT.delete_model(url, api_key, _id, deadline=deadline)
             else:
                 print("No models to delete.")
         
@@ -33,7 +39,7 @@ def clean_up(url, customization_ids):
 
     else:
         for ids in tqdm(customization_ids, desc="Deleting Customization Models", leave=False):
-            result = WatsonSTT.delete_model(url, api_key, customization_id=ids)
+            result = WatsonSTT.delete_model(url, api_key, customization_id=ids, deadline=deadline)
 
             if not result:
                 return
\ No newline at end of file
@@ -0,0 +1,379 @@
+from collections import OrderedDict
+from configparser import ConfigParser
+from hashlib import sha1
+from hmac import compare_digest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock, Thread
+from time import monotonic
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import json
+import os
+import re
+import secrets
+import socket
+
+# only the standard library is imported at the top, so delegating a command stays cheap.
+# The backend is imported by the server.
+
+DEFAULT_PORT = 8765
+TOKEN_PATH = '.daemon/token'
+
+def daemon_port() -> int:
+    """ Reads the port of the daemon from the optional [DAEMON] section of the conf.ini file """
+
+    config = ConfigParser()
+    config.read('keys/conf.ini')
+
+    if 'DAEMON' in config.sections():
+        return config['DAEMON'].getint('port', DEFAULT_PORT)
+
+    return DEFAULT_PORT
+
+
+def configured_urls(path='keys/conf.ini') -> list:
+    """ The urls of the instances of the conf.ini file: the [URL] section and the numbered [URL_2], [URL_3], ... """
+
+    config = ConfigParser()
+    config.read(path)
+
+    urls = [config[section].get('watson_stt_url') for section in config.sections()
+            if re.fullmatch(r'URL(_\d+)?', section)]
+
+    return [url.rstrip('/') for url in urls if url not in (None, 'None')]
+
+
+def write_token(path=TOKEN_PATH) -> str:
+    """ Creates a new random token the clients of the daemon must send, readable by the user only """
+
+    path = Path(path)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    token = secrets.token_hex(32)
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # the file may already exist with other permissions
+    os.chmod(path, 0o600)
+
+    with os.fdopen(descriptor, 'w') as f:
+        f.write(token)
+
+    return token
+
+
+def read_token(path=TOKEN_PATH) -> str:
+    """ The token of the running daemon, None if no daemon wrote one """
+
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+def send(command: dict, port=None, timeout=None, token=None):
+    """ Sends a command to the daemon.
+
+    Args:
+        command: the json command, i.e. {'command': 'models', 'url': url}
+        port: port of the daemon, read from conf.ini if not passed
+        timeout: seconds to wait for the answer, None to wait until the command finishes
+        token: the token of the daemon, read from its token file if not passed
+
+    Returns:
+        the json answer of the daemon, or None if no daemon is running
+    """
+
+    port = port if port is not None else daemon_port()
+    token = token if token is not None else read_token()
+
+    if token is None:
+        return None
+
+    request = Request(f"http://127.0.0.1:{port}/command",
+                      data=json.dumps(command).encode('utf-8'),
+                      headers={'Content-Type': 'application/json', 'X-Daemon-Token': token})
+
+    # fail fast when nothing listens on the port
+    try:
+        socket.create_connection(('127.0.0.1', port), timeout=0.05).close()
+    except OSError:
+        return None
+
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except HTTPError as e:
+        # the daemon answers failed commands with a 500 and the error in the body
+        return json.loads(e.read().decode('utf-8'))
+    except URLError:
+        return None
+
+
+class DaemonState(object):
+    """ The state kept warm between commands: the API key, the scheduler and its pooled session,
+    the model listings and the transcriptions. A transcription is cached per audio, model and
+    'updated' timestamp of the model, so retraining a model invalidates its transcriptions.
+
+    Attributes:
+        api_key: the API key read once from the conf.ini file
+        allowed_urls: the urls of the instances the daemon sends requests (and the API key) to
+        models_ttl: seconds a model listing is served from the cache
+        max_transcriptions: number of transcriptions kept in the cache
+    """
+
+    def __init__(self, models_ttl=30.0, max_transcriptions=1000, allowed_urls=None):
+        import requests
+        from cli.scheduler import RequestScheduler
+
+        config = ConfigParser()
+        config.read('keys/conf.ini')
+
+        self.api_key = config['API_KEY']['WATSON_STT_API']
+        self.allowed_urls = [url.rstrip('/') for url in allowed_urls] if allowed_urls is not None else configured_urls()
+        self.models_ttl = models_ttl
+        self.max_transcriptions = max_transcriptions
+
+        # every request of the daemon goes through its own scheduler, on the same keep-alive connections
+        self.scheduler = RequestScheduler.from_config(session=requests.Session())
+
+        self._models = {}
+        self._transcriptions = OrderedDict()
+        self._lock = Lock()
+
+    def check_url(self, url) -> None:
+        """ Raises a ValueError unless the url is one of the instances of conf.ini """
+
+        if url is None or str(url).rstrip('/') not in self.allowed_urls:
+            raise ValueError(f"{url} is not one of the instances of conf.ini")
+
+    def models(self, url) -> dict:
+        from cli.stt import WatsonSTT
+
+        with self._lock:
+            cached = self._models.get(url)
+
+        if cached is not None and monotonic() - cached[0] < self.models_ttl:
+            return cached[1]
+
+        models = WatsonSTT.all_model_status(url=url, api_key=self.api_key, scheduler=self.scheduler)
+
+        with self._lock:
+            self._models[url] = (monotonic(), models)
+
+        return models
+
+    def latest_model(self, url) -> str:
+        models = self.models(url).get('customizations', [])
+
+        if len(models) == 0:
+            raise ValueError("You do not have any trained models. Please create and train a model before evaluating.")
+
+        return max(models, key=lambda model: model['created'])['customization_id']
+
+    def updated(self, url, customization_id):
+        """ The 'updated' timestamp of the model in the listing, None if it is not listed """
+
+        for model in self.models(url).get('customizations', []):
+            if model['customization_id'] == customization_id:
+                return model.get('updated')
+
+        return None
+
+    def transcribe(self, url, audio_file, customization_id) -> dict:
+        from cli.stt import WatsonSTT
+
+        with open(audio_file, 'rb') as f:
+            digest = sha1(f.read()).hexdigest()
+
+        # a retrained model has a new 'updated' timestamp, so its transcriptions are not served from the cache
+        key = (url, digest, customization_id, self.updated(url, customization_id))
+        with self._lock:
+            if key in self._transcriptions:
+                self._transcriptions.move_to_end(key)
+                return self._transcriptions[key]
+
+        results = WatsonSTT(url=url, customization_id=customization_id, scheduler=self.scheduler).transcribe(audio_file)
+
+        with self._lock:
+            self._transcriptions[key] = results
+
+            while len(self._transcriptions) > self.max_transcriptions:
+                self._transcriptions.popitem(last=False)
+
+        return results
+
+    def forget(self, url, customization_ids) -> None:
+        """ Drops the cached listing and the transcriptions of deleted models """
+
+        with self._lock:
+            self._models.pop(url, None)
+
+            for key in [key for key in self._transcriptions if key[0] == url and key[2] in customization_ids]:
+                del self._transcriptions[key]
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip()
+        token = self.headers.get('X-Daemon-Token', '')
+
+        # a web page can post to 127.0.0.1, but not with a json body or a header of its own without a
+        # preflight the daemon never answers, and it cannot read the token file
+        if self.headers.get('Origin') is not None or not compare_digest(token.encode('utf-8'), self.server.token.encode('utf-8')):
+            answer, status = {'error': "Invalid token"}, 403
+        elif content_type != 'application/json':
+            answer, status = {'error': "Commands must be sent as application/json"}, 415
+        else:
+            try:
+                command = json.loads(self.rfile.read(length).decode('utf-8'))
+                answer = self.server.execute(command)
+                status = 200
+            except Exception as e:
+                answer = {'error': str(e)}
+                status = 500
+
+        body = json.dumps(answer).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class STTDaemon(ThreadingHTTPServer):
+    """ A local server executing CLI commands with a warm DaemonState.
+
+    The server only listens on 127.0.0.1. Commands are json objects with a 'command' key:
+    'ping', 'models', 'evaluate', 'delete' and 'shutdown'. They are only executed when posted as
+    application/json with the token of the daemon in the X-Daemon-Token header, and only for the
+    instances of conf.ini.
+
+    Attributes:
+        state: the DaemonState of the commands
+        token: the secret the clients read from the token file, only the user can read it
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=None, state=None, token=None):
+        super().__init__(('127.0.0.1', port if port is not None else daemon_port()), _Handler)
+        self.state = state if state is not None else DaemonState()
+        self.token = token if token is not None else write_token()
+
+    def execute(self, command: dict) -> dict:
+        from cli.stt import WatsonSTT
+
+        name = command.get('command')
+        url = command.get('url')
+
+        if name == 'ping':
+            return {'status': 'ok'}
+
+        if name in ('models', 'evaluate', 'delete'):
+            self.state.check_url(url)
+
+        if name == 'models':
+            return {'models': self.state.models(url)}
+
+        if name == 'evaluate':
+            customization_ids = [self.state.latest_model(url) if _id == 'latest' else _id
+                                 for _id in command['customization_ids']]
+
+            evaluations = []
+            for customization_id in customization_ids:
+                for audio_file in command['audio_files']:
+                    evaluation = {'audio_file': audio_file, 'customization_id': customization_id}
+
+                    try:
+                        evaluation['results'] = self.state.transcribe(url, audio_file, customization_id)
+                    except Exception as e:
+                        evaluation['error'] = str(e)
+
+                    evaluations.append(evaluation)
+
+            return {'evaluations': evaluations}
+
+        if name == 'delete':
+            deleted = [_id for _id in command['customization_ids']
+                       if WatsonSTT.delete_model(url, self.state.api_key, _id, scheduler=self.state.scheduler)]
+            self.state.forget(url, deleted)
+
+            return {'deleted': deleted}
+
+        if name == 'shutdown':
+            # shutdown() blocks until serve_forever returns, so it cannot run on the handler thread
+            Thread(target=self.shutdown, daemon=True).start()
+            return {'status': 'stopping'}
+
+        raise ValueError(f"Unknown command \'{name}\'")
+
+
+def serve(port=None) -> None:
+    """ Runs the daemon until it receives the 'shutdown' command or Ctrl-C """
+
+    server = STTDaemon(port=port)
+    print(f"Watson STT daemon listening on 127.0.0.1:{server.server_address[1]}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        Path(TOKEN_PATH).unlink(missing_ok=True)
+        print("Watson STT daemon stopped")
+
+
+def delegate(url, verbose=False, evaluate=None, audio_files=None, delete=None):
+    """ Runs the direct mode commands on the daemon when one is running.
+
+    Args:
+        url: url of the instance
+        verbose: list the models
+        evaluate: ids of the models to evaluate ('latest' is resolved by the daemon)
+        audio_files: the audio files to transcribe
+        delete: ids of the models to delete. Deleting 'all' asks for a confirmation and is never delegated
+
+    Returns:
+        a dictionary with the answer of every delegated command, or None if no daemon is running
+        or there is nothing to delegate
+    """
+
+    commands = {}
+
+    if verbose:
+        commands['models'] = {'command': 'models', 'url': url}
+
+    if evaluate and audio_files:
+        # the daemon may run from another directory
+        commands['evaluate'] = {'command': 'evaluate',
+                                'url': url,
+                                'customization_ids': evaluate,
+                                'audio_files': [str(Path(audio_file).resolve()) for audio_file in audio_files]}
+
+    if delete and 'all' not in delete:
+        commands['delete'] = {'command': 'delete', 'url': url, 'customization_ids': delete}
+
+    if not commands or send({'command': 'ping'}) is None:
+        return None
+
+    answers = {}
+    for name, command in commands.items():
+        answer = send(command)
+
+        if answer is None:
+            raise ConnectionError("Lost the connection to the daemon")
+
+        if 'error' in answer:
+            raise Exception(answer['error'])
+
+        answers[name] = answer
+
+    return answers
@@ -0,0 +1,246 @@
+from threading import Lock, Thread, get_ident
+from time import monotonic, sleep
+
+import re
+import sys
+
+import progress
+
+from cli.deadline import Deadline
+
+_ANSI = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+
+class Task(object):
+    """ An action of a session run by the Dashboard.
+
+    Everything the action prints is kept in its output and shown once the dashboard is done. The last
+    line printed (or the message of its spinner) is shown live in the dashboard.
+
+    Attributes:
+        name: the label of the task in the dashboard
+        function: the action, called with the Deadline of the task
+        after: the tasks that must be finished before this one starts
+        state: 'queued', 'running', 'done', 'failed' or 'cancelled'
+        deadline: the Deadline of the task, cancelled on Ctrl-C. It counts the requests of the task.
+        output: the lines printed by the task
+        detail: the last line or spinner message of the task
+        error: the exception raised by the task, if any
+    """
+
+    def __init__(self, name, function, after=()):
+        self.name = name
+        self.function = function
+        self.after = tuple(after)
+
+        self.state = 'queued'
+        self.deadline = Deadline()
+        self.output = []
+        self.detail = ""
+        self.error = None
+        self.started = None
+        self.finished = None
+
+        self._partial = ""
+        self._lock = Lock()
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+
+        return (self.finished if self.finished is not None else monotonic()) - self.started
+
+    @property
+    def requests(self) -> int:
+        return self.deadline.requests
+
+    def capture(self, text: str) -> None:
+        """ Keeps the text printed by the task. Lines rewritten in place (spinners) only update the detail. """
+
+        with self._lock:
+            self._partial += _ANSI.sub('', text)
+            *lines, self._partial = self._partial.split('\n')
+
+            for line in lines:
+                if '\r' not in line:
+                    self.output.append(line)
+
+                    if line.strip():
+                        self.detail = line.strip()
+
+            current = self._partial.rsplit('\r', 1)[-1].strip()
+            if current:
+                self.detail = current
+
+    def run(self) -> None:
+        self.started = monotonic()
+        self.state = 'running'
+
+        try:
+            self.function(self.deadline)
+            self.state = 'done'
+        except BaseException as e:
+            self.error = e
+            self.state = 'cancelled' if self.deadline.cancelled else 'failed'
+            self.detail = str(e) or type(e).__name__
+        finally:
+            self.finished = monotonic()
+
+
+class _Output(object):
+    """ Stands in for sys.stdout and sys.stderr while the dashboard runs: what the threads of the tasks
+    write goes to their Task, the rest to the real stream """
+
+    def __init__(self, stream, tasks):
+        self._stream = stream
+        self._tasks = tasks
+
+    def write(self, text):
+        task = self._tasks.get(get_ident())
+
+        if task is None:
+            return self._stream.write(text)
+
+        task.capture(text)
+        return len(text)
+
+    def flush(self):
+        if get_ident() not in self._tasks:
+            self._stream.flush()
+
+    def isatty(self):
+        # spinners of the tasks keep writing their message, which becomes the detail of the task
+        return True if get_ident() in self._tasks else self._stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class Dashboard(object):
+    """ Runs independent actions at the same time and shows one live row per action.
+
+    A task starts as soon as the tasks it comes after are finished (successfully or not). Every row
+    shows the state of the task, its elapsed time, the number of requests it sent and its last message.
+    On a terminal the rows are redrawn in place, otherwise a row is printed whenever a task changes state.
+
+    Attributes:
+        tasks: list of Task
+        stream: where the dashboard is drawn, sys.stdout by default
+        interval: seconds between two redraws
+    """
+
+    SYMBOLS = {'queued': '·', 'running': '›', 'done': '✓', 'failed': '✗', 'cancelled': '-'}
+
+    def __init__(self, tasks, stream=None, interval=0.2):
+        self.tasks = list(tasks)
+        self.stream = stream if stream is not None else sys.stdout
+        self.interval = interval
+
+        self._threads = {}
+        self._capturing = {} # thread id -> the task it runs
+        self._drawn = 0
+        self._states = {}
+
+    def _row(self, task) -> str:
+        detail = task.detail if len(task.detail) <= 50 else task.detail[:47] + "..."
+
+        return (f"{self.SYMBOLS[task.state]} {task.name:<28} {task.state:<9} {task.elapsed:7.1f}s "
+                f"{task.requests:5d} requests  {detail}")
+
+    def render(self) -> None:
+        if self.stream.isatty():
+            if self._drawn:
+                # back to the first row
+                self.stream.write(f"\x1b[{self._drawn}F")
+
+            for task in self.tasks:
+                self.stream.write("\x1b[K" + self._row(task) + "\n")
+
+            self._drawn = len(self.tasks)
+
+        else:
+            for task in self.tasks:
+                if self._states.get(task) != task.state:
+                    self._states[task] = task.state
+                    self.stream.write(self._row(task) + "\n")
+
+        self.stream.flush()
+
+    def _start(self, task) -> None:
+        thread = Thread(target=self._run, args=(task,), daemon=True)
+        self._threads[task] = thread
+        thread.start()
+
+    def _run(self, task) -> None:
+        self._capturing[get_ident()] = task
+
+        try:
+            task.run()
+        finally:
+            del self._capturing[get_ident()]
+
+    def run(self) -> list:
+        """ Runs the tasks until all of them are finished.
+
+        Returns:
+            the tasks
+        Raises:
+            KeyboardInterrupt: after cancelling the tasks still running when the user pressed Ctrl-C
+        """
+
+        stdout, stderr, spinner_file = sys.stdout, sys.stderr, progress.Infinite.file
+
+        sys.stdout = _Output(stdout, self._capturing)
+        sys.stderr = _Output(stderr, self._capturing)
+        # the spinners write to the stream they were given at import
+        progress.Infinite.file = sys.stderr
+
+        try:
+            while not all(task.finished is not None for task in self.tasks):
+                for task in self.tasks:
+                    if task not in self._threads and all(before.finished is not None for before in task.after):
+                        self._start(task)
+
+                self.render()
+                sleep(self.interval)
+
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+
+        finally:
+            self.render()
+            sys.stdout, sys.stderr, progress.Infinite.file = stdout, stderr, spinner_file
+
+        return self.tasks
+
+    def cancel(self) -> None:
+        """ Cancels every task and waits for the running ones to stop at their next check """
+
+        for task in self.tasks:
+            task.deadline.cancel()
+
+            if task not in self._threads:
+                task.state = 'cancelled'
+                task.started = task.finished = monotonic()
+
+        for thread in self._threads.values():
+            thread.join(timeout=5)
+
+    def report(self) -> None:
+        """ Prints the output of every task, and the error of the ones that failed """
+
+        for task in self.tasks:
+            if not task.output and task.error is None:
+                continue
+
+            print()
+            print("*" * 60)
+            print(f"{task.name} ({task.state} in {task.elapsed:.1f}s, {task.requests} requests)")
+            print("*" * 60)
+
+            for line in task.output:
+                print(line)
+
+            if task.error is not None and task.state == 'failed':
+                print(task.error)
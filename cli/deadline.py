@@ -0,0 +1,143 @@
+from threading import Event, Lock
+from time import monotonic
+from weakref import WeakSet
+
+DEFAULT_TIMEOUT = 120.0 # seconds a single request may wait on the socket
+# a synchronous recognition sends nothing back until the whole audio is transcribed, so it may wait longer
+RECOGNIZE_TIMEOUT = 900.0
+
+class Cancelled(Exception):
+    """ Raised when an operation notices that it was cancelled """
+    pass
+
+
+class DeadlineExceeded(Cancelled):
+    """ Raised when an operation runs past its deadline """
+    pass
+
+
+class Deadline(object):
+    """ An overall time limit shared by every step of a multi-step operation, along with a
+    cancellation flag the steps check cooperatively.
+
+    The same Deadline is passed from create -> corpus -> train or to every transcription of a batch.
+    Each request gets the smaller of its own timeout and the time left, and every wait or poll loop
+    stops as soon as the deadline expires or the operation is cancelled (i.e. on Ctrl-C).
+
+    Attributes:
+        seconds: the time limit, None for no limit
+        expires_at: monotonic time at which the deadline expires, None for no limit
+        requests: number of requests sent on behalf of the operation
+    """
+
+    def __init__(self, seconds=None):
+        if seconds is not None and seconds <= 0:
+            raise ValueError("The \'seconds\' of a deadline must be greater than 0")
+
+        self.seconds = seconds
+        self.expires_at = monotonic() + seconds if seconds is not None else None
+        self._cancelled = Event()
+        self._requests = 0
+        self._lock = Lock()
+        self._parent = None
+        self._children = WeakSet()
+
+    @property
+    def requests(self) -> int:
+        return self._requests
+
+    def count_request(self) -> None:
+        """ Called by the scheduler for every request sent under the deadline """
+
+        with self._lock:
+            self._requests += 1
+
+        if self._parent is not None:
+            self._parent.count_request()
+
+    def remaining(self):
+        """ Seconds left before the deadline, None if there is no limit """
+
+        if self.expires_at is None:
+            return None
+
+        return max(0.0, self.expires_at - monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and monotonic() >= self.expires_at
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        """ Cancels every operation sharing the deadline """
+
+        self._cancelled.set()
+
+        with self._lock:
+            children = list(self._children)
+
+        for child in children:
+            child.cancel()
+
+    def child(self):
+        """ A deadline for one branch of the operation (i.e. one attempt of a hedged request).
+
+        It expires with this deadline and is cancelled with it, but cancelling it only stops the branch.
+        Its requests are counted by this deadline too.
+
+        Returns:
+            a Deadline
+        """
+
+        child = Deadline()
+        child.seconds, child.expires_at = self.seconds, self.expires_at
+        child._parent = self
+
+        with self._lock:
+            self._children.add(child)
+
+        if self.cancelled:
+            child.cancel()
+
+        return child
+
+    def check(self) -> None:
+        """ Raises Cancelled or DeadlineExceeded if the operation must stop """
+
+        if self.cancelled:
+            raise Cancelled("The operation was cancelled")
+
+        if self.expired():
+            raise DeadlineExceeded(f"The operation did not complete within {self.seconds} seconds")
+
+    def timeout(self, timeout=None):
+        """ The timeout of the next request: the smaller of its own timeout and the time left.
+
+        Args:
+            timeout: the timeout of the request, None for no timeout
+        Returns:
+            the timeout to pass to requests
+        """
+
+        self.check()
+        remaining = self.remaining()
+
+        if remaining is None:
+            return timeout
+
+        if timeout is None:
+            return remaining
+
+        return min(timeout, remaining)
+
+    def sleep(self, seconds: float) -> None:
+        """ Sleeps, waking up early if the operation is cancelled or the deadline expires """
+
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+
+        self._cancelled.wait(seconds)
+        self.check()
@@ -0,0 +1,152 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from time import monotonic
+
+from cli.deadline import Deadline
+from cli.stt import WatsonSTT
+
+class HedgedTranscriber(object):
+    """ Cuts the tail latency of transcriptions by hedging slow requests.
+
+    When a recognition has not completed after the hedge delay (a percentile of the recent
+    latencies), a duplicate is sent, on another instance when a pool is used. The first answer wins
+    and the other attempt is cancelled. Every attempt runs under its own Deadline, a child of the
+    caller's: if the loser has not started it never runs, otherwise its Deadline is cancelled, so it
+    stops at its next check (rate limiter, retry, failover) and no further request is sent for it.
+    A recognition already sent cannot be recalled from the API, its answer is discarded.
+
+    Attributes:
+        pool: optional InstancePool, the duplicate then goes to another instance
+        url: url of the instance when no pool is used
+        percentile: percentile of the recent latencies used as the hedge delay
+        initial_delay: hedge delay used until enough latencies were observed
+        min_delay: lower bound of the hedge delay
+        window: number of recent latencies kept
+    """
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, pool=None, url=None, percentile=95, initial_delay=5.0, min_delay=0.5, window=500, max_workers=32):
+        if pool is None and url is None:
+            raise ValueError("Pass either a \'pool\' or the \'url\' of the instance")
+
+        if not 0 < percentile < 100:
+            raise ValueError("The \'percentile\' must be between 0 and 100")
+
+        self.pool = pool
+        self.url = url
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+
+        self._latencies = deque(maxlen=window)
+        self._stats = {'requests': 0, 'hedges_fired': 0, 'hedges_won': 0}
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def delay(self) -> float:
+        """ The current hedge delay in seconds """
+
+        with self._lock:
+            if len(self._latencies) < self.MIN_SAMPLES:
+                return self.initial_delay
+
+            latencies = sorted(self._latencies)
+
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+
+        return max(self.min_delay, latencies[index])
+
+    def stats(self) -> dict:
+        """ The number of requests, hedges fired and hedges that answered first """
+
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _attempt(self, path_to_audio_file, customization_id, used, deadline, kwargs):
+        """ Sends one recognition. The instances of the other attempts are listed in used. """
+
+        if self.pool is None:
+            stt = WatsonSTT(url=self.url, customization_id=customization_id, deadline=deadline)
+            instance = None
+        else:
+            instance = self.pool.acquire(exclude=used) or self.pool.acquire()
+            used.append(instance)
+            stt = self.pool.client(instance, customization_id, deadline)
+
+        start = monotonic()
+        try:
+            results = stt.transcribe(path_to_audio_file, **kwargs)
+        except Exception as e:
+            if instance is not None:
+                self.pool.release(instance, ok=False if self.pool.instance_failed(e) else None)
+            raise
+
+        if instance is not None:
+            self.pool.release(instance, ok=True)
+
+        with self._lock:
+            self._latencies.append(monotonic() - start)
+
+        return results
+
+    def transcribe(self, path_to_audio_file, customization_id, deadline=None, **kwargs):
+        """ Transcribes the audio file, hedging the request if it is slow.
+
+        Args:
+            path_to_audio_file: path of the audio file
+            customization_id: id of the model
+            deadline: optional Deadline shared by both attempts
+            kwargs: passed to WatsonSTT.transcribe
+
+        Returns:
+            the transcription of the attempt that answered first
+        """
+
+        self._count('requests')
+        used = []
+
+        deadline = deadline if deadline is not None else Deadline()
+
+        primary_deadline = deadline.child()
+        primary = self._executor.submit(self._attempt, path_to_audio_file, customization_id, used, primary_deadline, kwargs)
+        done, _ = wait([primary], timeout=self.delay())
+
+        if done:
+            return primary.result()
+
+        self._count('hedges_fired')
+        hedge_deadline = deadline.child()
+        hedge = self._executor.submit(self._attempt, path_to_audio_file, customization_id, used, hedge_deadline, kwargs)
+
+        attempts = {primary: primary_deadline, hedge: hedge_deadline}
+        pending = {primary, hedge}
+        error = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+
+                # the loser stops sending requests
+                for other in pending:
+                    other.cancel()
+                    attempts[other].cancel()
+
+                if future is hedge:
+                    self._count('hedges_won')
+
+                return future.result()
+
+        raise error
@@ -0,0 +1,334 @@
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+
+import json
+import sqlite3
+
+from cli.transcript import Transcript
+from cli.vocabulary import tokenize
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    customization_id TEXT NOT NULL,
+    created TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    utterances INTEGER NOT NULL,
+    errors INTEGER,
+    words INTEGER,
+    wer REAL,
+    confidence REAL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    utterance TEXT NOT NULL,
+    transcript TEXT NOT NULL,
+    reference TEXT,
+    errors INTEGER,
+    words INTEGER,
+    confidence REAL,
+    response TEXT NOT NULL,
+    PRIMARY KEY (run_id, utterance)
+) WITHOUT ROWID;
+DROP INDEX IF EXISTS results_utterance;
+CREATE INDEX IF NOT EXISTS results_scores ON results (utterance, run_id, errors, words, confidence);
+CREATE INDEX IF NOT EXISTS runs_model ON runs (customization_id, created);
+CREATE INDEX IF NOT EXISTS runs_wer ON runs (wer);
+"""
+
+def word_errors(reference: str, hypothesis: str) -> int:
+    """ The number of substituted, deleted and inserted words between the reference and the hypothesis
+    (their Levenshtein distance over words)
+
+    Args:
+        reference: the expected text
+        hypothesis: the transcribed text
+
+    Returns:
+        the number of word errors
+    """
+
+    reference, hypothesis = tokenize(reference), tokenize(hypothesis)
+
+    # a single row of the distance matrix is kept
+    row = list(range(len(hypothesis) + 1))
+
+    for i, expected in enumerate(reference, 1):
+        previous, row[0] = row[0], i
+
+        for j, word in enumerate(hypothesis, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (expected != word))
+
+    return row[-1]
+
+
+def load_references(directory, audio_files) -> dict:
+    """ Reads the reference transcript of every audio file that has one.
+
+    The reference of <name>.wav is <directory>/<name>.txt, or a transcription saved as <directory>/<name>.json
+
+    Returns:
+        a dictionary of the audio files and their reference text
+    """
+
+    references = {}
+
+    for audio_file in audio_files:
+        stem = Path(audio_file).stem
+
+        text = Path(directory) / f"{stem}.txt"
+        transcription = Path(directory) / f"{stem}.json"
+
+        if text.is_file():
+            references[audio_file] = text.read_text()
+        elif transcription.is_file():
+            references[audio_file] = Transcript.from_json(transcription.read_text()).text
+
+    return references
+
+
+class EvaluationHistory(object):
+    """ A local SQLite store of the evaluations of the models, to track regressions across model versions.
+
+    Every evaluation of a model is a run. A run keeps, for every utterance (audio file), the transcript,
+    the whole response, its mean word confidence and, when a reference transcript was given, its word
+    errors. The totals of every run are kept with the run, so finding the best run only reads the
+    index of the runs, and comparing two runs utterance by utterance is a join on the primary key of
+    the results. Nothing is transcribed again.
+
+    Attributes:
+        path: the path of the database
+    """
+
+    def __init__(self, path='.history/evaluations.sqlite3'):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA foreign_keys=ON")
+            self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _query(self, sql, *parameters) -> list:
+        with self._lock:
+            return [dict(row) for row in self._connection.execute(sql, parameters)]
+
+    @staticmethod
+    def _score(utterance, response, references):
+        """ The row of the results table of one transcription """
+
+        transcript = Transcript.from_response(response)
+        text = transcript.text
+        confidences = transcript.word_arrays()[3]
+
+        if len(confidences):
+            confidence = sum(confidences) / len(confidences)
+        else:
+            # without word confidences, the confidence of every result
+            results = [result.best.confidence for result in transcript.results
+                       if result.best is not None and result.best.confidence is not None]
+            confidence = sum(results) / len(results) if results else None
+
+        reference = references.get(utterance)
+        errors = words = None
+
+        if reference is not None:
+            errors = word_errors(reference, text)
+            words = len(tokenize(reference))
+
+        return (str(utterance), text, reference, errors, words, confidence, json.dumps(response))
+
+    def record(self, customization_id, evaluations, references=None, parameters=None) -> int:
+        """ Stores an evaluation of a model.
+
+        Args:
+            customization_id: id of the model evaluated
+            evaluations: an iterable of (utterance, results), where utterance identifies the audio file
+                (i.e. its path) and results is the json object of the transcription
+            references: optional dictionary of the utterances and their reference transcript, to score them
+            parameters: optional json serializable parameters of the evaluation (i.e. the base model, the weight)
+
+        Returns:
+            the id of the run
+        """
+
+        references = references if references is not None else {}
+        rows = [self._score(utterance, results, references) for utterance, results in evaluations]
+
+        if len(rows) == 0:
+            raise ValueError("An evaluation needs at least one transcription")
+
+        scored = [row for row in rows if row[3] is not None]
+        errors = sum(row[3] for row in scored) if scored else None
+        words = sum(row[4] for row in scored) if scored else None
+        wer = errors / words if scored and words else None
+
+        confidences = [row[5] for row in rows if row[5] is not None]
+        confidence = sum(confidences) / len(confidences) if confidences else None
+
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO runs (customization_id, created, parameters, utterances, errors, words, wer, confidence) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (customization_id, datetime.now().isoformat(), json.dumps(parameters or {}, sort_keys=True),
+                 len(rows), errors, words, wer, confidence))
+
+            run_id = cursor.lastrowid
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO results (run_id, utterance, transcript, reference, errors, words, confidence, response) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id,) + row for row in rows])
+
+        return run_id
+
+    def run(self, run_id) -> dict:
+        """ The totals of a run, None if there is no such run """
+
+        runs = self._query("SELECT * FROM runs WHERE id = ?", run_id)
+
+        return self._with_parameters(runs[0]) if runs else None
+
+    @staticmethod
+    def _with_parameters(run) -> dict:
+        run['parameters'] = json.loads(run['parameters'])
+        return run
+
+    def runs(self, customization_id=None, limit=None) -> list:
+        """ The runs, the latest first
+
+        Args:
+            customization_id: only the runs of this model
+            limit: the maximum number of runs returned
+        """
+
+        sql = "SELECT * FROM runs"
+        parameters = []
+
+        if customization_id is not None:
+            sql += " WHERE customization_id = ?"
+            parameters.append(customization_id)
+
+        sql += " ORDER BY created DESC, id DESC"
+
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+
+        return [self._with_parameters(run) for run in self._query(sql, *parameters)]
+
+    def best(self, before=None, customization_id=None, sharing=None) -> dict:
+        """ The run with the lowest word error rate. Runs without references are ranked by their confidence.
+
+        Args:
+            before: only the runs recorded before this run id, i.e. the previous best of a new run
+            customization_id: only the runs of this model
+            sharing: only the runs with utterances in common with this run id, so they can be compared.
+                They are ranked on the common utterances only: first the runs with the most utterances
+                scored in both runs, then the most common utterances, then their word error rate and
+                mean confidence on those utterances
+
+        Returns:
+            the totals of the run, None if there is none
+        """
+
+        sql = "SELECT * FROM runs WHERE 1"
+        parameters = []
+
+        if customization_id is not None:
+            sql += " AND customization_id = ?"
+            parameters.append(customization_id)
+
+        if before is not None:
+            sql += " AND id < ?"
+            parameters.append(before)
+
+        if sharing is None:
+            sql += " ORDER BY wer IS NULL, wer, confidence IS NULL, confidence DESC, id DESC LIMIT 1"
+            runs = self._query(sql, *parameters)
+        else:
+            # the scores of the common utterances are read from the index of the utterances alone,
+            # grouped by run, before the runs are looked up
+            runs = self._query(
+                "SELECT runs.*, common.* FROM ("
+                "    SELECT old.run_id, COUNT(new.errors + old.errors) AS scored, COUNT(*) AS common, "
+                "           1.0 * SUM(CASE WHEN new.errors IS NOT NULL THEN old.errors END) "
+                "               / SUM(CASE WHEN new.errors IS NOT NULL THEN old.words END) AS common_wer, "
+                "           AVG(old.confidence) AS common_confidence "
+                "    FROM results AS new JOIN results AS old ON old.utterance = new.utterance AND old.run_id != new.run_id "
+                "    WHERE new.run_id = ? GROUP BY old.run_id"
+                ") AS common JOIN (" + sql + ") AS runs ON runs.id = common.run_id "
+                "ORDER BY scored DESC, common DESC, common_wer IS NULL, common_wer, "
+                "         common_confidence IS NULL, common_confidence DESC, runs.id DESC LIMIT 1",
+                sharing, *parameters)
+
+            for run in runs:
+                for column in ('run_id', 'scored', 'common', 'common_wer', 'common_confidence'):
+                    del run[column]
+
+        return self._with_parameters(runs[0]) if runs else None
+
+    def compare(self, run_id, baseline_id=None) -> dict:
+        """ Compares a run with a baseline, utterance by utterance.
+
+        Args:
+            run_id: the id of the run
+            baseline_id: the id of the baseline run. By default, the best of the runs before it that share
+                utterances with it
+
+        Returns:
+            a dictionary with the totals of the 'run' and of the 'baseline' (None when there is no previous run),
+            the number of 'common' utterances, the number of them 'scored' (with word errors in both runs),
+            the 'regressions' (the utterances with more word errors than in the baseline, the worst first),
+            the number of 'improved' utterances and of 'changed' transcripts. Without scored utterances,
+            regressions cannot be found.
+        """
+
+        run = self.run(run_id)
+        if run is None:
+            raise ValueError(f"There is no run {run_id}")
+
+        baseline = self.run(baseline_id) if baseline_id is not None else self.best(before=run_id, sharing=run_id)
+
+        comparison = {'run': run, 'baseline': baseline, 'common': 0, 'scored': 0, 'regressions': [], 'improved': 0,
+                      'changed': 0}
+
+        if baseline is None:
+            return comparison
+
+        counts = self._query(
+            "SELECT COUNT(*) AS common, COUNT(new.errors + old.errors) AS scored, "
+            "       COALESCE(SUM(new.errors < old.errors), 0) AS improved, "
+            "       COALESCE(SUM(new.transcript != old.transcript), 0) AS changed "
+            "FROM results AS new JOIN results AS old ON old.run_id = ? AND old.utterance = new.utterance "
+            "WHERE new.run_id = ?",
+            baseline['id'], run_id)[0]
+
+        comparison.update(counts)
+        comparison['regressions'] = self._query(
+            "SELECT new.utterance, old.errors AS baseline_errors, new.errors, new.words, "
+            "       old.transcript AS baseline_transcript, new.transcript, new.reference "
+            "FROM results AS new JOIN results AS old ON old.run_id = ? AND old.utterance = new.utterance "
+            "WHERE new.run_id = ? AND new.errors > old.errors "
+            "ORDER BY new.errors - old.errors DESC, new.utterance",
+            baseline['id'], run_id)
+
+        return comparison
+
+    def utterance(self, utterance) -> list:
+        """ Every result of an utterance, the latest run first """
+
+        return self._query(
+            "SELECT runs.id AS run_id, runs.customization_id, runs.created, results.transcript, results.errors, "
+            "       results.words, results.confidence "
+            "FROM results JOIN runs ON runs.id = results.run_id "
+            "WHERE results.utterance = ? ORDER BY runs.id DESC",
+            str(utterance))
@@ -0,0 +1,111 @@
+from datetime import datetime
+from hashlib import sha1
+from pathlib import Path
+from threading import Lock
+
+import json
+import os
+
+class JobJournal(object):
+    """ An append-only journal of the units of work a batch job has completed.
+
+    Every completed unit (i.e. a file evaluated against a model, an uploaded corpus, a training step)
+    is appended as a json line and flushed to disk, so rerunning a job with the same job id skips
+    the finished units and picks up where the previous run stopped.
+
+    Attributes:
+        job_id: the identifier of the job
+        path: the path of the journal file
+    """
+
+    def __init__(self, job_id: str, directory='.jobs'):
+        if type(job_id) != str or not job_id:
+            raise TypeError("The \'job_id\' must be a non-empty \'str\'")
+
+        self.job_id = job_id
+        self.path = Path(directory) / f"{job_id}.jsonl"
+
+        self._completed = {}
+        self._lock = Lock()
+
+        self._load()
+
+    @classmethod
+    def for_inputs(cls, *inputs, directory='.jobs'):
+        """ Creates a journal whose job id is derived from the inputs of the job, so running the same
+        action with the same inputs resumes it.
+
+        Args:
+            inputs: json serializable inputs of the job
+        Returns:
+            a JobJournal
+        """
+
+        digest = sha1(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+        return cls(digest, directory=directory)
+
+    def _load(self) -> None:
+        if not self.path.is_file():
+            return
+
+        with open(self.path, 'r') as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line is incomplete if the process died while writing it
+                    continue
+
+                self._completed[self._key(entry['unit'])] = entry.get('result')
+
+    @staticmethod
+    def _key(unit) -> str:
+        return json.dumps([str(part) for part in unit])
+
+    def is_done(self, *unit) -> bool:
+        """ Checks if the unit of work was completed by this or a previous run """
+
+        with self._lock:
+            return self._key(unit) in self._completed
+
+    def result(self, *unit):
+        """ Returns the result recorded with the unit, None if the unit is not done """
+
+        with self._lock:
+            return self._completed.get(self._key(unit))
+
+    def record(self, *unit, result=None) -> None:
+        """ Marks the unit of work as completed.
+
+        Args:
+            unit: the parts identifying the unit, i.e. ('evaluate', audio_file, customization_id)
+            result: a json serializable result to return on the next run
+        """
+
+        entry = {'unit': [str(part) for part in unit],
+                 'result': result,
+                 'completed': datetime.now().isoformat()}
+
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            with open(self.path, 'a') as journal:
+                journal.write(json.dumps(entry) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+
+            self._completed[self._key(unit)] = result
+
+    def __len__(self):
+        with self._lock:
+            return len(self._completed)
+
+    def finish(self) -> None:
+        """ Removes the journal once the whole job completed """
+
+        with self._lock:
+            if self.path.is_file():
+                self.path.unlink()
+
+            self._completed = {}
@@ -0,0 +1,222 @@
+from configparser import ConfigParser
+from itertools import count
+from threading import Lock
+from time import monotonic
+
+import re
+
+import requests
+
+from cli.scheduler import RequestScheduler
+from cli.stt import APIError, WatsonSTT
+
+class Instance(object):
+    """ A STT instance of the pool and its health.
+
+    Attributes:
+        url: url of the instance
+        api_key: API key of the instance
+        scheduler: the RequestScheduler of the instance, every instance has its own rate limit
+        in_flight: number of requests currently sent to the instance
+        failures: number of consecutive failures
+        unhealthy_until: monotonic time until which the instance is skipped
+        completed: number of successful requests
+    """
+
+    def __init__(self, url, api_key, scheduler=None):
+        self.url = url
+        self.api_key = api_key
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler.from_config()
+
+        self.in_flight = 0
+        self.failures = 0
+        self.unhealthy_until = 0.0
+        self.completed = 0
+
+    def healthy(self, now=None) -> bool:
+        return (now if now is not None else monotonic()) >= self.unhealthy_until
+
+
+class InstancePool(object):
+    """ Spreads transcriptions over several STT instances hosting the same customization.
+
+    Every request goes to the least loaded (or next, with round robin) healthy instance. An instance
+    failing max_failures times in a row is skipped for cooldown seconds, and a transcription failed
+    by the instance (connection error, 5xx or 429) is retried on the other instances.
+
+    Attributes:
+        instances: list of Instance
+        strategy: 'least_loaded' or 'round_robin'
+        max_failures: consecutive failures after which an instance is marked unhealthy
+        cooldown: seconds an unhealthy instance is skipped
+    """
+
+    STRATEGIES = ('least_loaded', 'round_robin')
+
+    def __init__(self, instances, strategy='least_loaded', max_failures=3, cooldown=30.0):
+        if len(instances) == 0:
+            raise ValueError("The pool needs at least one instance")
+
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"The \'strategy\' must be one of {', '.join(self.STRATEGIES)}")
+
+        self.instances = list(instances)
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+
+        self._turn = count()
+        self._lock = Lock()
+
+    @classmethod
+    def from_config(cls, path='keys/conf.ini', **kwargs):
+        """ Creates the pool from the conf.ini file.
+
+        The first instance is read from the [URL] and [API_KEY] sections, the others from numbered
+        sections: [URL_2] and [API_KEY_2], [URL_3] and [API_KEY_3], ...
+        """
+
+        config = ConfigParser()
+        config.read(path)
+
+        instances = []
+        for section in config.sections():
+            match = re.fullmatch(r'URL(_\d+)?', section)
+            if match is None:
+                continue
+
+            key_section = f"API_KEY{match.group(1) or ''}"
+            url = config[section].get('watson_stt_url')
+            api_key = config[key_section].get('watson_stt_api') if key_section in config.sections() else None
+
+            if url in (None, 'None') or api_key in (None, 'None'):
+                continue
+
+            instances.append(Instance(url, api_key))
+
+        return cls(instances, **kwargs)
+
+    def acquire(self, exclude=()) -> Instance:
+        """ Picks an instance for the next request and counts the request as in flight.
+
+        Args:
+            exclude: instances that already failed the request
+        Returns:
+            the instance, None if every instance is excluded
+        """
+
+        with self._lock:
+            candidates = [instance for instance in self.instances if instance not in exclude]
+            if not candidates:
+                return None
+
+            now = monotonic()
+            healthy = [instance for instance in candidates if instance.healthy(now)]
+
+            if not healthy:
+                # every instance is cooling down, try the one that recovers first
+                instance = min(candidates, key=lambda instance: instance.unhealthy_until)
+            elif self.strategy == 'round_robin':
+                instance = healthy[next(self._turn) % len(healthy)]
+            else:
+                instance = min(healthy, key=lambda instance: instance.in_flight)
+
+            instance.in_flight += 1
+
+            return instance
+
+    def release(self, instance: Instance, ok: bool) -> None:
+        """ Records the outcome of a request sent to the instance. Pass ok=None when the outcome
+        says nothing about the health of the instance """
+
+        with self._lock:
+            instance.in_flight -= 1
+
+            if ok is None:
+                return
+
+            if ok:
+                instance.failures = 0
+                instance.unhealthy_until = 0.0
+                instance.completed += 1
+            else:
+                instance.failures += 1
+
+                if instance.failures >= self.max_failures:
+                    instance.unhealthy_until = monotonic() + self.cooldown
+
+    def client(self, instance: Instance, customization_id=None, deadline=None) -> WatsonSTT:
+        """ A WatsonSTT bound to the instance """
+
+        return WatsonSTT(url=instance.url,
+                         customization_id=customization_id,
+                         scheduler=instance.scheduler,
+                         api_key=instance.api_key,
+                         deadline=deadline)
+
+    @staticmethod
+    def instance_failed(error) -> bool:
+        """ Whether the error is the fault of the instance: it could not be reached, failed (5xx) or throttled (429) """
+
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return True
+
+        return isinstance(error, APIError) and (error.status_code == 429 or error.status_code >= 500)
+
+    def has_url(self, url) -> bool:
+        """ Whether the url is the url of an instance of the pool """
+
+        return any(instance.url.rstrip('/') == str(url).rstrip('/') for instance in self.instances)
+
+    def transcribe(self, path_to_audio_file, customization_id, deadline=None, **kwargs):
+        """ Transcribes the audio file on an instance of the pool, failing over to the other instances.
+
+        Args:
+            path_to_audio_file: path of the audio file
+            customization_id: id of the model
+            deadline: optional Deadline, no failover is attempted once it expires
+            kwargs: passed to WatsonSTT.transcribe
+
+        Returns:
+            the transcription of the first instance that succeeded
+        """
+
+        tried = []
+        error = None
+
+        while True:
+            instance = self.acquire(exclude=tried)
+            if instance is None:
+                raise error
+
+            tried.append(instance)
+            stt = self.client(instance, customization_id, deadline)
+
+            try:
+                results = stt.transcribe(path_to_audio_file, **kwargs)
+            except Exception as e:
+                if not self.instance_failed(e):
+                    # the request is invalid (bad audio, unknown model) or was cancelled, another
+                    # instance would not do better and this one is not to blame
+                    self.release(instance, ok=None)
+                    raise
+
+                self.release(instance, ok=False)
+                error = e
+                continue
+
+            self.release(instance, ok=True)
+
+            return results
+
+    def stats(self) -> list:
+        """ The load and health of every instance """
+
+        now = monotonic()
+
+        with self._lock:
+            return [{'url': instance.url,
+                     'in_flight': instance.in_flight,
+                     'completed': instance.completed,
+                     'failures': instance.failures,
+                     'healthy': instance.healthy(now)} for instance in self.instances]
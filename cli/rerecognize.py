@@ -0,0 +1,229 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import wave
+
+from cli.deadline import Deadline
+from cli.stt import WatsonSTT
+from cli.transcript import Alternative, SpeechResult, Transcript
+
+class Span(object):
+    """ A stretch of low confidence words of the best alternative of a result.
+
+    Attributes:
+        result: index of the result in the transcript
+        first: index of the first low confidence word in the alternative
+        last: index after the last low confidence word
+        start: start of the audio cut, in seconds
+        end: end of the audio cut, in seconds
+    """
+
+    __slots__ = ('result', 'first', 'last', 'start', 'end')
+
+    def __init__(self, result, first, last, start, end):
+        self.result = result
+        self.first = first
+        self.last = last
+        self.start = start
+        self.end = end
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def _check_wav(path_to_audio_file):
+    if Path(path_to_audio_file).suffix.lower() != '.wav':
+        raise ValueError("Only \'wav\' audio files can be cut into spans")
+
+
+def _mean(values) -> float:
+    return sum(values) / len(values) if len(values) else 0.0
+
+
+def find_spans(transcript: Transcript, threshold=0.6, padding=0.25, max_gap=1) -> list:
+    """ Finds the stretches of words recognized with a low confidence.
+
+    Runs of words below the threshold are merged when at most max_gap confident words separate them,
+    and the cut is padded by up to padding seconds on both sides, without reaching into the
+    neighbouring words, so only the low confidence words are heard again.
+
+    Args:
+        transcript: a Transcript requested with timestamps and word confidences
+        threshold: words below this confidence are re-recognized
+        padding: seconds of audio added around every run, at most up to the neighbouring words
+        max_gap: number of confident words allowed inside a span
+
+    Returns:
+        the list of Span, in the order of the audio
+    """
+
+    spans = []
+
+    for index, result in enumerate(transcript.results):
+        alternative = result.best
+
+        if alternative is None or len(alternative.word_confidences) != len(alternative.starts):
+            continue
+
+        low = [position for position, confidence in enumerate(alternative.word_confidences) if confidence < threshold]
+        runs = []
+
+        for position in low:
+            if runs and position - runs[-1][1] <= max_gap:
+                runs[-1][1] = position + 1
+            else:
+                runs.append([position, position + 1])
+
+        for first, last in runs:
+            previous_end = alternative.ends[first - 1] if first > 0 else 0.0
+            next_start = alternative.starts[last] if last < len(alternative.starts) else None
+
+            start = max(previous_end, alternative.starts[first] - padding)
+            end = alternative.ends[last - 1] + padding
+            end = min(end, next_start) if next_start is not None else end
+
+            spans.append(Span(index, first, last, start, end))
+
+    return spans
+
+
+def cut(path_to_audio_file, spans) -> list:
+    """ Cuts the spans out of a wav file.
+
+    Args:
+        path_to_audio_file: path of the wav file
+        spans: list of Span
+
+    Returns:
+        the bytes of a wav file for every span
+    """
+
+    _check_wav(path_to_audio_file)
+    cuts = []
+
+    with wave.open(str(path_to_audio_file), 'rb') as audio:
+        rate = audio.getframerate()
+        frames = audio.getnframes()
+
+        for span in spans:
+            start = min(frames, int(span.start * rate))
+            end = min(frames, int(span.end * rate))
+
+            audio.setpos(start)
+            buffer = BytesIO()
+
+            with wave.open(buffer, 'wb') as piece:
+                piece.setparams(audio.getparams())
+                piece.writeframes(audio.readframes(end - start))
+
+            cuts.append(buffer.getvalue())
+
+    return cuts
+
+
+def _merge(alternative: Alternative, replacements) -> Alternative:
+    """ Replaces the words of the spans by the words of their second pass, shifted to the time of the span """
+
+    words = list(alternative.words)
+    starts = list(alternative.starts)
+    ends = list(alternative.ends)
+    confidences = list(alternative.word_confidences)
+
+    # from the end, so the positions of the earlier spans do not move
+    for span, second in sorted(replacements, key=lambda replacement: replacement[0].first, reverse=True):
+        words[span.first:span.last] = second.words
+        starts[span.first:span.last] = [round(span.start + start, 2) for start in second.starts]
+        ends[span.first:span.last] = [round(span.start + end, 2) for end in second.ends]
+        confidences[span.first:span.last] = second.word_confidences
+
+    return Alternative(transcript="".join(word + " " for word in words),
+                       confidence=alternative.confidence,
+                       words=words,
+                       starts=array('d', starts),
+                       ends=array('d', ends),
+                       word_confidences=array('d', confidences))
+
+
+def rerecognize(url, path_to_audio_file, customization_id, second_customization_id=None, customization_weight=None,
+                threshold=0.6, padding=0.25, workers=4, deadline=None) -> tuple:
+    """ Transcribes the audio file, then re-recognizes only the spans recognized with a low confidence.
+
+    The first pass requests word confidences. The low confidence spans are cut out of the audio and
+    sent again in parallel, optionally to another model or with another customization weight. The
+    second hypothesis of a span replaces the first one only if its mean word confidence is higher.
+
+    Args:
+        url: url of the instance
+        path_to_audio_file: path of the wav file
+        customization_id: id of the model of the first pass
+        second_customization_id: id of the model of the second pass, the first model by default
+        customization_weight: optional weight of the custom model in the second pass
+        threshold: words below this confidence are re-recognized
+        padding: seconds of audio added around every span
+        workers: number of spans re-recognized at the same time
+        deadline: optional Deadline of the whole operation
+
+    Returns:
+        (transcript, report) where transcript is the merged Transcript and report a dictionary with the
+        number of spans, the number of spans replaced and the seconds of audio of the file and of the spans
+    """
+
+    _check_wav(path_to_audio_file)
+
+    deadline = deadline if deadline is not None else Deadline()
+    second_customization_id = second_customization_id if second_customization_id is not None else customization_id
+
+    first = WatsonSTT(url=url, customization_id=customization_id, deadline=deadline).transcribe(path_to_audio_file,
+                                                                                                  timestamps=True,
+                                                                                                  word_confidence=True,
+                                                                                                  parse=True)
+
+    with wave.open(str(path_to_audio_file), 'rb') as audio:
+        duration = audio.getnframes() / audio.getframerate()
+
+    spans = find_spans(first, threshold=threshold, padding=padding)
+    report = {'spans': len(spans),
+              'replaced': 0,
+              'audio_seconds': round(duration, 3),
+              'resent_seconds': round(sum(span.duration for span in spans), 3)}
+
+    if not spans:
+        return first, report
+
+    stt = WatsonSTT(url=url, customization_id=second_customization_id, deadline=deadline)
+
+    def second_pass(audio):
+        transcript = stt.transcribe_audio(audio, timestamps=True, word_confidence=True,
+                                          customization_weight=customization_weight, parse=True)
+        words = [result.best for result in transcript.results if result.best is not None]
+
+        # a span may come back as several results
+        return Alternative(words=[word for alternative in words for word in alternative.words],
+                           starts=array('d', [start for alternative in words for start in alternative.starts]),
+                           ends=array('d', [end for alternative in words for end in alternative.ends]),
+                           word_confidences=array('d', [confidence for alternative in words
+                                                        for confidence in alternative.word_confidences]))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        seconds = list(executor.map(second_pass, cut(path_to_audio_file, spans)))
+
+    replacements = {}
+    for span, second in zip(spans, seconds):
+        original = first.results[span.result].best.word_confidences[span.first:span.last]
+
+        if len(second.words) and _mean(second.word_confidences) > _mean(original):
+            replacements.setdefault(span.result, []).append((span, second))
+            report['replaced'] += 1
+
+    results = []
+    for index, result in enumerate(first.results):
+        if index in replacements:
+            alternatives = (_merge(result.best, replacements[index]),) + result.alternatives[1:]
+            result = SpeechResult(final=result.final, alternatives=alternatives)
+
+        results.append(result)
+
+    return Transcript(result_index=first.result_index, results=results), report
@@ -0,0 +1,204 @@
+from codecs import getincrementaldecoder
+
+import json
+
+from cli.transcript import SpeechResult, Transcript
+
+_decoder = json.JSONDecoder()
+
+class _Scanner(object):
+    """ Splits the 'results' array of a recognition response into its elements as bytes arrive.
+
+    Only the text of the result being received is kept in memory. Every result is decoded by the
+    C scanner of the json module as soon as it is complete; a result that is still incomplete is
+    retried once its text has doubled, so very large results are decoded in linear time.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+
+        self.opened = False
+        self.in_results = False
+        self.finished = False
+
+        self._wait_for = 0 # length the pending result must reach before decoding it again
+        self.values = {} # the other values of the response found before the results, i.e. result_index
+
+    def feed(self, text: str, final=False):
+        """ Adds text to the buffer and yields every complete result """
+
+        self.buffer += text
+
+        if not self.in_results:
+            self._seek_results()
+
+        while self.in_results and not self.finished:
+            result = self._next_result(final)
+            if result is None:
+                break
+
+            yield result
+
+        # drop what was consumed so the buffer only holds the result being received
+        if self.position > 0:
+            self.buffer = self.buffer[self.position:]
+            self.position = 0
+
+    def _seek_results(self):
+        """ Walks the keys of the top level object until the 'results' array starts """
+
+        buffer = self.buffer
+        position = self.position
+
+        try:
+            if not self.opened:
+                position = self._skip(buffer, position)
+                if position >= len(buffer):
+                    return
+
+                if buffer[position] != '{':
+                    raise ValueError("The response is not a json object")
+
+                self.opened = True
+                self.position = position = position + 1
+
+            while True:
+                position = self._skip(buffer, position, ',')
+                if position >= len(buffer):
+                    return
+
+                if buffer[position] == '}':
+                    # no results in the response
+                    self.finished = True
+                    self.position = position + 1
+                    return
+
+                key, end = _decoder.raw_decode(buffer, position)
+                end = self._skip(buffer, end)
+                if end >= len(buffer):
+                    return
+
+                value = self._skip(buffer, end + 1)
+                if value >= len(buffer):
+                    return
+
+                if key == 'results':
+                    if buffer[value] != '[':
+                        raise ValueError("The 'results' of the response is not an array")
+
+                    self.in_results = True
+                    self.position = value + 1
+                    return
+
+                # the other values (result_index, warnings) are small, decode and keep them.
+                # A value at the very end of the buffer may be an incomplete number.
+                decoded, position = _decoder.raw_decode(buffer, value)
+                if position >= len(buffer):
+                    return
+
+                self.values[key] = decoded
+                self.position = position
+
+        except json.JSONDecodeError:
+            # the value is not complete yet
+            return
+
+    def _next_result(self, final):
+        buffer = self.buffer
+
+        position = self._skip(buffer, self.position, ',')
+        self.position = position
+
+        if position >= len(buffer):
+            return None
+
+        if buffer[position] == ']':
+            self.finished = True
+            self.position = position + 1
+            return None
+
+        if buffer[position] != '{':
+            raise ValueError("The results of the response must be objects")
+
+        pending = len(buffer) - position
+        if pending < self._wait_for and not final:
+            return None
+
+        try:
+            result, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # an object cannot be complete before its closing brace, so the result is still arriving
+            self._wait_for = 2 * pending
+            return None
+
+        self._wait_for = 0
+        self.position = end
+
+        return result
+
+    @staticmethod
+    def _skip(buffer, position, extra=''):
+        while position < len(buffer) and (buffer[position].isspace() or buffer[position] in extra):
+            position += 1
+
+        return position
+
+
+def _project(result: dict, fields) -> dict:
+    alternatives = [{field: alternative[field] for field in fields if field in alternative}
+                    for alternative in result.get('alternatives', [])]
+
+    return {'final': result.get('final', True), 'alternatives': alternatives}
+
+
+def _scan(chunks, scanner, decoder):
+    """ Feeds the chunks to the scanner until the end of the results and yields every result """
+
+    for chunk in chunks:
+        yield from scanner.feed(decoder.decode(chunk))
+
+        if scanner.finished:
+            return
+
+    yield from scanner.feed(decoder.decode(b'', final=True), final=True)
+
+    if not scanner.finished and scanner.in_results:
+        raise ValueError("The response ended before the end of the results")
+
+
+def iter_results(chunks, fields=None):
+    """ Parses the results of a recognition response one at a time from the raw byte stream.
+
+    The body is never decoded as a whole: only the result being received is held in memory, so
+    long audio with timestamps and word alternatives does not need the full dict tree.
+
+    Args:
+        chunks: an iterable of bytes, i.e. response.iter_content(chunk_size=65536)
+        fields: optional fields of the alternatives to keep (i.e. ('transcript', 'confidence')).
+            Everything else, including word_alternatives, is dropped as soon as a result is parsed
+
+    Yields:
+        the dictionary of every result, in the format returned by the API
+    """
+
+    for result in _scan(chunks, _Scanner(), getincrementaldecoder('utf-8')()):
+        yield _project(result, fields) if fields is not None else result
+
+
+def parse_transcript(chunks) -> Transcript:
+    """ Builds a Transcript from the raw byte stream of a recognition response, one result at a time """
+
+    chunks = iter(chunks)
+    scanner = _Scanner()
+    decoder = getincrementaldecoder('utf-8')()
+
+    results = [SpeechResult.from_response(result) for result in _scan(chunks, scanner, decoder)]
+    values = scanner.values
+
+    if scanner.in_results:
+        # what follows the results is the small end of the object (i.e. '}' or ', "result_index": 0}')
+        rest = scanner.buffer + "".join(decoder.decode(chunk) for chunk in chunks) + decoder.decode(b'', final=True)
+        values = dict(values, **json.loads('{' + rest.lstrip().lstrip(',')))
+
+    return Transcript(result_index=values.get('result_index', 0), results=results)
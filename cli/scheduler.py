@@ -0,0 +1,269 @@
+from configparser import ConfigParser
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from random import uniform
+from threading import Lock
+from time import monotonic
+
+import requests
+
+from cli.deadline import DEFAULT_TIMEOUT, RECOGNIZE_TIMEOUT, Deadline
+from cli.transport import transport_from_config
+
+class RateLimiter(object):
+    """ A thread-safe token bucket shared by every thread issuing requests.
+
+    Attributes:
+        rate: number of tokens added per second
+        capacity: maximum number of tokens the bucket holds (the allowed burst)
+    """
+
+    def __init__(self, rate=10.0, capacity=None):
+        if rate <= 0:
+            raise ValueError("The \'rate\' must be greater than 0")
+
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+
+        self._tokens = self.capacity
+        self._updated = monotonic()
+        self._paused_until = 0.0
+        self._lock = Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, deadline=None) -> float:
+        """ Blocks until a token is available.
+
+        Args:
+            deadline: optional Deadline, waiting stops when it expires or is cancelled
+        Returns:
+            the number of seconds spent waiting
+        """
+
+        waited = 0.0
+        deadline = deadline if deadline is not None else Deadline()
+
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._refill(now)
+
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.rate
+
+            deadline.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """ Stops handing out tokens for the given number of seconds, i.e. after the server throttled us """
+
+        with self._lock:
+            self._paused_until = max(self._paused_until, monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class RequestScheduler(object):
+    """ Sends every request to the STT instance through a shared rate limiter.
+
+    Throttled responses (429) are retried for every method after waiting for the 'Retry-After'
+    header. Connection errors and 5xx responses are only retried for idempotent calls, with an
+    exponential backoff.
+
+    Attributes:
+        limiter: the RateLimiter shared by all threads using this scheduler
+        max_retries: maximum number of retries of a single request
+        backoff: base delay in seconds of the exponential backoff
+        max_backoff: upper bound of a single backoff delay
+        session: optional requests.Session keeping the connections to the instance alive
+        transport: optional transport the requests are sent through instead of requests,
+            i.e. a RecordingTransport or a ReplayTransport (see cli/transport.py)
+        recognize_timeout: seconds a synchronous recognition may wait for its answer
+    """
+
+    IDEMPOTENT_METHODS = ('get', 'head', 'put', 'delete', 'options')
+    RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+    _shared = None
+    _shared_lock = Lock()
+
+    def __init__(self, rate=10.0, burst=None, max_retries=5, backoff=0.5, max_backoff=30.0, session=None, transport=None,
+                 recognize_timeout=RECOGNIZE_TIMEOUT):
+        self.limiter = RateLimiter(rate=rate, capacity=burst)
+        self.recognize_timeout = recognize_timeout
+        self.session = session
+        self.transport = transport
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._stats = {'requests': 0,
+                       'throttled': 0,
+                       'retries': 0,
+                       'errors': 0,
+                       'seconds_waited': 0.0}
+        self._stats_lock = Lock()
+
+    @classmethod
+    def shared(cls):
+        """ Returns the scheduler shared by the whole process.
+
+        The rate can be configured in the optional [RATE_LIMIT] section of the conf.ini file
+        with the requests_per_second, burst and max_retries keys, the transport in the optional
+        [TRANSPORT] section and the timeout of the recognitions with the recognize key of the
+        optional [TIMEOUT] section.
+        """
+
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_config()
+
+            return cls._shared
+
+    @classmethod
+    def from_config(cls, path='keys/conf.ini', **kwargs):
+        """ Creates a scheduler with the rate of the [RATE_LIMIT] section of the conf.ini file and the
+        recognition timeout of its [TIMEOUT] section
+
+        Args:
+            path: path of the conf.ini file
+            kwargs: passed to the scheduler, i.e. a session
+        """
+
+        config = ConfigParser()
+        config.read(path)
+
+        if 'RATE_LIMIT' in config.sections():
+            section = config['RATE_LIMIT']
+            kwargs.setdefault('rate', section.getfloat('requests_per_second', 10.0))
+            kwargs.setdefault('burst', section.getfloat('burst', kwargs['rate']))
+            kwargs.setdefault('max_retries', section.getint('max_retries', 5))
+
+        if 'TIMEOUT' in config.sections():
+            kwargs.setdefault('recognize_timeout', config['TIMEOUT'].getfloat('recognize', RECOGNIZE_TIMEOUT))
+
+        if 'transport' not in kwargs:
+            kwargs['transport'] = transport_from_config(path)
+
+        return cls(**kwargs)
+
+    def request(self, method: str, url: str, idempotent=None, deadline=None, **kwargs):
+        """ Sends the request once a token is available and retries it when it is safe to.
+
+        Every attempt gets a timeout (DEFAULT_TIMEOUT unless one is passed), capped by the time left
+        before the deadline.
+
+        Args:
+            method: http method (i.e. 'get', 'post')
+            url: the url of the request
+            idempotent: whether the request can be safely repeated, defaults to the convention of the method
+            deadline: optional Deadline of the operation the request belongs to
+            kwargs: passed to requests
+
+        Returns:
+            response: the last response received. Callers still check the status code.
+        """
+
+        method = method.lower()
+        if idempotent is None:
+            idempotent = method in self.IDEMPOTENT_METHODS
+
+        deadline = deadline if deadline is not None else Deadline()
+        timeout = kwargs.pop('timeout', DEFAULT_TIMEOUT)
+
+        attempt = 0
+        while True:
+            self._count('seconds_waited', self.limiter.acquire(deadline))
+            kwargs['timeout'] = deadline.timeout(timeout)
+            self._count('requests')
+            deadline.count_request()
+
+            try:
+                response = self._send(method, url, kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count('errors')
+
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+
+                self._retry(self._backoff(attempt), deadline)
+                attempt += 1
+                continue
+
+            if response.status_code == 429 and attempt < self.max_retries:
+                self._count('throttled')
+                delay = self._retry_after(response)
+                delay = delay if delay is not None else self._backoff(attempt)
+
+                # every thread backs off, not only the one that got throttled
+                self.limiter.pause(delay)
+                self._retry(0, deadline)
+                attempt += 1
+                continue
+
+            if response.status_code in self.RETRY_STATUS_CODES and idempotent and attempt < self.max_retries:
+                self._count('errors')
+                delay = self._retry_after(response)
+                self._retry(delay if delay is not None else self._backoff(attempt), deadline)
+                attempt += 1
+                continue
+
+            return response
+
+    def _send(self, method, url, kwargs):
+        if self.transport is not None:
+            return self.transport.send(method, url, **kwargs)
+
+        return getattr(self.session if self.session is not None else requests, method)(url, **kwargs)
+
+    def stats(self) -> dict:
+        """ A snapshot of the throttle statistics
+
+        Returns:
+            a dictionary with the number of requests sent, responses throttled, retries,
+            errors and the total seconds spent waiting on the rate limiter and backoffs
+        """
+
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _retry(self, delay, deadline):
+        self._count('retries')
+
+        if delay > 0:
+            self._count('seconds_waited', delay)
+            deadline.sleep(delay)
+
+    def _backoff(self, attempt) -> float:
+        # exponential backoff with full jitter
+        return uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(response):
+        """ Parses the 'Retry-After' header, which is either a number of seconds or a http date """
+
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,196 @@
+from concurrent.futures import Future
+from threading import Event, Lock, Thread
+
+import json
+
+from cli.scheduler import RequestScheduler
+
+class StatusWatcher(object):
+    """ Tracks the status of any number of models with a single listing call per interval.
+
+    Instead of every training polling its own /v1/customizations/{id} endpoint, the watcher polls
+    /v1/customizations once per interval and resolves the waiters of every model it finds. Models
+    missing from the listing (or every model, if the listing fails) are checked one by one.
+
+    Attributes:
+        url: url of the instance
+        interval: seconds between two polls
+        scheduler: the RequestScheduler the requests are sent through
+        endpoint: 'customizations' for language models, 'acoustic_customizations' for acoustic models
+    """
+
+    _instances = {}
+    _instances_lock = Lock()
+
+    def __init__(self, url, api_key, interval=1.0, scheduler=None, endpoint='customizations'):
+        self.url = url
+        self.interval = interval
+        self.endpoint = endpoint
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler.shared()
+
+        self._api_key = api_key
+        self._waiters = {}
+        self._statuses = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    @classmethod
+    def for_instance(cls, url, api_key, endpoint='customizations', **kwargs):
+        """ Returns the watcher shared by every model of the instance (of the kind of the endpoint) """
+
+        with cls._instances_lock:
+            key = (url, api_key, endpoint)
+
+            if key not in cls._instances:
+                cls._instances[key] = cls(url, api_key, endpoint=endpoint, **kwargs)
+
+            return cls._instances[key]
+
+    def watch(self, customization_id, targets=('available',), callback=None) -> Future:
+        """ Waits for the model to reach one of the target states.
+
+        Args:
+            customization_id: id of the model
+            targets: the states that resolve the future (i.e. 'ready', 'available')
+            callback: optional function called with the customization id and the status once resolved
+
+        Returns:
+            a Future resolved with the status reached. If the model fails (and 'failed' is not a target)
+            the future raises an Exception.
+        """
+
+        future = Future()
+
+        if callback is not None:
+            def notify(done):
+                if done.cancelled():
+                    return
+
+                status = done.result() if done.exception() is None else 'failed'
+                callback(customization_id, status)
+
+            future.add_done_callback(notify)
+
+        with self._lock:
+            self._waiters.setdefault(customization_id, []).append((tuple(targets), future))
+
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+        return future
+
+    def statuses(self) -> dict:
+        """ The last status seen of every model """
+
+        with self._lock:
+            return dict(self._statuses)
+
+    def stop(self) -> None:
+        """ Stops polling. Pending futures are cancelled. """
+
+        self._stop.set()
+
+        with self._lock:
+            for waiters in self._waiters.values():
+                for _, future in waiters:
+                    future.cancel()
+
+            self._waiters = {}
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                # drop the waiters that gave up, i.e. after a Ctrl-C or an expired deadline
+                for customization_id in list(self._waiters):
+                    waiters = [(targets, future) for targets, future in self._waiters[customization_id]
+                               if not future.cancelled()]
+
+                    if waiters:
+                        self._waiters[customization_id] = waiters
+                    else:
+                        del self._waiters[customization_id]
+
+                if not self._waiters:
+                    # the next call to watch starts a new thread
+                    self._thread = None
+                    return
+
+                watched = list(self._waiters)
+
+            try:
+                self._resolve(self._poll(watched))
+            except Exception as e:
+                self._fail(watched, e)
+
+            self._stop.wait(self.interval)
+
+    def _poll(self, watched) -> dict:
+        statuses = {}
+
+        response = self.scheduler.request('get', f'{self.url}/v1/{self.endpoint}', auth=('apikey', self._api_key))
+
+        if response.status_code == 200:
+            for model in json.loads(response.text).get('customizations', []):
+                statuses[model['customization_id']] = model['status']
+
+        # fall back on the endpoint of the model when it is not in the listing
+        for customization_id in watched:
+            if customization_id in statuses:
+                continue
+
+            response = self.scheduler.request('get',
+                                              f'{self.url}/v1/{self.endpoint}/{customization_id}',
+                                              auth=('apikey', self._api_key))
+
+            if response.status_code == 200:
+                statuses[customization_id] = json.loads(response.text)['status']
+            else:
+                self._fail([customization_id], Exception(response.text))
+
+        return statuses
+
+    def _resolve(self, statuses):
+        resolved = []
+
+        with self._lock:
+            self._statuses.update(statuses)
+
+            for customization_id, status in statuses.items():
+                pending = []
+
+                for targets, future in self._waiters.get(customization_id, []):
+                    if status in targets:
+                        resolved.append((future, status, None))
+                    elif status == 'failed':
+                        resolved.append((future, None, Exception(f"Model {customization_id} failed")))
+                    else:
+                        pending.append((targets, future))
+
+                if customization_id in self._waiters:
+                    if pending:
+                        self._waiters[customization_id] = pending
+                    else:
+                        del self._waiters[customization_id]
+
+        # callbacks run outside of the lock, so they can watch other models
+        for future, status, error in resolved:
+            # a waiter cancelled in the meantime is skipped
+            if future.done() or not future.set_running_or_notify_cancel():
+                continue
+
+            if error is None:
+                future.set_result(status)
+            else:
+                future.set_exception(error)
+
+    def _fail(self, customization_ids, error):
+        with self._lock:
+            failed = [future for customization_id in customization_ids
+                      for _, future in self._waiters.pop(customization_id, [])]
+
+        for future in failed:
+            if not future.done() and future.set_running_or_notify_cancel():
+                future.set_exception(error)
@@ -1,14 +1,30 @@
 from configparser import ConfigParser
 from pathlib import Path
-from string import Template
-from time import sleep
 
-import requests
 import json
 
-import polling
 from progress.spinner import PixelSpinner
 
+from cli.deadline import DEFAULT_TIMEOUT, Cancelled, Deadline
+from cli.scheduler import RequestScheduler
+from cli.status_watcher import StatusWatcher
+from cli.response_parser import iter_results, parse_transcript
+
+# the audio types the STT API accepts
+AUDIO_SUFFIXES = ('.wav', '.flac', '.mp3', '.mpeg', '.ogg', '.webm', '.mulaw', '.alaw', '.l16', '.basic')
+
+class APIError(Exception):
+    """ An error status answered by the API. The message is the body of the response.
+
+    Attributes:
+        status_code: the http status of the response
+    """
+
+    def __init__(self, response):
+        super().__init__(response.text)
+        self.status_code = response.status_code
+
+
 class WatsonSTT(object):
     """ The WatsonSTT class is the backend of the CLI. This class is the wrapper class around
     the IBM Watson STT API. 
@@ -21,19 +37,33 @@ class WatsonSTT(object):
         url: url of the instance
         customization_id: customization id of the model
         status: the STT API provides several states for the model. This variable keeps track of the state
+        scheduler: the RequestScheduler every request is sent through
+        timeout: seconds a single request may wait on the socket
+        recognize_timeout: seconds a recognition may wait on the socket, None for the default
+        deadline: the Deadline shared by every step of the operation
     """
 
-    def __init__(self, url, customization_id=None):
+    def __init__(self, url, customization_id=None, scheduler=None, api_key=None, timeout=DEFAULT_TIMEOUT, deadline=None,
+                 recognize_timeout=None):
         """ Inits the class variables.
         Args: 
         url: url of the STT instance
         customization_id: id of the STT instance.
+        scheduler: the RequestScheduler to send the requests through. Defaults to the scheduler shared by the process
+        api_key: the API key of the instance. Read from the conf.ini file if not passed
+        timeout: seconds a single request may wait on the socket
+        deadline: optional Deadline of the whole operation (i.e. create -> corpus -> train). Every request
+        and wait stops when it expires or is cancelled
+        recognize_timeout: seconds a recognition may wait on the socket. Defaults to the longer of the timeout
+        and the recognize_timeout of the scheduler
         """
 
-        config = ConfigParser()
-        config.read('keys/conf.ini')
+        if api_key is None:
+            config = ConfigParser()
+            config.read('keys/conf.ini')
+            api_key = config['API_KEY']['WATSON_STT_API']
 
-        self.API_KEY = config['API_KEY']['WATSON_STT_API']
+        self.API_KEY = api_key
 
         self.name = ""
         self.descr = ""
@@ -42,6 +72,15 @@ class WatsonSTT(object):
         self.url = url
         self.customization_id = customization_id
         self.status = None
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler.shared()
+        self.timeout = timeout
+        self.recognize_timeout = recognize_timeout
+        self.deadline = deadline if deadline is not None else Deadline()
+
+    def _request(self, method, url, **kwargs):
+        """ Sends the request through the scheduler with the timeout and the deadline of the client """
+
+        return self.scheduler.request(method, url, timeout=kwargs.pop('timeout', self.timeout), deadline=self.deadline, **kwargs)
 
     def create_model(self, name: str, descr:str, model="en-US_ShortForm_NarrowbandModel") -> str:
         """Creates a model with the name, descr parameters, and it is trained on the model parameter.
@@ -68,7 +107,8 @@ class WatsonSTT(object):
                 "description": descr}
         data = json.dumps(data)
         
-        response = requests.post(f'{self.url}/v1/customizations', 
+        response = self._request('post',
+                                 f'{self.url}/v1/customizations', 
                                  headers=headers, 
                                  data=data, 
                                  auth=('apikey', self.API_KEY))
@@ -93,14 +133,16 @@ class WatsonSTT(object):
         else:
             raise Exception(response.text)
     
-    def training(self):
+    def training(self, watcher=None):
         """Kicks off the training suite. 
 
         To begin training, the model needs to be in the 'ready' state. Training continues
-        until the model reaches the 'available' state. 
+        until the model reaches the 'available' state. The status is tracked by a StatusWatcher
+        shared by every model of the instance, so training several models at once does not
+        multiply the status requests.
 
         Args:
-            -None
+            watcher: the StatusWatcher tracking the model. Defaults to the watcher of the instance
         
         Returns:
             - a completion of the training acknowledgement
@@ -109,23 +151,21 @@ class WatsonSTT(object):
         if self.customization_id is None:
             raise ValueError("No customization id provided!")
 
+        if watcher is None:
+            watcher = StatusWatcher.for_instance(self.url, self.API_KEY, scheduler=self.scheduler)
+
         if self.customization_id:
             # check status
-            with PixelSpinner("Allocating resources to begin training ") as bar:
-                while self.model_status() != 'ready':
-                    sleep(0.1)
-                    bar.next()
+            self.status = self._wait(watcher, "Allocating resources to begin training ", 'ready')
 
-        response = requests.post(f'{self.url}/v1/customizations/{self.customization_id}/train', 
+        response = self._request('post',
+                                 f'{self.url}/v1/customizations/{self.customization_id}/train', 
                                  auth=('apikey', self.API_KEY))
         
         if response.status_code == 200:
             print("Training Beginning")
         
-            with PixelSpinner(f"Training {self.name} ") as bar:
-                while self.model_status() != 'available':
-                    sleep(0.1)
-                    bar.next()
+            self.status = self._wait(watcher, f"Training {self.name} ", 'available')
             
             print("Training has finished")
             response = json.loads(response.text)
@@ -135,6 +175,23 @@ class WatsonSTT(object):
         else:
             raise Exception(response.text)
         
+    def _wait(self, watcher, message, *targets) -> str:
+        """ Spins until the watcher sees the model in one of the target states """
+
+        status = watcher.watch(self.customization_id, targets=targets)
+
+        try:
+            with PixelSpinner(message) as bar:
+                while not status.done():
+                    self.deadline.sleep(0.1)
+                    bar.next()
+        except (Cancelled, KeyboardInterrupt):
+            # the watcher stops tracking cancelled futures
+            status.cancel()
+            raise
+
+        return status.result()
+
     def add_corpus(self, corpus_path: str) -> None:
         """ Adds corpus/grammar/oov to a model. A customization id is required.
 
@@ -160,13 +217,19 @@ class WatsonSTT(object):
 
         url = f'{self.url}/v1/customizations/{self.customization_id}/corpora/{corpus_name}'
         params = (('allow_overwrite', True),)
-        response = requests.post(url, 
-                                data=data, 
-                                params=params, 
-                                auth=('apikey', self.API_KEY))
+        # the corpus is overwritten, so uploading it twice is safe
+        response = self._request('post',
+                                 url, 
+                                 idempotent=True,
+                                 data=data, 
+                                 params=params, 
+                                 auth=('apikey', self.API_KEY))
 
         if response.status_code == 201:
             print("Corpus Successfully Added")
+
+        else:
+            raise Exception(response.text)
     
     def model_status(self):
         """ A function that returns the state of the model
@@ -176,8 +239,9 @@ class WatsonSTT(object):
             status: a string describing the status
         """
 
-        response = requests.get(f'{self.url}/v1/customizations/{self.customization_id}', 
-                                auth=('apikey', self.API_KEY))
+        response = self._request('get',
+                                 f'{self.url}/v1/customizations/{self.customization_id}', 
+                                 auth=('apikey', self.API_KEY))
         
 
         if self.customization_id is None:
@@ -190,19 +254,139 @@ class WatsonSTT(object):
 
         else:
             raise Exception(response.text)
+
+    def model_details(self) -> dict:
+        """ Returns the metadata of the model (status, 'updated' timestamp, progress...) """
+
+        if self.customization_id is None:
+            raise ValueError("No customization id provided!")
+
+        response = self._request('get',
+                                 f'{self.url}/v1/customizations/{self.customization_id}',
+                                 auth=('apikey', self.API_KEY))
+
+        if response.status_code == 200:
+            return json.loads(response.text)
+
+        else:
+            raise Exception(response.text)
+
+    def custom_words(self, word_type='all') -> list:
+        """ Returns the custom words of the model
+
+        Args:
+        word_type: 'all', 'user' (added directly) or 'corpora' (extracted from the corpora)
+
+        Returns
+        the list of the words, with their 'display_as' and 'sounds_like' forms
+        """
+
+        if self.customization_id is None:
+            raise ValueError("No customization id provided!")
+
+        response = self._request('get',
+                                 f'{self.url}/v1/customizations/{self.customization_id}/words',
+                                 params=(('word_type', word_type),),
+                                 auth=('apikey', self.API_KEY))
+
+        if response.status_code == 200:
+            return json.loads(response.text).get('words', [])
+
+        else:
+            raise Exception(response.text)
     
-    def transcribe(self, path_to_audio_file):
+    def transcribe(self, path_to_audio_file, timestamps=False, word_confidence=False, parse=False):
         """Takes in a path to the audio file to transcribe
         and returns the trancription of the audio along with the confidence levels
 
         Args:
         path_to_audio_file: string to the audio file
+        timestamps: request the start and end time of every word
+        word_confidence: request the confidence of every word
+        parse: return a cli.transcript.Transcript instead of the raw json object
 
         Returns
         response: a json object of the transcription that also contains metadata on the confidence
         of the transcription
         """
 
+        response = self._recognize(path_to_audio_file, timestamps, word_confidence, stream=parse)
+
+        if response.status_code == 200:
+            if parse:
+                return self._parse(response)
+
+            response = json.loads(response.text)
+            
+            return response
+
+        else:
+            raise APIError(response)
+
+    def transcribe_audio(self, audio: bytes, content_type='wav', timestamps=False, word_confidence=False,
+                         customization_weight=None, parse=False):
+        """Transcribes audio held in memory, i.e. a span cut out of a longer file
+
+        Args:
+        audio: the bytes of the audio
+        content_type: the audio type (i.e. 'wav', 'flac')
+        timestamps: request the start and end time of every word
+        word_confidence: request the confidence of every word
+        customization_weight: optional weight given to the custom model, between 0 and 1
+        parse: return a cli.transcript.Transcript instead of the raw json object
+
+        Returns
+        response: a json object of the transcription
+        """
+
+        response = self._recognize_audio(audio, content_type, timestamps, word_confidence, stream=parse,
+                                         customization_weight=customization_weight)
+
+        if response.status_code == 200:
+            return self._parse(response) if parse else json.loads(response.text)
+
+        else:
+            raise APIError(response)
+
+    @staticmethod
+    def _parse(response, chunk_size=65536):
+        """ Builds the Transcript of a streamed response as its bytes arrive, without the intermediate dict tree """
+
+        try:
+            return parse_transcript(response.iter_content(chunk_size=chunk_size))
+        finally:
+            response.close()
+
+    def transcribe_iter(self, path_to_audio_file, fields=None, timestamps=False, word_confidence=False, chunk_size=65536):
+        """Transcribes the audio file and parses the response as it streams in.
+
+        Only the result being received is held in memory, which keeps the peak memory flat for long
+        audio with timestamps and word alternatives.
+
+        Args:
+        path_to_audio_file: string to the audio file
+        fields: optional fields of the alternatives to keep, i.e. ('transcript', 'confidence')
+        timestamps: request the start and end time of every word
+        word_confidence: request the confidence of every word
+        chunk_size: number of bytes read from the socket at a time
+
+        Yields
+        the results of the transcription one at a time
+        """
+
+        response = self._recognize(path_to_audio_file, timestamps, word_confidence, stream=True)
+
+        if response.status_code != 200:
+            raise APIError(response)
+
+        try:
+            yield from iter_results(response.iter_content(chunk_size=chunk_size), fields=fields)
+        finally:
+            response.close()
+
+    def _recognize(self, path_to_audio_file, timestamps=False, word_confidence=False, stream=False):
+        """ Sends the audio file to the /v1/recognize endpoint and returns the response """
+
         audio_file = None
         path_to_audio_file = Path(path_to_audio_file)
 
@@ -214,41 +398,66 @@ class WatsonSTT(object):
         
         # @TODO: check to see if this is a valid audio type
         content_type = path_to_audio_file.suffix.replace('.', '') # parse the audio file type from the stem
-        sync_url = f"{self.url}/v1/recognize?language_customization_id={self.customization_id}"
+
+        return self._recognize_audio(audio_file, content_type, timestamps, word_confidence, stream=stream)
+
+    def _recognize_audio(self, audio, content_type, timestamps=False, word_confidence=False, stream=False, customization_weight=None):
+        """ Sends the audio to the /v1/recognize endpoint and returns the response """
+
+        sync_url = f"{self.url}/v1/recognize"
         headers = {'Content-Type': f'audio/{content_type}'}
-        response = requests.post(url=sync_url, 
-                                 data=audio_file, 
-                                 headers=headers, 
-                                 auth=('apikey', self.API_KEY))
-        
+        params = [('language_customization_id', self.customization_id)]
 
-        if response.status_code == 200:
-            response = json.loads(response.text)
-            
-            return response
+        if customization_weight is not None:
+            params.append(('customization_weight', str(customization_weight)))
 
-        else:
-            raise Exception(response.text)
+        if timestamps:
+            params.append(('timestamps', 'true'))
+        
+        if word_confidence:
+            params.append(('word_confidence', 'true'))
+
+        # recognizing the same audio twice has no side effects. The answer only comes once the whole
+        # audio is transcribed, so the recognition gets the longer timeout of the scheduler
+        timeout = self.recognize_timeout
+        if timeout is None and self.timeout is not None:
+            timeout = max(self.timeout, self.scheduler.recognize_timeout)
+
+        return self._request('post',
+                             sync_url, 
+                             idempotent=True,
+                             timeout=timeout,
+                             stream=stream,
+                             data=audio, 
+                             headers=headers, 
+                             params=tuple(params),
+                             auth=('apikey', self.API_KEY))
 
     @staticmethod
-    def all_model_status(url=None, api_key=None) -> list:
+    def all_model_status(url=None, api_key=None, deadline=None, scheduler=None) -> list:
         """A helper function that returns the states for ALL models created
         
         Args:
         url: instance url
         api_key
+        deadline: optional Deadline of the operation
+        scheduler: the RequestScheduler to send the request through. Defaults to the scheduler shared by the process
 
         Returns
         - a json array of the models created on the instance and their url along with all other metadata
         """
 
-        response = requests.get(f'{url}/v1/customizations', auth=('apikey', api_key))
+        scheduler = scheduler if scheduler is not None else RequestScheduler.shared()
+        response = scheduler.request('get', 
+                                     f'{url}/v1/customizations', 
+                                     deadline=deadline, 
+                                     auth=('apikey', api_key))
         response = json.loads(response.text)
 
         return response
     
     @staticmethod
-    def delete_model(url:str=None, api_key:str=None, customization_id:str=None) -> bool:
+    def delete_model(url:str=None, api_key:str=None, customization_id:str=None, deadline=None, scheduler=None) -> bool:
         """ Deletes the models with the passed configuration ids.
 
         The function accepts the url and apikey of the instance along with the customization id
@@ -258,19 +467,27 @@ class WatsonSTT(object):
         url
         api_key
         customization_id: a unique identifier for a custom stt model
+        deadline: optional Deadline, waiting for the deletion stops when it expires or is cancelled
+        scheduler: the RequestScheduler to send the requests through. Defaults to the scheduler shared by the process
 
         Returns
         a boolean to siginify whether deleting the model was succcessful
         """ 
 
+        deadline = deadline if deadline is not None else Deadline()
+        scheduler = scheduler if scheduler is not None else RequestScheduler.shared()
+
         try:
-            response = requests.delete(f'{url}/v1/customizations/{customization_id}', auth=('apikey', api_key))
+            response = scheduler.request('delete',
+                                         f'{url}/v1/customizations/{customization_id}', 
+                                         deadline=deadline,
+                                         auth=('apikey', api_key))
             if response.status_code == 200:
                 print()
 
                 with PixelSpinner(f"Deleting model with id: {customization_id} ") as bar:
-                    while not WatsonSTT.model_deletion_checker(url, api_key, customization_id):
-                        sleep(0.01)
+                    while not WatsonSTT.model_deletion_checker(url, api_key, customization_id, deadline, scheduler):
+                        deadline.sleep(0.01)
                         bar.update()
                 
                 print(f"Model {customization_id} Succesfully Deleted")
@@ -281,25 +498,33 @@ class WatsonSTT(object):
             else:
                 raise Exception(response.text)
 
+        except Cancelled:
+            raise
+
         except Exception as e:
                 print(e)
     
     @staticmethod
-    def model_deletion_checker(url, api_key, customization_id):
+    def model_deletion_checker(url, api_key, customization_id, deadline=None, scheduler=None):
         """ Helper function that pings the API to confirm if the API was deleted
 
         Args:
         url
         api_key
         customization_id: a unique identifier for a custom stt model
+        deadline: optional Deadline of the operation
+        scheduler: the RequestScheduler to send the request through. Defaults to the scheduler shared by the process
 
         Returns
         a boolean to siginify whether deleting the model was succcessful
 
         """
 
-        response = requests.get(f'{url}/v1/customizations/{customization_id}', 
-                                auth=('apikey', api_key))
+        scheduler = scheduler if scheduler is not None else RequestScheduler.shared()
+        response = scheduler.request('get',
+                                     f'{url}/v1/customizations/{customization_id}', 
+                                     deadline=deadline,
+                                     auth=('apikey', api_key))
 
         if response.status_code in [200, 401]:
             return True
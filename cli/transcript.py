@@ -0,0 +1,217 @@
+from array import array
+from sys import intern
+
+import json
+
+class Alternative(object):
+    """ A single hypothesis of a recognition result.
+
+    Word level data is kept in contiguous arrays instead of the nested lists
+    returned by the API, so thousands of transcripts can be held in memory and
+    handed to vectorized code (numpy.frombuffer works on the arrays directly).
+
+    Attributes:
+        transcript: the text of the hypothesis
+        confidence: the confidence of the hypothesis, None if the API did not return one
+        words: tuple of the (interned) words of the hypothesis
+        starts: array of the start time of every word in seconds
+        ends: array of the end time of every word in seconds
+        word_confidences: array of the confidence of every word
+    """
+
+    __slots__ = ('transcript', 'confidence', 'words', 'starts', 'ends', 'word_confidences')
+
+    def __init__(self, transcript="", confidence=None, words=(), starts=None, ends=None, word_confidences=None):
+        self.transcript = transcript
+        self.confidence = confidence
+        self.words = tuple(words)
+        self.starts = starts if starts is not None else array('d')
+        self.ends = ends if ends is not None else array('d')
+        self.word_confidences = word_confidences if word_confidences is not None else array('d')
+
+    @classmethod
+    def from_response(cls, alternative: dict):
+        """ Builds the alternative from the dictionary returned by the API.
+
+        Args:
+            alternative: one entry of the 'alternatives' array
+        Returns:
+            an Alternative
+        """
+
+        timestamps = alternative.get('timestamps', [])
+        word_confidence = alternative.get('word_confidence', [])
+
+        # the words come from the timestamps, or from the word confidences if no timestamps were requested
+        source = timestamps if timestamps else word_confidence
+        words = tuple(intern(entry[0]) for entry in source)
+
+        starts = array('d', (entry[1] for entry in timestamps))
+        ends = array('d', (entry[2] for entry in timestamps))
+        word_confidences = array('d', (entry[1] for entry in word_confidence))
+
+        return cls(transcript=alternative.get('transcript', ""),
+                   confidence=alternative.get('confidence'),
+                   words=words,
+                   starts=starts,
+                   ends=ends,
+                   word_confidences=word_confidences)
+
+    def to_dict(self) -> dict:
+        """ Converts the alternative back into the format returned by the API """
+
+        alternative = {'transcript': self.transcript}
+
+        if self.confidence is not None:
+            alternative['confidence'] = self.confidence
+
+        if len(self.starts):
+            alternative['timestamps'] = [[word, start, end] for word, start, end
+                                         in zip(self.words, self.starts, self.ends)]
+
+        if len(self.word_confidences):
+            alternative['word_confidence'] = [[word, confidence] for word, confidence
+                                              in zip(self.words, self.word_confidences)]
+
+        return alternative
+
+
+class SpeechResult(object):
+    """ A final or interim result holding one or more alternatives.
+
+    Attributes:
+        final: whether the result is final
+        alternatives: tuple of Alternative, the best hypothesis is first
+    """
+
+    __slots__ = ('final', 'alternatives')
+
+    def __init__(self, final=True, alternatives=()):
+        self.final = final
+        self.alternatives = tuple(alternatives)
+
+    @property
+    def best(self):
+        """ The most likely alternative of the result, None if there are no alternatives """
+
+        return self.alternatives[0] if self.alternatives else None
+
+    @classmethod
+    def from_response(cls, result: dict):
+        alternatives = [Alternative.from_response(alternative) for alternative in result.get('alternatives', [])]
+
+        return cls(final=result.get('final', True), alternatives=alternatives)
+
+    def to_dict(self) -> dict:
+        return {'final': self.final,
+                'alternatives': [alternative.to_dict() for alternative in self.alternatives]}
+
+
+class Transcript(object):
+    """ A parsed response of the /v1/recognize endpoint.
+
+    Attributes:
+        result_index: the index of the first result in the response
+        results: tuple of SpeechResult
+    """
+
+    __slots__ = ('result_index', 'results')
+
+    def __init__(self, result_index=0, results=()):
+        self.result_index = result_index
+        self.results = tuple(results)
+
+    @classmethod
+    def from_response(cls, response: dict):
+        """ Builds the transcript from the dictionary returned by WatsonSTT.transcribe
+
+        Args:
+            response: the json object returned by the API
+        Returns:
+            a Transcript
+        """
+
+        if type(response) != dict:
+            raise TypeError("The response must be a \'dict\'")
+
+        results = [SpeechResult.from_response(result) for result in response.get('results', [])]
+
+        return cls(result_index=response.get('result_index', 0), results=results)
+
+    @classmethod
+    def from_json(cls, text):
+        """ Builds the transcript from the raw body (str or bytes) of the response """
+
+        return cls.from_response(json.loads(text))
+
+    def to_dict(self) -> dict:
+        """ Converts the transcript back into the format returned by the API """
+
+        return {'result_index': self.result_index,
+                'results': [result.to_dict() for result in self.results]}
+
+    @property
+    def text(self) -> str:
+        """ The best transcript of every result joined together """
+
+        return " ".join(result.best.transcript.strip() for result in self.results if result.best is not None)
+
+    def word_arrays(self) -> tuple:
+        """ Concatenates the word level data of the best alternative of every result
+
+        Returns:
+            words: tuple of words
+            starts: array of start times
+            ends: array of end times
+            confidences: array of word confidences
+        """
+
+        words = []
+        starts, ends, confidences = array('d'), array('d'), array('d')
+
+        for result in self.results:
+            best = result.best
+            if best is None:
+                continue
+
+            words.extend(best.words)
+            starts.extend(best.starts)
+            ends.extend(best.ends)
+            confidences.extend(best.word_confidences)
+
+        return tuple(words), starts, ends, confidences
+
+
+def parse_transcripts(responses) -> list:
+    """ Converts an iterable of API responses into a list of Transcript """
+
+    return [Transcript.from_response(response) for response in responses]
+
+
+def word_table(transcripts) -> dict:
+    """ Stacks the word level data of many transcripts into columns for batch analytics.
+
+    Args:
+        transcripts: an iterable of Transcript
+    Returns:
+        a dictionary of columns: 'transcript' (array of the index of the transcript each word
+        belongs to), 'word', 'start', 'end' and 'confidence'. The columns line up when the
+        transcripts were requested with both timestamps and word confidences.
+    """
+
+    table = {'transcript': array('l'),
+             'word': [],
+             'start': array('d'),
+             'end': array('d'),
+             'confidence': array('d')}
+
+    for index, transcript in enumerate(transcripts):
+        words, starts, ends, confidences = transcript.word_arrays()
+
+        table['transcript'].extend([index] * len(words))
+        table['word'].extend(words)
+        table['start'].extend(starts)
+        table['end'].extend(ends)
+        table['confidence'].extend(confidences)
+
+    return table
@@ -0,0 +1,343 @@
+from configparser import ConfigParser
+from hashlib import sha1
+from pathlib import Path
+from random import Random
+from threading import Lock
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+
+import json
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# headers of the responses worth keeping in a fixture
+RECORDED_HEADERS = ('Content-Type', 'Retry-After')
+
+class RequestsTransport(object):
+    """ Sends the requests to the live service with requests, or a requests.Session when one is given """
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def send(self, method: str, url: str, **kwargs):
+        return getattr(self.session if self.session is not None else requests, method)(url, **kwargs)
+
+
+def _key(method, url, params=None, data=None) -> dict:
+    """ What identifies a request in a fixture: the method, the path, the query and the body.
+
+    The host is left out so fixtures recorded on one instance replay against any url. Audio files
+    are identified by their name, other bodies by their digest.
+    """
+
+    if isinstance(params, dict):
+        params = params.items()
+
+    if data is None:
+        body = None
+    elif hasattr(data, 'name'):
+        body = Path(data.name).name
+    else:
+        body = sha1(data if isinstance(data, bytes) else str(data).encode('utf-8')).hexdigest()
+
+    return {'method': method.lower(),
+            'path': urlsplit(url).path,
+            'params': sorted([str(key), str(value)] for key, value in (params or ())),
+            'body': body}
+
+
+class RecordingTransport(object):
+    """ Forwards the requests to another transport and appends every interaction to a fixture file.
+
+    The fixture is a JSONL file with one interaction per line: the request (see _key, the API key is
+    never written), the status code, the headers and the body of the response and the time it took.
+
+    Attributes:
+        path: path of the fixture file
+        transport: the transport the requests are forwarded to, the live service by default
+    """
+
+    def __init__(self, path, transport=None):
+        self.path = Path(path)
+        self.transport = transport if transport is not None else RequestsTransport()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+
+    def send(self, method: str, url: str, **kwargs):
+        start = monotonic()
+        response = self.transport.send(method, url, **kwargs)
+        elapsed = monotonic() - start
+
+        # reading the content keeps it on the response, so a streamed body can still be iterated
+        interaction = {'request': _key(method, url, kwargs.get('params'), kwargs.get('data')),
+                       'status_code': response.status_code,
+                       'headers': {header: response.headers[header] for header in RECORDED_HEADERS
+                                   if header in response.headers},
+                       'body': response.content.decode('utf-8', errors='replace'),
+                       'elapsed': round(elapsed, 4)}
+
+        with self._lock:
+            with open(self.path, 'a') as fixture:
+                fixture.write(json.dumps(interaction) + '\n')
+
+        return response
+
+
+class ReplayResponse(object):
+    """ The part of requests.Response the client uses, built from a recorded interaction """
+
+    def __init__(self, status_code, body="", headers=None, url=None):
+        self.status_code = status_code
+        self.text = body
+        self.content = body.encode('utf-8')
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.url = url
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        for start in range(0, len(self.content), chunk_size):
+            chunk = self.content[start:start + chunk_size]
+            yield chunk.decode('utf-8', errors='ignore') if decode_unicode else chunk
+
+    def close(self) -> None:
+        pass
+
+
+def constant(seconds: float):
+    """ A latency distribution always returning the same number of seconds """
+
+    return lambda random, recorded: seconds
+
+
+def uniform(low: float, high: float):
+    """ A latency distribution uniform between low and high seconds """
+
+    return lambda random, recorded: random.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float):
+    """ A long tailed latency distribution, the usual shape of service latencies """
+
+    return lambda random, recorded: median * random.lognormvariate(0, sigma)
+
+
+def recorded(scale=1.0):
+    """ The latency recorded with the interaction, optionally scaled """
+
+    return lambda random, recorded: recorded * scale
+
+
+def parse_latency(text: str):
+    """ Parses a latency distribution of the conf.ini file:
+    'recorded', '<seconds>', 'uniform <low> <high>' or 'lognormal <median> <sigma>'
+    """
+
+    name, *args = text.split()
+
+    try:
+        if name == 'recorded':
+            return recorded(*map(float, args))
+        if name == 'uniform':
+            return uniform(*map(float, args))
+        if name == 'lognormal':
+            return lognormal(*map(float, args))
+
+        return constant(float(name))
+    except (TypeError, ValueError):
+        raise ValueError(f"Unknown latency distribution \'{text}\'")
+
+
+class ReplayTransport(object):
+    """ Answers the requests from a fixture file without any network, with injected latency and faults.
+
+    Requests are matched on their method, path, query and body, then on their method and path only.
+    When several interactions match, they are replayed in the recorded order and the last one repeats
+    (i.e. a model 'pending' then 'available'). Unmatched requests get a 404.
+
+    On top of the latency, every request may be throttled (429 with a 'Retry-After' header), fail
+    (503) or lose its connection (requests.ConnectionError), and requests beyond max_concurrent are
+    throttled, like a server at capacity. A request whose latency exceeds its timeout raises
+    requests.Timeout. With a seed, the sequence of latencies and faults is reproducible.
+
+    Attributes:
+        path: path of the fixture file. Interactions can also be added one by one with add
+        latency: latency distribution, the recorded latency by default
+        throttle_rate: probability of a 429
+        failure_rate: probability of a 503
+        error_rate: probability of a connection error
+        retry_after: 'Retry-After' of the throttled responses, in seconds
+        max_concurrent: number of requests served at once before throttling, None for no limit
+    """
+
+    def __init__(self, path=None, latency=None, throttle_rate=0.0, failure_rate=0.0, error_rate=0.0,
+                 retry_after=1.0, max_concurrent=None, seed=None):
+        for name, rate in (('throttle_rate', throttle_rate), ('failure_rate', failure_rate), ('error_rate', error_rate)):
+            if not 0 <= rate <= 1:
+                raise ValueError(f"The \'{name}\' must be between 0 and 1")
+
+        self.latency = latency if latency is not None else recorded()
+        self.throttle_rate = throttle_rate
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.max_concurrent = max_concurrent
+
+        self._interactions = {}
+        self._served = {}
+        self._in_flight = 0
+        self._random = Random(seed)
+        self._lock = Lock()
+        self._stats = {'requests': 0, 'throttled': 0, 'failed': 0, 'errors': 0, 'timeouts': 0, 'unmatched': 0}
+
+        if path is not None:
+            with open(path) as fixture:
+                for line in fixture:
+                    if line.strip():
+                        self.add(json.loads(line))
+
+    def add(self, interaction: dict) -> None:
+        """ Adds an interaction, in the format written by RecordingTransport """
+
+        request = interaction['request']
+
+        for key in (self._exact(request), self._loose(request)):
+            self._interactions.setdefault(key, []).append(interaction)
+
+    def stats(self) -> dict:
+        """ The number of requests served and of the faults injected """
+
+        with self._lock:
+            return dict(self._stats)
+
+    @staticmethod
+    def _exact(request):
+        return (request['method'], request['path'], json.dumps(request['params']), request['body'])
+
+    @staticmethod
+    def _loose(request):
+        return (request['method'], request['path'])
+
+    def _match(self, request):
+        for key in (self._exact(request), self._loose(request)):
+            interactions = self._interactions.get(key)
+
+            if interactions:
+                index = self._served.get(key, 0)
+                self._served[key] = index + 1
+
+                return interactions[min(index, len(interactions) - 1)]
+
+        return None
+
+    def send(self, method: str, url: str, **kwargs):
+        request = _key(method, url, kwargs.get('params'), kwargs.get('data'))
+
+        with self._lock:
+            self._stats['requests'] += 1
+            interaction = self._match(request)
+            draw = self._random.random()
+            delay = self.latency(self._random, interaction['elapsed'] if interaction is not None else 0.0)
+
+            at_capacity = self.max_concurrent is not None and self._in_flight >= self.max_concurrent
+            self._in_flight += 1
+
+        try:
+            timeout = kwargs.get('timeout')
+            if isinstance(timeout, tuple):
+                timeout = timeout[-1]
+
+            if timeout is not None and delay > timeout:
+                sleep(timeout)
+                self._count('timeouts')
+                raise requests.Timeout(f"Replayed request to {url} timed out after {timeout} seconds")
+
+            sleep(delay)
+
+            # one draw decides the fault, so the rates add up
+            if draw < self.error_rate:
+                self._count('errors')
+                raise requests.ConnectionError(f"Injected connection error on {url}")
+
+            if at_capacity or draw < self.error_rate + self.throttle_rate:
+                self._count('throttled')
+                return ReplayResponse(429, json.dumps({'error': 'Too Many Requests', 'code': 429}),
+                                      {'Retry-After': str(self.retry_after)}, url)
+
+            if draw < self.error_rate + self.throttle_rate + self.failure_rate:
+                self._count('failed')
+                return ReplayResponse(503, json.dumps({'error': 'Service Unavailable', 'code': 503}), url=url)
+
+            if interaction is None:
+                self._count('unmatched')
+                return ReplayResponse(404, json.dumps({'error': f"No recorded interaction for {method.upper()} {request['path']}",
+                                                       'code': 404}), url=url)
+
+            return ReplayResponse(interaction['status_code'], interaction['body'], interaction['headers'], url)
+
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+_transports = {}
+_transports_lock = Lock()
+
+def transport_from_config(path='keys/conf.ini'):
+    """ Returns the transport of the optional [TRANSPORT] section of the conf.ini file.
+
+    mode = record writes every interaction with the live service to the fixtures file,
+    mode = replay answers from it with the latency, throttle_rate, failure_rate, error_rate,
+    max_concurrent and seed keys. Every scheduler of the process shares the same transport.
+
+    Returns:
+        the transport, None without a [TRANSPORT] section (the requests go to the live service)
+    """
+
+    config = ConfigParser()
+    config.read(path)
+
+    if 'TRANSPORT' not in config.sections():
+        return None
+
+    section = config['TRANSPORT']
+    mode = section.get('mode', 'live')
+    fixtures = section.get('fixtures', 'fixtures/interactions.jsonl')
+
+    if mode == 'live':
+        return None
+
+    if mode not in ('record', 'replay'):
+        raise ValueError("The \'mode\' of the [TRANSPORT] section must be live, record or replay")
+
+    with _transports_lock:
+        key = (mode, fixtures)
+
+        if key not in _transports:
+            if mode == 'record':
+                _transports[key] = RecordingTransport(fixtures)
+            else:
+                max_concurrent = section.getint('max_concurrent', None)
+                seed = section.getint('seed', None)
+
+                _transports[key] = ReplayTransport(fixtures,
+                                                   latency=parse_latency(section.get('latency', 'recorded')),
+                                                   throttle_rate=section.getfloat('throttle_rate', 0.0),
+                                                   failure_rate=section.getfloat('failure_rate', 0.0),
+                                                   error_rate=section.getfloat('error_rate', 0.0),
+                                                   retry_after=section.getfloat('retry_after', 1.0),
+                                                   max_concurrent=max_concurrent,
+                                                   seed=seed)
+
+        return _transports[key]
@@ -9,7 +9,9 @@ from examples import custom_style_2
 from tqdm import tqdm
 
 from cli.stt import WatsonSTT
-from cli import clean_up
+from cli.dashboard import Dashboard, Task
+from cli.journal import JobJournal
+from cli import batch, clean_up
 
 # make sure the front end can handle the error thrown by the backend - just print error
 # @TODO: What happens if training fails? (check)
@@ -297,6 +299,79 @@ class VisualSTT(object):
 
         return models_to_id, model_choices
     
+    def _train_task(self, train):
+        """ The action training a new model with the answers of the train questions """
+
+        model_name = train['model_name']
+        model_descr = train['model_description']
+        oov_file_path = train['oov_file_path']
+
+        def run(deadline):
+            # the same answers resume an interrupted run instead of creating a second model
+            journal = JobJournal.for_inputs('train', self.url, model_name, model_descr, oov_file_path)
+            batch.train_model(self.url, [oov_file_path], name=model_name, descr=model_descr, 
+                              journal=journal, deadline=deadline)
+            journal.finish()
+
+        return run
+
+    def _update_task(self, update):
+        """ The action adding a corpus to an existing model and training it again """
+
+        model_customization_id = update['customization_id']
+        oov_file_path = update['oov_file_path']
+
+        def run(deadline):
+            journal = JobJournal.for_inputs('update', self.url, model_customization_id, oov_file_path)
+            batch.train_model(self.url, [oov_file_path], customization_id=model_customization_id, 
+                              journal=journal, deadline=deadline)
+            journal.finish()
+
+        return run
+
+    def _evaluate_task(self, evaluate_models, model_id):
+        """ The action transcribing the audio file with the selected models """
+
+        path_to_audio_file = evaluate_models['audio_file']
+        evaluate_models = evaluate_models['models_evaluate']
+
+        custom_ids = [model_id[eval_model] for eval_model in evaluate_models]
+        model_names = dict(zip(custom_ids, evaluate_models))
+
+        def run(deadline):
+            journal = JobJournal.for_inputs('evaluate', self.url, path_to_audio_file, custom_ids)
+            failed = False
+
+            # the models are transcribed at the same time too
+            evaluations = batch.evaluate(self.url, [path_to_audio_file], custom_ids, journal=journal, 
+                                         workers=len(custom_ids), deadline=deadline)
+
+            for _, id, results, error in evaluations:
+                if error is None:
+                    print()
+                    print("*" * 60)
+                    print(f"Transcription Results from {model_names[id]}:")
+                    pprint(results)
+                    print()
+                    print("*" * 60)
+                    print()
+                
+                else:
+                    failed = True
+                    print("*" * 60)
+                    print()
+                    print(f"Transcribing model {model_names[id]} failed.")
+                    print(error)
+                    print("*" * 60)
+                    print()
+            
+            if not failed:
+                journal.finish()
+            else:
+                raise Exception("Some transcriptions failed")
+
+        return run
+
     def runner(self):
         """ The runner parses the options selected and then calls 
         the backend functions from WatsonSTT class
@@ -348,71 +423,31 @@ class VisualSTT(object):
             answers = prompt(self.main_questions(), style=custom_style_2)
             model_options  = answers['custom_models_options']
 
+            # every question is asked first, then the actions run together
+            tasks = []
+
             for model_option in model_options:
 
                 if 'Train' in model_option:
                     # ask train questions
                     train = prompt(self.train_questions(), style=custom_style_2)
-
-                    model_name = train['model_name']
-                    model_descr = train['model_description']
-                    oov_file_path = train['oov_file_path']
-
-                    try:
-                        stt = WatsonSTT(url=self.url)
-                        stt.create_model(name=model_name, descr=model_descr)
-                        stt.add_corpus(oov_file_path)
-                        stt.training()
-                    except Exception as e:
-                        print(e)
+                    tasks.append(Task(f"Train {train['model_name']}", self._train_task(train)))
                 
                 if 'Update'in model_option:
                     update = prompt(self.update_questions(), style=custom_style_2)
-                    
-                    model_customization_id = update['customization_id']
-                    oov_file_path = update['oov_file_path']
-
-                    try:
-                        stt = WatsonSTT(url=self.url, customization_id=model_customization_id)
-                        stt.add_corpus(corpus_path=oov_file_path)
-                        stt.training()
-                    except Exception as e:
-                        print(e)
+                    tasks.append(Task(f"Update {update['customization_id']}", self._update_task(update)))
 
                 if 'Evaluate' in model_option:
                     model_id, evaluate_answers = self.evaluate_questions()
                     evaluate_models = prompt(evaluate_answers, style=custom_style_2)
-                    
-                    path_to_audio_file = evaluate_models['audio_file']
-                    evaluate_models = evaluate_models['models_evaluate']
-
-                    custom_ids = [model_id[eval_model] for eval_model in evaluate_models]
-
-                    for index, id in enumerate(custom_ids):
-                        stt = WatsonSTT(url=self.url, customization_id=id)
-                        try:
-                            results = stt.transcribe(path_to_audio_file)
-
-                            print()
-                            print("*" * 60)
-                            print(f"Transcription Results from {evaluate_models[index]}:")
-                            pprint(results)
-                            print()
-                            print("*" * 60)
-                            print()
-                        
-                        except Exception as e:
-                            print("*" * 60)
-                            print()
-                            print(f"Transcribing model {evaluate_models[index]} failed.")
-                            print(e)
-                            print("*" * 60)
-                            print()
-
+                    tasks.append(Task(f"Evaluate {Path(evaluate_models['audio_file']).name}",
+                                      self._evaluate_task(evaluate_models, model_id)))
                 
                 if 'See Available Models' in model_option:
-                    models = WatsonSTT.all_model_status(url=self.url, api_key=self.api_key)
-                    pprint(models)
+                    tasks.append(Task("See Available Models",
+                                      lambda deadline: pprint(WatsonSTT.all_model_status(url=self.url, 
+                                                                                         api_key=self.api_key, 
+                                                                                         deadline=deadline))))
 
                 # check if the model can be deleted
                 # error of the model should be 409
@@ -421,22 +456,34 @@ class VisualSTT(object):
                     delete_options = delete_options['delete_all'].strip().lower()
                     
                     if delete_options in ('y', 'yes'):
-                        clean_up.clean_up(url=self.url, customization_ids=['all'])
+                        custom_ids_del_models = ['all']
                     elif delete_options in ('n', 'no'):
                         models_id, models_delete = self._delete_specific_models()
                         selected_models = prompt(models_delete, style=custom_style_2)
                         
                         models_to_delete = selected_models['models_to_delete']
                         custom_ids_del_models = [models_id[del_model] for del_model in models_to_delete]
-
-                        # delete the models 
-                        clean_up.clean_up(self.url, custom_ids_del_models)
                     else:
                         print("Only \'yes\' and \'no\' inputs allowed")
                         raise KeyboardInterrupt
+
+                    # the models may still be trained or evaluated by the other actions, so delete them last
+                    tasks.append(Task("Delete", 
+                                      # the deletion of all the models was confirmed by the question above
+                                      lambda deadline, ids=custom_ids_del_models: clean_up.clean_up(self.url, ids, 
+                                                                                                    deadline=deadline,
+                                                                                                    confirmed=True),
+                                      after=list(tasks)))
+
+            dashboard = Dashboard(tasks)
+            try:
+                dashboard.run()
+            finally:
+                dashboard.report()
             
         except KeyboardInterrupt:
             print("Action Cancelled")
+            print("Completed steps are saved. Run the same action again to resume where it stopped.")
 
 if __name__ == "__main__":
     VisualSTT().runner()
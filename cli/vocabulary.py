@@ -0,0 +1,276 @@
+from collections import Counter
+from pathlib import Path
+from time import time
+
+import json
+import os
+import re
+
+from cli.stt import WatsonSTT
+from cli.transcript import Transcript
+
+# words, with their inner apostrophes and dashes (don't, speech-to-text). Underscores split tokens.
+_TOKEN = re.compile(r"[^\W_]+(?:['’-][^\W_]+)*")
+
+def tokenize(text: str) -> list:
+    """ Splits the text into lower case tokens """
+
+    return _TOKEN.findall(text.lower())
+
+
+class VocabularyIndex(object):
+    """ The words a model knows, indexed for coverage checks.
+
+    Single words are kept in a set. Compound custom words (IBM_Watson) and display forms with spaces
+    are kept as phrases of several tokens, indexed by their first token: only the tokens of the text
+    starting a phrase are checked against the phrases, so the scan time does not grow with their number.
+
+    Attributes:
+        words: set of the known tokens
+        phrases: set of the known phrases, as tuples of tokens
+    """
+
+    def __init__(self, words=()):
+        self.words = set()
+        self.phrases = set()
+        self._starts = None
+
+        self.add_words(words)
+
+    @classmethod
+    def from_file(cls, path):
+        """ An index of a word list, one word per line (i.e. the vocabulary of the base model) """
+
+        with open(path, 'r') as words:
+            return cls(line.strip() for line in words if line.strip())
+
+    def add_words(self, words) -> None:
+        for word in words:
+            tokens = tuple(tokenize(word))
+
+            if len(tokens) == 1:
+                self.words.add(tokens[0])
+            elif len(tokens) > 1:
+                self.phrases.add(tokens)
+
+        self._starts = None
+
+    def update(self, other) -> None:
+        """ Adds the words of another index """
+
+        self.words |= other.words
+        self.phrases |= other.phrases
+        self._starts = None
+
+    def __contains__(self, word) -> bool:
+        tokens = tuple(tokenize(word))
+
+        return tokens in self.phrases if len(tokens) > 1 else len(tokens) == 1 and tokens[0] in self.words
+
+    def __len__(self):
+        return len(self.words) + len(self.phrases)
+
+    def _phrase_starts(self) -> dict:
+        """ The phrases by their first token, the longest first so they win over their prefixes """
+
+        if self._starts is None:
+            self._starts = {}
+
+            for phrase in sorted(self.phrases, key=len, reverse=True):
+                self._starts.setdefault(phrase[0], []).append(phrase)
+
+        return self._starts
+
+    def coverage(self, lines):
+        """ Checks which tokens of the text are known.
+
+        Args:
+            lines: an iterable of text, i.e. an open file
+
+        Returns:
+            a CoverageReport
+        """
+
+        counts = Counter()
+        in_phrases = Counter()
+        starts = self._phrase_starts()
+
+        def scan(block):
+            tokens = _TOKEN.findall(block.lower())
+            counts.update(tokens)
+
+            # phrases are only looked for when a token of the block starts one
+            if not starts or starts.keys().isdisjoint(tokens):
+                return
+
+            end = 0
+            for i, token in enumerate(tokens):
+                if i < end or token not in starts:
+                    continue
+
+                for phrase in starts[token]:
+                    if tuple(tokens[i:i + len(phrase)]) == phrase:
+                        in_phrases.update(phrase)
+                        end = i + len(phrase)
+                        break
+
+        # the lines are scanned by blocks of about a megabyte, the regex and the Counter then run in C
+        block, size = [], 0
+        for line in lines:
+            block.append(line)
+            size += len(line)
+
+            if size >= 1 << 20:
+                scan("\n".join(block))
+                block, size = [], 0
+
+        scan("\n".join(block))
+
+        # the membership of every distinct token is only checked once
+        uncovered = Counter()
+        for token, count in counts.items():
+            if token not in self.words:
+                count -= in_phrases.get(token, 0)
+
+                if count > 0:
+                    uncovered[token] = count
+
+        return CoverageReport(sum(counts.values()), len(counts), uncovered)
+
+    def coverage_of_files(self, paths):
+        """ Checks the coverage of text files (corpora, reference transcripts) and of transcriptions
+        saved as json (only their text is read)
+
+        Args:
+            paths: paths of the files
+
+        Returns:
+            a CoverageReport
+        """
+
+        def lines():
+            for path in map(Path, paths):
+                if path.suffix.lower() == '.json':
+                    yield Transcript.from_json(path.read_text()).text
+                    continue
+
+                with open(path, 'r', errors='replace') as text:
+                    yield from text
+
+        return self.coverage(lines())
+
+
+class CoverageReport(object):
+    """ The coverage of a text by a vocabulary.
+
+    Attributes:
+        tokens: number of tokens of the text
+        unique: number of distinct tokens
+        uncovered: Counter of the tokens not in the vocabulary
+    """
+
+    def __init__(self, tokens, unique, uncovered):
+        self.tokens = tokens
+        self.unique = unique
+        self.uncovered = uncovered
+
+    @property
+    def coverage(self) -> float:
+        """ The share of the tokens of the text that are known """
+
+        return 1.0 - sum(self.uncovered.values()) / self.tokens if self.tokens else 1.0
+
+    def top(self, n=50) -> list:
+        """ The n most frequent uncovered terms and their counts """
+
+        return self.uncovered.most_common(n)
+
+    def to_dict(self, n=50) -> dict:
+        return {'tokens': self.tokens,
+                'unique': self.unique,
+                'coverage': round(self.coverage, 4),
+                'uncovered_terms': len(self.uncovered),
+                'top_uncovered': self.top(n)}
+
+
+class VocabularyCache(object):
+    """ Keeps a local copy of the custom words of every model.
+
+    The words of a model are only downloaded again when its 'updated' timestamp changed since the
+    last download (i.e. after a corpus was added or words were edited), and not at all while the
+    copy is younger than max_age seconds.
+
+    Attributes:
+        url: url of the instance
+        directory: where the copies are kept, one json file per model
+        max_age: seconds a copy is used without checking the model
+    """
+
+    def __init__(self, url, api_key=None, directory='.vocabulary', max_age=0, deadline=None):
+        self.url = url
+        self.directory = Path(directory)
+        self.max_age = max_age
+
+        self._api_key = api_key
+        self._deadline = deadline
+
+    def _path(self, customization_id) -> Path:
+        return self.directory / f"{customization_id}.json"
+
+    def _load(self, customization_id):
+        try:
+            with open(self._path(customization_id), 'r') as cache:
+                return json.load(cache)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, customization_id, entry) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        partial = self._path(customization_id).with_suffix('.part')
+
+        with open(partial, 'w') as cache:
+            json.dump(entry, cache)
+
+        os.replace(partial, self._path(customization_id))
+
+    def words(self, customization_id, refresh=True) -> list:
+        """ The custom words of the model, from the local copy when it is up to date.
+
+        Args:
+            customization_id: id of the model
+            refresh: check the model for changes, otherwise the local copy is used as is when there is one
+
+        Returns:
+            the list of the words, as returned by the API
+        """
+
+        entry = self._load(customization_id)
+
+        if entry is not None and (not refresh or time() - entry['fetched'] < self.max_age):
+            return entry['words']
+
+        stt = WatsonSTT(url=self.url, customization_id=customization_id, api_key=self._api_key, deadline=self._deadline)
+        updated = stt.model_details().get('updated')
+
+        if entry is not None and updated is not None and entry['updated'] == updated:
+            entry['fetched'] = time()
+            self._save(customization_id, entry)
+
+            return entry['words']
+
+        words = [{key: word[key] for key in ('word', 'display_as', 'count') if key in word} for word in stt.custom_words()]
+        self._save(customization_id, {'updated': updated, 'fetched': time(), 'words': words})
+
+        return words
+
+    def index(self, *customization_ids, refresh=True) -> VocabularyIndex:
+        """ An index of the custom words of the models, and of their display forms """
+
+        index = VocabularyIndex()
+
+        for customization_id in customization_ids:
+            words = self.words(customization_id, refresh=refresh)
+            index.add_words(word['word'] for word in words)
+            index.add_words(word['display_as'] for word in words if word.get('display_as'))
+
+        return index
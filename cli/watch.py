@@ -0,0 +1,392 @@
+from ctypes.util import find_library
+from pathlib import Path
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import monotonic, time
+
+import ctypes
+import json
+import os
+import select
+import struct
+import sys
+
+from cli.deadline import Cancelled, Deadline
+from cli.journal import JobJournal
+from cli.stt import AUDIO_SUFFIXES, WatsonSTT
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT = struct.Struct('iIII')
+
+class _InotifyWatcher(object):
+    """ Reports the files of the directory closed after writing or moved into it, through inotify (Linux only) """
+
+    def __init__(self, directory):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+
+        libc = ctypes.CDLL(find_library('c') or 'libc.so.6', use_errno=True)
+
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        if libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), f"Cannot watch {directory}")
+
+        self.directory = Path(directory)
+
+    def changes(self, timeout):
+        """ Waits up to timeout seconds for events.
+
+        Returns:
+            the list of the names of the files whose writes finished, None if events were lost and
+            the whole directory must be scanned again
+        """
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+
+        while offset < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                return None
+
+            names.append(os.fsdecode(name))
+
+        return names
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class JsonlSink(object):
+    """ Appends every transcription, or its error, as a json line to a file """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+
+    def write(self, audio_file, customization_id, results, error=None) -> None:
+        entry = {'audio_file': str(audio_file), 'customization_id': customization_id, 'time': time()}
+
+        if error is None:
+            entry['results'] = results
+        else:
+            entry['error'] = str(error)
+
+        with self._lock:
+            with open(self.path, 'a') as sink:
+                sink.write(json.dumps(entry) + '\n')
+
+
+class DirectorySink(object):
+    """ Writes the transcription of every audio file to <output>/<name of the audio>.json, or
+    <name of the audio>.error.json if it failed. Files are renamed into place once complete. """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def write(self, audio_file, customization_id, results, error=None) -> None:
+        name = Path(audio_file).stem + ('.json' if error is None else '.error.json')
+        entry = {'audio_file': str(audio_file), 'customization_id': customization_id}
+
+        if error is None:
+            entry['results'] = results
+        else:
+            entry['error'] = str(error)
+
+        partial = self.directory / (name + '.part')
+        with open(partial, 'w') as output:
+            json.dump(entry, output)
+
+        os.replace(partial, self.directory / name)
+
+
+def sink_for(path):
+    """ A JsonlSink for a .jsonl path, a DirectorySink otherwise """
+
+    return JsonlSink(path) if str(path).endswith('.jsonl') else DirectorySink(path)
+
+
+class FolderWatcher(object):
+    """ Transcribes the audio files dropped in a directory as soon as they are written.
+
+    New files are detected with inotify, or by polling the directory where inotify is not available.
+    With polling, a file is only picked up once its size and modification time have not changed for
+    settle seconds, so files still being copied are not sent half-written.
+
+    The files go through a bounded queue to a fixed number of workers. When the queue is full the
+    watcher stops picking up files until a worker frees a slot (backpressure): the files wait on disk
+    instead of in memory, and are found again by the next scan. Every transcription goes to the sink
+    and completed files are journaled, so a restarted watcher does not transcribe them twice. Failed
+    files are retried on the next restart.
+
+    Attributes:
+        directory: the directory watched
+        url: url of the instance. Ignored when a pool is passed
+        customization_id: id of the model the files are transcribed with
+        sink: where the transcriptions are written (JsonlSink, DirectorySink)
+        workers: number of transcriptions running at the same time
+        queue_size: number of files waiting for a worker before backpressure kicks in
+        settle: seconds the size of a file must stay the same before it is picked up when polling
+        interval: seconds between two scans of the directory
+        pool: optional InstancePool or HedgedTranscriber the transcriptions go through
+        journal: JobJournal of the completed files
+    """
+
+    def __init__(self, directory, url, customization_id, sink, workers=4, queue_size=16, settle=2.0, interval=1.0,
+                 pool=None, journal=None, use_inotify=True):
+        self.directory = Path(directory)
+
+        if not self.directory.is_dir():
+            raise FileNotFoundError(f"Cannot find the directory {directory}")
+
+        if workers < 1 or queue_size < 1:
+            raise ValueError("The \'workers\' and the \'queue_size\' must be at least 1")
+
+        self.url = url
+        self.customization_id = customization_id
+        self.sink = sink
+        self.workers = workers
+        self.queue_size = queue_size
+        self.settle = settle
+        self.interval = interval
+        self.pool = pool
+        self.journal = journal if journal is not None else JobJournal.for_inputs('watch', str(self.directory.resolve()),
+                                                                                 customization_id)
+
+        self._queue = Queue(maxsize=queue_size)
+        self._pending = set() # files in the queue or being transcribed
+        self._sizes = {} # path -> (size, modification time, first seen with them), for polling
+        self._failed = {} # path -> modification time of the files that failed in this run
+        self._unsettled = 0 # files of the last scan still being written
+        self._lock = Lock()
+        self._stats = {'transcribed': 0, 'failed': 0, 'backpressure_seconds': 0.0, 'latency': 0.0}
+
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = _InotifyWatcher(self.directory)
+            except (OSError, AttributeError):
+                # not on Linux, or no inotify in the libc: fall back on polling
+                self._inotify = None
+
+    @property
+    def mode(self) -> str:
+        return 'inotify' if self._inotify is not None else 'polling'
+
+    def stats(self) -> dict:
+        """ The number of files transcribed and failed, the seconds the watcher waited on a full queue
+        and the mean seconds between a file being picked up and its transcription being written """
+
+        with self._lock:
+            stats = dict(self._stats)
+
+        stats['latency'] = stats['latency'] / stats['transcribed'] if stats['transcribed'] else 0.0
+        stats['queued'] = self._queue.qsize()
+
+        return stats
+
+    def _is_audio(self, path) -> bool:
+        return path.suffix.lower() in AUDIO_SUFFIXES and path.is_file()
+
+    def _settled(self, path, now) -> bool:
+        """ Whether the file has not changed for settle seconds """
+
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self._sizes.pop(path, None)
+            return False
+
+        size = (stat.st_size, stat.st_mtime)
+        seen = self._sizes.get(path)
+
+        if seen is None or seen[:2] != size:
+            self._sizes[path] = size + (now,)
+            # files untouched for a while, i.e. already there when the watcher started, are ready
+            return stat.st_size > 0 and time() - stat.st_mtime >= self.settle
+
+        return stat.st_size > 0 and now - seen[2] >= self.settle
+
+    def _scan(self):
+        """ The files of the directory ready to be transcribed """
+
+        now = monotonic()
+        paths = sorted(self.directory.iterdir())
+        ready = []
+        unsettled = 0
+
+        for path in paths:
+            if path in self._pending or not self._is_audio(path) or self._done(path):
+                continue
+
+            if self._settled(path, now):
+                ready.append(path)
+            else:
+                unsettled += 1
+
+        self._unsettled = unsettled
+
+        # forget the files that were removed
+        present = set(paths)
+        self._sizes = {path: size for path, size in self._sizes.items() if path in present}
+
+        return ready
+
+    def _done(self, path) -> bool:
+        """ Whether the file was transcribed, or failed in this run and was not written again since """
+
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            # removed in the meantime
+            return True
+
+        with self._lock:
+            if self._failed.get(path) == mtime:
+                return True
+
+        return self.journal.is_done('watch', path.name, mtime)
+
+    def _enqueue(self, path, deadline) -> None:
+        """ Waits for a free slot in the queue """
+
+        with self._lock:
+            self._pending.add(path)
+
+        waited = monotonic()
+
+        while True:
+            try:
+                self._queue.put((path, monotonic()), timeout=self.interval)
+                break
+            except Full:
+                deadline.check()
+
+        with self._lock:
+            self._stats['backpressure_seconds'] += monotonic() - waited
+
+    def _work(self, deadline):
+        while not deadline.cancelled:
+            try:
+                path, queued = self._queue.get(timeout=self.interval)
+            except Empty:
+                continue
+
+            mtime = None
+
+            try:
+                mtime = path.stat().st_mtime
+
+                if self.pool is not None:
+                    results = self.pool.transcribe(str(path), self.customization_id, deadline=deadline)
+                else:
+                    stt = WatsonSTT(url=self.url, customization_id=self.customization_id, deadline=deadline)
+                    results = stt.transcribe(str(path))
+
+                self.sink.write(path, self.customization_id, results)
+                self.journal.record('watch', path.name, mtime)
+
+                with self._lock:
+                    self._stats['transcribed'] += 1
+                    self._stats['latency'] += monotonic() - queued
+
+            except Cancelled:
+                break
+            except Exception as e:
+                self.sink.write(path, self.customization_id, None, error=e)
+
+                with self._lock:
+                    self._stats['failed'] += 1
+                    self._failed[path] = mtime
+
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+
+                self._queue.task_done()
+
+    def run(self, deadline=None, callback=None) -> None:
+        """ Watches the directory until the deadline expires or is cancelled (i.e. on Ctrl-C).
+
+        Args:
+            deadline: optional Deadline, the watcher stops when it is cancelled or expires
+            callback: optional function called with every file picked up
+        """
+
+        deadline = deadline if deadline is not None else Deadline()
+        threads = [Thread(target=self._work, args=(deadline,), daemon=True) for _ in range(self.workers)]
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            # the files dropped while the watcher was not running
+            ready = self._scan()
+
+            while True:
+                for path in ready:
+                    if callback is not None:
+                        callback(path)
+
+                    self._enqueue(path, deadline)
+
+                deadline.check()
+
+                if self._inotify is not None:
+                    names = self._inotify.changes(self.interval)
+
+                    # scan again when events were lost, or for the files still being written at the last scan
+                    if names is None or (not names and self._unsettled):
+                        ready = self._scan()
+                    else:
+                        ready = self._changed(names)
+                else:
+                    deadline.sleep(self.interval)
+                    ready = self._scan()
+
+        except (Cancelled, KeyboardInterrupt):
+            deadline.cancel()
+
+        finally:
+            for thread in threads:
+                thread.join()
+
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+
+    def _changed(self, names):
+        """ The files reported by inotify ready to be transcribed. Their writes are finished. """
+
+        ready = []
+
+        for name in dict.fromkeys(names):
+            path = self.directory / name
+
+            if path not in self._pending and self._is_audio(path) and not self._done(path):
+                ready.append(path)
+
+        return ready
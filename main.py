@@ -10,7 +10,17 @@ from tqdm import tqdm
 
 from cli.stt import WatsonSTT
 from cli.visual import VisualSTT
-from cli import clean_up
+from cli.deadline import Cancelled, Deadline
+from cli.journal import JobJournal
+from cli.pool import InstancePool
+from cli.scheduler import RequestScheduler
+from cli.hedge import HedgedTranscriber
+from cli.rerecognize import rerecognize
+from cli.watch import FolderWatcher, sink_for
+from cli.acoustic import WatsonAcousticSTT
+from cli.vocabulary import VocabularyCache, VocabularyIndex
+from cli.history import EvaluationHistory, load_references
+from cli import batch, clean_up, daemon
 
 # @TODO: Add the ability to read the url from the conf.ini. Already implemented in visual.py
 
@@ -30,6 +40,27 @@ def main():
     --eval: transcribe a model
     --verbose: list out the models
     --audio_file: path to the audio file
+    --job_id: id of the batch job. Rerunning with the same id skips the work that was already completed
+    --workers: number of audio files transcribed at the same time
+    --routing: how transcriptions are spread over the instances of the conf.ini file (least_loaded or round_robin)
+    --hedge: percentile of the recent latencies after which a slow transcription is sent a second time
+    --deadline: seconds after which the whole run is cancelled
+    --recognize_timeout: seconds a transcription may wait for the answer of the API before it is sent again
+    --rerecognize: confidence below which the words of a transcription are cut out and recognized a second time
+    --second_model: customization id of the model of the second pass (defaults to the evaluated model)
+    --weight: customization weight of the second pass
+    --watch: directory whose new audio files are transcribed as they are dropped in, with the model of --eval
+    --output: where the transcriptions of --watch are written, a .jsonl file or a directory
+    --acoustic_audio: recordings (or directories of recordings) to create and train an acoustic model with, along with name and descr
+    --language_model: customization id of a language model used while training the acoustic model
+    --delete_acoustic: customization ids of the acoustic models to delete
+    --coverage: corpora or reference transcripts to check against the custom words of the models of --eval
+    --base_vocabulary: word list of the base model (one word per line), counted as covered by --coverage
+    --history: store every evaluation in this SQLite database and compare it with the previous best run.
+    Without --eval, lists the runs stored
+    --references: directory of the reference transcripts (<name of the audio>.txt or .json) the evaluations are scored with
+    --daemon: 'start' runs the local daemon keeping sessions and caches warm, 'stop' shuts it down.
+    While the daemon runs, listing, evaluating and deleting are delegated to it.
 
     Returns:
     None
@@ -48,11 +79,44 @@ def main():
                                                                      of the models trained on this account", \
                                                                 action="store_true")
     argparser.add_argument('--delete', nargs='+', help="Pass the customization id of the models to delete")
-    argparser.add_argument('--eval', help="Evaluate the trained model against an audio-file. \
+    argparser.add_argument('--eval', nargs='+', help="Evaluate the trained model against an audio-file. \
                                            \nPass in the \'customization_id\' of the model or \
                                             pass \'latest\' to train the latest trained model. \
                                             \nThe \'audio_file\' flag must be set as well!")
-    argparser.add_argument('--audio_file', help="The path of the audio file to transcribe.")
+    argparser.add_argument('--audio_file', nargs='+', help="The path of the audio files to transcribe.")
+    argparser.add_argument('--job_id', help="Journal the completed work under this id. \
+                                             Rerunning with the same id resumes an interrupted run.")
+
+    argparser.add_argument('--workers', type=int, default=1, help="Number of transcriptions running at the same time")
+    argparser.add_argument('--routing', choices=InstancePool.STRATEGIES, default='least_loaded', \
+                           help="How transcriptions are spread when several instances are configured in conf.ini")
+    argparser.add_argument('--hedge', type=float, help="Send a duplicate of transcriptions slower than \
+                                                        this percentile of the recent latencies (i.e. 95)")
+    argparser.add_argument('--deadline', type=float, help="Cancel the run if it does not complete within this many seconds")
+    argparser.add_argument('--recognize_timeout', type=float, help="Seconds a transcription may wait for the answer \
+                                                                    of the API (900 by default)")
+    argparser.add_argument('--rerecognize', type=float, help="Re-recognize only the words transcribed with a \
+                                                              confidence below this threshold (i.e. 0.6)")
+    argparser.add_argument('--second_model', help="The \'customization_id\' of the model re-recognizing the low confidence words")
+    argparser.add_argument('--weight', type=float, help="The customization weight of the re-recognition, between 0 and 1")
+    argparser.add_argument('--watch', help="Transcribe the audio files dropped in this directory until interrupted. \
+                                            \nThe \'eval\' flag must be set to the model to use!")
+    argparser.add_argument('--output', default='transcriptions', help="The .jsonl file or the directory the \
+                                                                      transcriptions of \'watch\' are written to")
+    argparser.add_argument('--acoustic_audio', nargs='+', help="Recordings, or directories of recordings, to train \
+                                                               an acoustic model with. \nThe \'name\' and \'descr\' flags must be set as well!")
+    argparser.add_argument('--language_model', help="The \'customization_id\' of a language model used while training the acoustic model")
+    argparser.add_argument('--delete_acoustic', nargs='+', help="Pass the customization id of the acoustic models to delete")
+    argparser.add_argument('--coverage', nargs='+', help="List the terms of these corpora or reference transcripts \
+                                                         the models of \'eval\' do not know, without transcribing anything")
+    argparser.add_argument('--base_vocabulary', help="A word list of the base model, one word per line. \
+                                                      Its words are not reported as uncovered by \'coverage\'")
+    argparser.add_argument('--history', nargs='?', const='.history/evaluations.sqlite3', help="Store the evaluations \
+                                                         in this database and compare them with the previous best run")
+    argparser.add_argument('--references', help="Directory of the reference transcripts the evaluations are scored with, \
+                                                 <name of the audio file>.txt or .json")
+    argparser.add_argument('--daemon', choices=['start', 'stop'], help="Start or stop the local daemon. \
+                                                                      Commands are delegated to the daemon while it runs.")
 
     args = argparser.parse_args()
 
@@ -64,7 +128,18 @@ def main():
     verbose = args.verbose
     delete = args.delete
     evaluate = args.eval
-    audio_file = args.audio_file
+    audio_files = args.audio_file
+    journal = JobJournal(args.job_id) if args.job_id else None
+    deadline = Deadline(args.deadline)
+
+    if args.daemon == 'start':
+        daemon.serve()
+        return
+
+    if args.daemon == 'stop':
+        answer = daemon.send({'command': 'shutdown'})
+        print("Daemon stopped." if answer is not None else "No daemon is running.")
+        return
 
     if visual:
         VisualSTT().runner()
@@ -73,20 +148,67 @@ def main():
         if url is None:
             raise Exception("Must pass URL")
 
+    if url and args.coverage:
+        _coverage(url, args.coverage, evaluate, args.base_vocabulary)
+        return
+
+    # only the transcriptions of --eval are spread over the instances
+    transcribing = url and evaluate and args.rerecognize is None and (audio_files or args.watch)
+    pool = _instance_pool(args.routing, url) if transcribing else None
+
+    if args.recognize_timeout is not None:
+        _set_recognize_timeout(args.recognize_timeout, pool)
+
+    if url and args.watch:
+        _watch(url, args.watch, evaluate, args, pool, deadline)
+        return
+
+    history = EvaluationHistory(args.history) if args.history else None
+
+    # hand the commands over to the daemon when one is running. Journaled jobs, re-recognitions,
+    # evaluations kept in the history, runs with a deadline and the ones the daemon would not run the same
+    # way (several workers, several instances, hedging, another recognition timeout) always run locally.
+    delegable = args.workers <= 1 and pool is None and args.hedge is None and args.recognize_timeout is None
+
+    if url and delegable and journal is None and args.rerecognize is None and history is None and args.deadline is None:
+        answers = daemon.delegate(url, verbose=verbose, evaluate=evaluate, audio_files=audio_files, delete=delete)
+
+        if answers is not None:
+            if 'models' in answers:
+                pprint(answers['models']['models'])
+                verbose = False
+
+            if 'evaluate' in answers:
+                for evaluation in answers['evaluate']['evaluations']:
+                    if 'error' in evaluation:
+                        raise Exception(evaluation['error'])
+
+                    print(f"Transcription of {evaluation['audio_file']} with model {evaluation['customization_id']}:")
+                    pprint(evaluation['results'])
+                    print()
+
+                evaluate = None
+
+            if 'delete' in answers:
+                delete = None
+
     # kick of training
     if name and descr and url and file_path:
-        custom_stt = WatsonSTT(url=url)
-        custom_stt.create_model(name=name, descr=descr)
-        custom_stt.add_corpus(file_path)
-        custom_stt.training()
+        batch.train_model(url, [file_path], name=name, descr=descr, journal=journal, deadline=deadline)
     
+    # create and train an acoustic model
+    if name and descr and url and args.acoustic_audio:
+        batch.train_acoustic_model(url, args.acoustic_audio, name=name, descr=descr,
+                                   custom_language_model_id=args.language_model,
+                                   workers=max(1, args.workers), journal=journal, deadline=deadline)
+
     # just add the corpus
     # @TODO: how to create a model and train with an existing corpus?
     # @TODO: is this feature even neccesary? 
     if url and file_path and name is None is file_path is None:
         print("Adding corpus...")
         # @TODO: training a model with an existing uploaded corpus
-        custom_stt = WatsonSTT(url=url)
+        custom_stt = WatsonSTT(url=url, deadline=deadline)
         custom_stt.add_corpus(file_path)
         print("Finished adding corpus")
 
@@ -95,14 +217,15 @@ def main():
         print("Retrieving Models...")
         model_status(url)
     
-    if url and evaluate and audio_file:
+    if url and evaluate and audio_files:
         # pass in customization id 
         print("Checking audio file...")
-        path = Path(audio_file)
-        if not path.exists() and not path.is_file():
-            raise FileExistsError("Cannot find audio file")
+        for audio_file in audio_files:
+            path = Path(audio_file)
+            if not path.exists() and not path.is_file():
+                raise FileExistsError(f"Cannot find audio file {audio_file}")
 
-        if evaluate == "latest":
+        if "latest" in evaluate:
             models = model_status(url, print=0)
             models = models['customizations']
 
@@ -115,19 +238,224 @@ def main():
                 model['created'] = _to_date(model['created'])
 
             models = sorted(models, key=itemgetter('created'), reverse=True)
-            evaluate = models[0]['customization_id']
+            evaluate = [models[0]['customization_id'] if _id == "latest" else _id for _id in evaluate]
+
+        if args.rerecognize is not None:
+            _rerecognize(url, audio_files, evaluate, args, deadline)
+            evaluate = None
 
+    if url and evaluate and audio_files:
         print("Transcribing the audio file...")
-        custom_stt = WatsonSTT(url=url, customization_id=evaluate)
-        results = custom_stt.transcribe(audio_file)
+        # the routing only applies when the transcriptions are spread over several instances
+        routing = args.routing if pool is not None else None
+
+        if args.hedge:
+            pool = HedgedTranscriber(pool=pool, url=url, percentile=args.hedge)
+
+        try:
+            evaluations = batch.evaluate(url, audio_files, evaluate, journal=journal, pool=pool, 
+                                         workers=args.workers, deadline=deadline)
+            transcriptions = {}
+
+            for audio_file, customization_id, results, error in evaluations:
+                if error is not None:
+                    raise error
+
+                print(f"Transcription of {audio_file} with model {customization_id}:")
+                pprint(results)
+                print()
+
+                transcriptions.setdefault(customization_id, []).append((str(Path(audio_file).resolve()), results))
+
+        finally:
+            if args.hedge:
+                pool.close()
+
         print("Transcribing finished")
-        print()
-        pprint(results)
+
+        if history is not None:
+            parameters = {'workers': args.workers,
+                          'routing': routing,
+                          'hedge': args.hedge,
+                          'weight': args.weight,
+                          'references': str(Path(args.references).resolve()) if args.references else None}
+
+            _record_history(history, transcriptions, audio_files, args.references, parameters)
+
+        if args.hedge:
+            stats = pool.stats()
+            print(f"Hedged {stats['hedges_fired']} of {stats['requests']} transcriptions, {stats['hedges_won']} hedges answered first")
 
     if url and delete:
-        clean_up.clean_up(url, delete)
+        clean_up.clean_up(url, delete, deadline=deadline)
+
+    if url and args.delete_acoustic:
+        for customization_id in args.delete_acoustic:
+            WatsonAcousticSTT(url=url, customization_id=customization_id, deadline=deadline).delete_model()
+
+    # without an evaluation, list what the history holds
+    if history is not None and not (evaluate and audio_files):
+        _list_runs(history)
         
 
+def _rerecognize(url, audio_files, customization_ids, args, deadline):
+    """ Transcribes every audio file with every model and recognizes the low confidence words a second time """
+
+    print("Transcribing the audio file...")
+
+    for audio_file in audio_files:
+        for customization_id in customization_ids:
+            transcript, report = rerecognize(url, audio_file, customization_id,
+                                             second_customization_id=args.second_model,
+                                             customization_weight=args.weight,
+                                             threshold=args.rerecognize,
+                                             workers=max(1, args.workers),
+                                             deadline=deadline)
+
+            print(f"Transcription of {audio_file} with model {customization_id}:")
+            pprint(transcript.to_dict())
+            print(f"Re-recognized {report['spans']} spans ({report['resent_seconds']} of {report['audio_seconds']} seconds), "
+                  f"{report['replaced']} replaced")
+            print()
+
+    print("Transcribing finished")
+
+
+def _coverage(url, paths, customization_ids, base_vocabulary=None):
+    """ Prints the share of the tokens of the files known by the models and the most frequent unknown terms.
+    The words of the base vocabulary, when one is passed, are known too. """
+
+    if not customization_ids or "latest" in customization_ids:
+        raise ValueError("Pass the \'customization_id\' of the models to --eval to check their coverage")
+
+    print("Retrieving the custom words...")
+    index = VocabularyCache(url).index(*customization_ids)
+    custom_words = len(index)
+
+    if base_vocabulary is not None:
+        index.update(VocabularyIndex.from_file(base_vocabulary))
+
+    report = index.coverage_of_files(paths)
+
+    known = f"{custom_words} custom words" + (f" and the base vocabulary ({len(index) - custom_words} more words)"
+                                               if base_vocabulary is not None else "")
+    print(f"{report.tokens} tokens ({report.unique} distinct), {report.coverage:.2%} covered by {known}")
+    print(f"{len(report.uncovered)} uncovered terms, the most frequent:")
+
+    for term, count in report.top(50):
+        print(f"  {term:<30} {count}")
+
+
+def _watch(url, directory, evaluate, args, pool, deadline):
+    """ Transcribes the audio files dropped in the directory until interrupted or the deadline expires """
+
+    if not evaluate or len(evaluate) != 1 or evaluate[0] == "latest":
+        raise ValueError("Pass the \'customization_id\' of the model to --eval when watching a directory")
+
+    if args.hedge:
+        pool = HedgedTranscriber(pool=pool, url=url, percentile=args.hedge)
+
+    watcher = FolderWatcher(directory, url, evaluate[0], sink_for(args.output), workers=max(1, args.workers), pool=pool)
+
+    print(f"Watching {directory} ({watcher.mode}), writing the transcriptions to {args.output}. Press Ctrl-C to stop.")
+    try:
+        watcher.run(deadline, callback=lambda path: print(f"Transcribing {path.name}..."))
+    finally:
+        if args.hedge:
+            pool.close()
+
+    stats = watcher.stats()
+    print(f"Transcribed {stats['transcribed']} files ({stats['failed']} failed), "
+          f"{stats['latency']:.1f} seconds on average from pick up to output")
+
+
+def _record_history(history, transcriptions, audio_files, references=None, parameters=None):
+    """ Stores the evaluation of every model, with the parameters of the evaluation, and prints how it
+    compares with the previous best run """
+
+    if references is not None:
+        references = {str(Path(audio_file).resolve()): text
+                      for audio_file, text in load_references(references, audio_files).items()}
+
+    for customization_id, evaluations in transcriptions.items():
+        run_id = history.record(customization_id, evaluations, references=references, parameters=parameters)
+        comparison = history.compare(run_id)
+
+        run, baseline = comparison['run'], comparison['baseline']
+        print(f"Evaluation of model {customization_id} stored as run {run_id}: {_score(run)}")
+
+        if baseline is None:
+            print("No previous run to compare with.")
+            continue
+
+        print(f"Previous best is run {baseline['id']} of model {baseline['customization_id']} "
+              f"({baseline['created']}): {_score(baseline)}")
+        if comparison['scored'] == 0:
+            print(f"{comparison['common']} common utterances, {comparison['changed']} transcripts changed. "
+                  f"Regressions could not be scored: the run or the baseline has no reference transcripts.")
+            continue
+
+        print(f"{comparison['common']} common utterances ({comparison['scored']} scored), {comparison['improved']} improved, "
+              f"{len(comparison['regressions'])} regressed, {comparison['changed']} transcripts changed")
+
+        for regression in comparison['regressions']:
+            print(f"  {Path(regression['utterance']).name}: {regression['baseline_errors']} -> {regression['errors']} errors")
+            print(f"    before: {regression['baseline_transcript']}")
+            print(f"    now:    {regression['transcript']}")
+
+
+def _list_runs(history):
+    """ Prints the runs stored in the history, the latest first """
+
+    runs = history.runs()
+
+    if len(runs) == 0:
+        print("No evaluation stored yet. Pass --history with --eval and --audio_file to store one.")
+        return
+
+    for run in runs:
+        print(f"Run {run['id']:<5} {run['created']}  {run['customization_id']}  {run['utterances']} utterances  {_score(run)}")
+
+
+def _score(run) -> str:
+    wer = f"WER {run['wer']:.2%}" if run['wer'] is not None else "no references"
+    confidence = f"confidence {run['confidence']:.3f}" if run['confidence'] is not None else "no confidence"
+
+    return f"{wer}, {confidence}"
+
+
+def _set_recognize_timeout(seconds, pool=None):
+    """ Sets the timeout of the recognitions of the process, and of the instances of the pool """
+
+    if seconds <= 0:
+        raise ValueError("The \'recognize_timeout\' must be greater than 0")
+
+    RequestScheduler.shared().recognize_timeout = seconds
+
+    if pool is not None:
+        for instance in pool.instances:
+            instance.scheduler.recognize_timeout = seconds
+
+
+def _instance_pool(routing, url):
+    """ Returns an InstancePool when several instances are configured in the conf.ini file and the url
+    is one of them, None otherwise (the models, i.e. 'latest', are looked up on the url) """
+
+    try:
+        pool = InstancePool.from_config(strategy=routing)
+    except ValueError:
+        return None
+
+    if len(pool.instances) < 2:
+        return None
+
+    if not pool.has_url(url):
+        print(f"{url} is not one of the instances of conf.ini, the transcriptions are not spread over them")
+        return None
+
+    return pool
+
+
 '''
     @TODO: what if instead of throwing an error, just provided the date 1/1/1970
     and logged that there was an issue parsing the date. This way the program would still 
@@ -175,4 +503,10 @@ def model_status(url, print=1) -> None:
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except KeyboardInterrupt:
+        # the batch helpers cancel their remaining work on the way out
+        print("Action Cancelled")
+    except Cancelled as e:
+        print(e)
@@ -0,0 +1,108 @@
+import gzip
+import io
+import json
+import tarfile
+
+import pytest
+
+from unittest.mock import Mock, patch
+
+from cli.acoustic import AudioArchive, WatsonAcousticSTT, archives
+from cli.status_watcher import StatusWatcher
+
+def _response(status_code, body=None):
+    response = Mock()
+    response.status_code = status_code
+    response.text = json.dumps(body if body is not None else {})
+
+    return response
+
+def _recordings(tmp_path, count=3, size=100000, suffix='.wav'):
+    paths = []
+
+    for index in range(count):
+        path = tmp_path / f"recording{index}{suffix}"
+        path.write_bytes(bytes([index]) * size)
+        paths.append(path)
+
+    return paths
+
+def test_audio_archive_streams_a_valid_tar(tmp_path):
+    paths = _recordings(tmp_path)
+    archive = AudioArchive(paths, chunk_size=4096)
+
+    chunks = list(archive)
+    data = b"".join(chunks)
+
+    with tarfile.open(fileobj=io.BytesIO(gzip.decompress(data))) as tar:
+        assert tar.getnames() == [path.name for path in paths]
+        assert tar.extractfile("recording1.wav").read() == paths[1].read_bytes()
+
+    # never more than a chunk of a recording at a time, and the archive can be built again for a retry
+    assert max(len(chunk) for chunk in chunks) < 2 * 4096 + 1024
+    assert b"".join(archive) == data
+    assert archive.content_type == "audio/wav"
+
+def test_archives_split_by_size_and_type(tmp_path):
+    _recordings(tmp_path, count=3, size=100)
+    (tmp_path / "other.flac").write_bytes(b"fLaC")
+    # not audio: left out of the archives
+    (tmp_path / "notes.txt").write_text("speaker notes")
+    (tmp_path / ".DS_Store").write_bytes(b"\0")
+
+    resources = archives([tmp_path], max_size=250, prefix="accent")
+
+    assert sorted(resources) == ["accent-1", "accent-2", "accent-3"]
+    assert sorted(len(archive.paths) for archive in resources.values()) == [1, 1, 2]
+    assert {archive.content_type for archive in resources.values()} == {"audio/wav", "audio/flac"}
+
+def test_archives_reject_a_recording_too_large(tmp_path):
+    paths = _recordings(tmp_path, count=2, size=100)
+    large = tmp_path / "large.wav"
+    large.write_bytes(b"\0" * 300)
+
+    with pytest.raises(ValueError, match="large.wav"):
+        archives(paths + [large], max_size=250)
+
+@patch('cli.scheduler.requests.post')
+def test_add_audio_resources(mock, tmp_path):
+    resources = archives(_recordings(tmp_path, size=100), max_size=150)
+    mock.side_effect = lambda url, **kwargs: _response(400 if url.endswith("audio-2") else 201)
+
+    stt = WatsonAcousticSTT(url="http://localhost", customization_id="1234", api_key="key")
+    errors = stt.add_audio_resources(resources, workers=3)
+
+    assert list(errors) == ["audio-2"]
+    assert mock.call_count == 3
+
+    headers = mock.call_args[1]['headers']
+    assert headers['Content-Type'] == 'application/gzip'
+    assert headers['Contained-Content-Type'] == 'audio/wav'
+    assert '/v1/acoustic_customizations/1234/audio/' in mock.call_args[0][0]
+
+@patch('cli.scheduler.requests.get')
+def test_wait_for_audio(mock):
+    mock.side_effect = [_response(200, {'audio': [{'name': 'audio-1', 'status': 'being_processed'}]}),
+                        _response(200, {'audio': [{'name': 'audio-1', 'status': 'ok'},
+                                                  {'name': 'audio-2', 'status': 'invalid'}]})]
+
+    stt = WatsonAcousticSTT(url="http://localhost", customization_id="1234", api_key="key")
+
+    assert stt.wait_for_audio(interval=0.01) == {'audio-1': 'ok', 'audio-2': 'invalid'}
+
+@patch('cli.scheduler.requests.post')
+@patch('cli.scheduler.requests.get')
+def test_acoustic_training(mock_get, mock_post):
+    listing = lambda status: _response(200, {'customizations': [{'customization_id': '1234', 'status': status}]})
+    mock_get.side_effect = [listing('ready'), listing('training'), listing('available')]
+    mock_post.return_value = _response(200, {})
+
+    stt = WatsonAcousticSTT(url="http://localhost", customization_id="1234", api_key="key")
+    watcher = StatusWatcher("http://localhost", "key", interval=0.01, endpoint=WatsonAcousticSTT.ENDPOINT)
+
+    stt.training(custom_language_model_id="5678", watcher=watcher)
+
+    assert stt.status == 'available'
+    assert mock_get.call_args_list[0][0][0] == "http://localhost/v1/acoustic_customizations"
+    assert mock_post.call_args[0][0] == "http://localhost/v1/acoustic_customizations/1234/train"
+    assert mock_post.call_args[1]['params'] == (('custom_language_model_id', '5678'),)
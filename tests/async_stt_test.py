@@ -0,0 +1,67 @@
+import asyncio
+
+from aiohttp import web
+
+from cli.async_stt import AsyncWatsonSTT
+
+def _serve(app, coroutine):
+    """ Runs the coroutine against a local server hosting the app """
+
+    async def run():
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        try:
+            return await coroutine(f"http://127.0.0.1:{port}")
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+def test_async_transcribe_retries_throttled_requests(tmp_path):
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+    calls = []
+
+    async def recognize(request):
+        calls.append(request.query['language_customization_id'])
+        if len(calls) == 1:
+            return web.Response(status=429, headers={'Retry-After': '0'})
+
+        return web.json_response({'result_index': 0, 'results': [{'final': True, 'alternatives': [{'transcript': 'hi '}]}]})
+
+    app = web.Application()
+    app.router.add_post('/v1/recognize', recognize)
+
+    async def transcribe(url):
+        async with AsyncWatsonSTT(url, customization_id='1234', api_key='key') as stt:
+            return await asyncio.gather(stt.transcribe(str(audio), parse=True), stt.transcribe(str(audio)))
+
+    transcript, response = _serve(app, transcribe)
+
+    assert transcript.text == "hi"
+    assert response['results'][0]['alternatives'][0]['transcript'] == 'hi '
+    assert calls == ['1234', '1234', '1234']
+
+def test_async_training_waits_for_status():
+    statuses = ['pending', 'ready', 'training', 'available']
+
+    async def status(request):
+        return web.json_response({'status': statuses.pop(0) if len(statuses) > 1 else statuses[0]})
+
+    async def train(request):
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_get('/v1/customizations/1234', status)
+    app.router.add_post('/v1/customizations/1234/train', train)
+
+    async def training(url):
+        async with AsyncWatsonSTT(url, customization_id='1234', api_key='key') as stt:
+            await stt.training(interval=0.01, timeout=5)
+            return stt.status
+
+    assert _serve(app, training) == 'available'
@@ -0,0 +1,116 @@
+from threading import Thread
+from unittest.mock import patch
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import json
+import stat
+
+from cli import daemon
+from cli.scheduler import RequestScheduler
+from cli.daemon import DaemonState, STTDaemon
+
+url = "http://localhost"
+models = {'customizations': [{'customization_id': 'old', 'created': '2020-01-01T00:00:00.000Z'},
+                             {'customization_id': 'new', 'created': '2020-02-01T00:00:00.000Z'}]}
+
+token = "secret"
+
+def _start():
+    server = STTDaemon(port=0, state=DaemonState(allowed_urls=[url]), token=token)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, server.server_address[1]
+
+@patch('cli.stt.WatsonSTT.transcribe')
+@patch('cli.stt.WatsonSTT.all_model_status')
+def test_daemon_caches_models_and_transcriptions(all_model_status, transcribe, tmp_path):
+    all_model_status.return_value = models
+    transcribe.return_value = {'results': []}
+
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+
+    server, port = _start()
+    try:
+        command = {'command': 'evaluate', 'url': url, 'customization_ids': ['latest'], 'audio_files': [str(audio)]}
+
+        first = daemon.send(command, port=port, token=token)
+        second = daemon.send(command, port=port, token=token)
+
+        assert first == second
+        assert first['evaluations'][0]['customization_id'] == 'new'
+        assert daemon.send({'command': 'models', 'url': url}, port=port, token=token) == {'models': models}
+        assert all_model_status.call_count == 1
+        assert transcribe.call_count == 1
+
+        assert daemon.send({'command': 'unknown'}, port=port, token=token) == {'error': "Unknown command 'unknown'"}
+    finally:
+        daemon.send({'command': 'shutdown'}, port=port, token=token)
+        server.server_close()
+
+    # the scheduler shared by the process is left alone
+    assert server.state.scheduler is not RequestScheduler.shared()
+    assert RequestScheduler.shared().session is None
+
+def test_send_without_daemon():
+    assert daemon.send({'command': 'ping'}, port=1, token=token) is None
+
+def _post(port, body, headers):
+    try:
+        with urlopen(Request(f"http://127.0.0.1:{port}/command", data=body, headers=headers)) as response:
+            return response.status
+    except HTTPError as e:
+        return e.code
+
+@patch('cli.stt.WatsonSTT.all_model_status')
+def test_daemon_rejects_foreign_requests(all_model_status):
+    server, port = _start()
+    try:
+        body = json.dumps({'command': 'models', 'url': url}).encode('utf-8')
+
+        # no token, a wrong token, or a web page posting a simple request
+        assert _post(port, body, {'Content-Type': 'application/json'}) == 403
+        assert _post(port, body, {'Content-Type': 'application/json', 'X-Daemon-Token': "guess"}) == 403
+        assert _post(port, body, {'Content-Type': 'text/plain', 'X-Daemon-Token': token,
+                                  'Origin': "http://example.com"}) == 403
+        assert _post(port, body, {'Content-Type': 'text/plain', 'X-Daemon-Token': token}) == 415
+
+        # the API key is only sent to the instances of conf.ini
+        answer = daemon.send({'command': 'models', 'url': "http://example.com"}, port=port, token=token)
+        assert answer == {'error': "http://example.com is not one of the instances of conf.ini"}
+        all_model_status.assert_not_called()
+    finally:
+        daemon.send({'command': 'shutdown'}, port=port, token=token)
+        server.server_close()
+
+def test_token_file_is_private(tmp_path):
+    path = tmp_path / "daemon" / "token"
+    written = daemon.write_token(path)
+
+    assert daemon.read_token(path) == written
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+    assert daemon.write_token(path) != written
+    assert daemon.read_token(tmp_path / "missing") is None
+
+def test_configured_urls(tmp_path):
+    conf = tmp_path / "conf.ini"
+    conf.write_text("[URL]\nwatson_stt_url = https://first/\n\n[URL_2]\nwatson_stt_url = https://second\n\n"
+                    "[URL_3]\nwatson_stt_url = None\n")
+
+    assert daemon.configured_urls(conf) == ["https://first", "https://second"]
+
+@patch('cli.stt.WatsonSTT.transcribe')
+@patch('cli.stt.WatsonSTT.all_model_status')
+def test_retrained_model_is_transcribed_again(all_model_status, transcribe, tmp_path):
+    all_model_status.side_effect = [{'customizations': [{'customization_id': 'new', 'updated': '2020-02-01'}]},
+                                    {'customizations': [{'customization_id': 'new', 'updated': '2020-03-01'}]}]
+    transcribe.side_effect = [{'results': ['before']}, {'results': ['after']}]
+
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+
+    state = DaemonState(models_ttl=0, allowed_urls=[url])
+
+    assert state.transcribe(url, str(audio), 'new') == {'results': ['before']}
+    assert state.transcribe(url, str(audio), 'new') == {'results': ['after']}
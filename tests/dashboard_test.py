@@ -0,0 +1,83 @@
+import io
+import pytest
+
+from threading import Event
+from unittest.mock import Mock, patch
+
+from progress.spinner import PixelSpinner
+
+from cli import clean_up
+from cli.dashboard import Dashboard, Task
+from cli.scheduler import RequestScheduler
+
+def test_independent_tasks_run_concurrently():
+    started = Event()
+
+    def first(deadline):
+        started.set()
+        print("first done")
+
+    def second(deadline):
+        # only finishes if the first task runs at the same time
+        assert started.wait(2)
+
+    def last(deadline):
+        raise Exception("Cannot delete")
+
+    tasks = [Task("First", first), Task("Second", second)]
+    tasks.append(Task("Last", last, after=tasks))
+
+    stream = io.StringIO()
+    Dashboard(tasks, stream=stream, interval=0.01).run()
+
+    assert [task.state for task in tasks] == ['done', 'done', 'failed']
+    assert tasks[0].output == ["first done"]
+    assert tasks[2].started >= max(tasks[0].finished, tasks[1].finished)
+    assert "Last" in stream.getvalue() and "failed" in stream.getvalue()
+
+@patch('cli.scheduler.requests.get')
+def test_task_counts_requests_and_spinner_detail(mock):
+    mock.return_value = Mock(status_code=200, headers={})
+    seen = []
+
+    def action(deadline):
+        scheduler = RequestScheduler(rate=100)
+
+        with PixelSpinner("Training model ") as bar:
+            bar.next()
+            seen.append(task.detail)
+
+        scheduler.request('get', 'http://localhost/v1/customizations', deadline=deadline)
+        scheduler.request('get', 'http://localhost/v1/customizations', deadline=deadline)
+
+    task = Task("Train", action)
+    Dashboard([task], stream=io.StringIO(), interval=0.01).run()
+
+    assert task.requests == 2
+    assert seen[0].startswith("Training model")
+    # the spinner is not kept in the output
+    assert task.output == []
+
+def test_cancel_stops_queued_tasks():
+    task = Task("Evaluate", lambda deadline: deadline.sleep(5))
+    queued = Task("Delete", lambda deadline: None, after=[task])
+    dashboard = Dashboard([task, queued], stream=io.StringIO(), interval=0.01)
+
+    with patch('cli.dashboard.sleep', side_effect=[None, KeyboardInterrupt]):
+        with pytest.raises(KeyboardInterrupt):
+            dashboard.run()
+
+    assert task.state == 'cancelled'
+    assert queued.state == 'cancelled'
+
+@patch('builtins.input', side_effect=AssertionError("a dashboard task cannot prompt"))
+@patch('cli.clean_up.WatsonSTT')
+def test_confirmed_delete_all_does_not_prompt(mock, _):
+    mock.all_model_status.return_value = {'customizations': [{'customization_id': '1234'}]}
+
+    task = Task("Delete", lambda deadline: clean_up.clean_up("http://localhost", ['all'], deadline=deadline, confirmed=True))
+    Dashboard([task], stream=io.StringIO(), interval=0.01).run()
+
+    assert task.state == 'done'
+    mock.delete_model.assert_called_once()
+    assert mock.delete_model.call_args[0][2] == '1234'
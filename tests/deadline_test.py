@@ -0,0 +1,110 @@
+import pytest
+import requests
+
+from threading import Event
+from time import monotonic
+from unittest.mock import patch
+
+from cli import batch
+from cli.deadline import DEFAULT_TIMEOUT, RECOGNIZE_TIMEOUT, Cancelled, Deadline, DeadlineExceeded
+from cli.scheduler import RequestScheduler
+from cli.stt import WatsonSTT
+
+def test_deadline_caps_request_timeout():
+    deadline = Deadline(10)
+
+    assert deadline.timeout(30) <= 10
+    assert deadline.timeout(1) == 1
+    assert Deadline().timeout(30) == 30
+
+def test_cancelled_sleep_wakes_up():
+    deadline = Deadline()
+    deadline.cancel()
+
+    start = monotonic()
+    with pytest.raises(Cancelled):
+        deadline.sleep(5)
+
+    assert monotonic() - start < 1
+
+def test_expired_deadline():
+    deadline = Deadline(0.01)
+
+    with pytest.raises(DeadlineExceeded):
+        deadline.sleep(5)
+
+def test_child_deadline():
+    parent = Deadline(10)
+    first, second = parent.child(), parent.child()
+
+    assert first.expires_at == parent.expires_at
+
+    first.count_request()
+    first.cancel()
+    assert not parent.cancelled and not second.cancelled
+    assert parent.requests == 1
+
+    parent.cancel()
+    assert second.cancelled
+
+@patch('cli.scheduler.requests.get')
+def test_scheduler_passes_timeout_and_stops_retrying(mock):
+    mock.side_effect = requests.Timeout()
+
+    with pytest.raises(DeadlineExceeded):
+        RequestScheduler(rate=100, backoff=1).request('get', 'http://localhost', deadline=Deadline(0.05))
+
+    assert 0 < mock.call_args[1]['timeout'] <= 0.05
+
+@patch('cli.scheduler.requests.post')
+def test_recognition_gets_the_longer_timeout(mock, tmp_path):
+    conf = tmp_path / "conf.ini"
+    conf.write_text("[TIMEOUT]\nrecognize = 1800\n")
+
+    scheduler = RequestScheduler.from_config(path=conf)
+    assert scheduler.recognize_timeout == 1800
+    assert RequestScheduler().recognize_timeout == RECOGNIZE_TIMEOUT
+
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+    mock.return_value.status_code = 200
+    mock.return_value.text = '{"results": []}'
+
+    WatsonSTT(url="http://localhost", customization_id="1234", scheduler=scheduler, api_key="key").transcribe(str(audio))
+    assert mock.call_args[1]['timeout'] == 1800
+
+    # the timeout of the client is kept when it is the longer one, and an explicit one always wins
+    WatsonSTT(url="http://localhost", customization_id="1234", scheduler=scheduler, api_key="key",
+              timeout=3600).transcribe(str(audio))
+    assert mock.call_args[1]['timeout'] == 3600
+
+    WatsonSTT(url="http://localhost", customization_id="1234", scheduler=scheduler, api_key="key",
+              recognize_timeout=60).transcribe(str(audio))
+    assert mock.call_args[1]['timeout'] == 60
+
+    mock.return_value.status_code = 201
+    mock.return_value.text = '{"customization_id": "1234"}'
+
+    WatsonSTT(url="http://localhost", scheduler=scheduler, api_key="key").create_model("name", "descr")
+    assert mock.call_args[1]['timeout'] == DEFAULT_TIMEOUT
+
+@patch('cli.batch.WatsonSTT')
+def test_batch_evaluate_cancels_remaining_work(mock):
+    def transcribe(path):
+        Event().wait(0.05)
+        return {'results': [path]}
+
+    mock.return_value.transcribe.side_effect = transcribe
+
+    deadline = Deadline()
+    evaluations = batch.evaluate("http://localhost", [f"{i}.wav" for i in range(10)], ['1234'],
+                                 workers=2, deadline=deadline)
+
+    # the caller stops after the first result, i.e. on Ctrl-C
+    next(evaluations)
+    evaluations.close()
+
+    # only the batch is cancelled, not the other steps sharing the deadline
+    assert mock.call_args[1]['deadline'].cancelled
+    assert not deadline.cancelled
+    assert mock.return_value.transcribe.call_count < 10
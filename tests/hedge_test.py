@@ -0,0 +1,80 @@
+from threading import Event
+from unittest.mock import patch
+
+from cli.deadline import Cancelled, Deadline
+from cli.hedge import HedgedTranscriber
+from cli.pool import Instance, InstancePool
+
+class _FakeSTT(object):
+    """ Answers after the delay of its instance """
+
+    delays = {"http://a": 1.0, "http://b": 0.0}
+
+    def __init__(self, url, **kwargs):
+        self.url = url
+
+    def transcribe(self, path, **kwargs):
+        Event().wait(self.delays[self.url])
+        return {'instance': self.url}
+
+@patch('cli.pool.WatsonSTT', _FakeSTT)
+def test_hedge_on_other_instance_wins():
+    pool = InstancePool([Instance("http://a", "key-a"), Instance("http://b", "key-b")])
+    hedged = HedgedTranscriber(pool=pool, initial_delay=0.05)
+
+    assert hedged.transcribe("audio.wav", "1234") == {'instance': "http://b"}
+    assert hedged.stats() == {'requests': 1, 'hedges_fired': 1, 'hedges_won': 1}
+
+    hedged.close()
+
+@patch('cli.hedge.WatsonSTT')
+def test_fast_request_is_not_hedged(mock):
+    mock.return_value.transcribe.return_value = {'results': []}
+
+    hedged = HedgedTranscriber(url="http://localhost", initial_delay=5)
+
+    assert hedged.transcribe("audio.wav", "1234") == {'results': []}
+    assert hedged.stats()['hedges_fired'] == 0
+
+    hedged.close()
+
+def test_delay_follows_percentile():
+    hedged = HedgedTranscriber(url="http://localhost", percentile=90, min_delay=0.1)
+
+    for latency in range(1, 101):
+        hedged._latencies.append(latency / 100)
+
+    assert hedged.delay() == 0.91
+    hedged.close()
+
+class _CancellableSTT(object):
+    """ The slow instance waits on the deadline of its attempt """
+
+    cancelled = Event()
+
+    def __init__(self, url, deadline=None, **kwargs):
+        self.url = url
+        self.deadline = deadline
+
+    def transcribe(self, path, **kwargs):
+        if self.url == "http://a":
+            try:
+                self.deadline.sleep(5)
+            except Cancelled:
+                self.cancelled.set()
+                raise
+
+        return {'instance': self.url}
+
+@patch('cli.pool.WatsonSTT', _CancellableSTT)
+def test_losing_attempt_is_cancelled():
+    pool = InstancePool([Instance("http://a", "key-a"), Instance("http://b", "key-b")])
+    hedged = HedgedTranscriber(pool=pool, initial_delay=0.05)
+    deadline = Deadline()
+
+    assert hedged.transcribe("audio.wav", "1234", deadline=deadline) == {'instance': "http://b"}
+    assert _CancellableSTT.cancelled.wait(1)
+    # only the attempt was cancelled, not the caller
+    assert not deadline.cancelled
+
+    hedged.close()
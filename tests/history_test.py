@@ -0,0 +1,109 @@
+from cli.history import EvaluationHistory, load_references, word_errors
+
+def _results(text, confidence=0.9):
+    words = text.split()
+
+    return {'result_index': 0,
+            'results': [{'final': True,
+                         'alternatives': [{'transcript': text,
+                                           'confidence': confidence,
+                                           'word_confidence': [[word, confidence] for word in words]}]}]}
+
+def test_word_errors():
+    assert word_errors("the custom speech model", "the custom speech model") == 0
+    # a substitution, a deletion and an insertion
+    assert word_errors("the custom speech model", "a custom model works") == 3
+    assert word_errors("", "extra words") == 2
+
+def test_load_references(tmp_path):
+    (tmp_path / "first.txt").write_text("custom speech")
+    (tmp_path / "second.json").write_text('{"results": [{"alternatives": [{"transcript": "acoustic model "}]}]}')
+
+    references = load_references(tmp_path, ["audio/first.wav", "audio/second.wav", "audio/third.wav"])
+
+    assert references == {"audio/first.wav": "custom speech", "audio/second.wav": "acoustic model"}
+
+def test_compare_with_previous_best(tmp_path):
+    history = EvaluationHistory(tmp_path / "history.sqlite3")
+    references = {"a.wav": "train the custom model", "b.wav": "transcribe the audio file"}
+
+    first = history.record("model-1", [("a.wav", _results("train the custom model")),
+                                       ("b.wav", _results("transcribe the audio pile"))], references=references)
+    worse = history.record("model-2", [("a.wav", _results("rain a custom model")),
+                                       ("b.wav", _results("transcribe the audio pile"))], references=references)
+
+    assert history.run(first)['wer'] == 1 / 8
+    assert history.best()['id'] == first
+
+    comparison = history.compare(worse)
+
+    assert comparison['baseline']['id'] == first
+    assert comparison['common'] == 2
+    assert comparison['improved'] == 0
+    assert comparison['changed'] == 1
+    assert [(regression['utterance'], regression['baseline_errors'], regression['errors'])
+            for regression in comparison['regressions']] == [("a.wav", 0, 2)]
+
+    # the best of the runs before the new one stays the baseline
+    better = history.record("model-3", [("a.wav", _results("train the custom model")),
+                                        ("b.wav", _results("transcribe the audio file"))], references=references)
+
+    comparison = history.compare(better)
+    assert comparison['baseline']['id'] == first
+    assert comparison['improved'] == 1 and comparison['regressions'] == []
+
+    assert [run['id'] for run in history.runs()] == [better, worse, first]
+    assert [result['run_id'] for result in history.utterance("b.wav")] == [better, worse, first]
+
+def test_runs_without_references_rank_by_confidence(tmp_path):
+    history = EvaluationHistory(tmp_path / "history.sqlite3")
+
+    history.record("model-1", [("a.wav", _results("custom model", confidence=0.6))], parameters={'weight': 0.3})
+    confident = history.record("model-2", [("a.wav", _results("custom model", confidence=0.8))])
+
+    assert history.run(confident)['wer'] is None
+    assert history.best()['id'] == confident
+    assert history.runs(customization_id="model-1")[0]['parameters'] == {'weight': 0.3}
+
+    # the store is kept on disk
+    history.close()
+    assert len(EvaluationHistory(tmp_path / "history.sqlite3").runs()) == 2
+
+def test_baseline_shares_utterances(tmp_path):
+    history = EvaluationHistory(tmp_path / "history.sqlite3")
+    references = {"a.wav": "train the custom model", "c.wav": "another test set"}
+
+    first = history.record("model-1", [("a.wav", _results("train a custom model"))], references=references)
+    # a perfect run, but on other utterances
+    history.record("model-2", [("c.wav", _results("another test set"))], references=references)
+    new = history.record("model-3", [("a.wav", _results("train the custom model"))], references=references)
+
+    comparison = history.compare(new)
+
+    assert comparison['baseline']['id'] == first
+    assert comparison['common'] == 1 and comparison['improved'] == 1
+
+def test_baseline_ranked_on_common_utterances(tmp_path):
+    history = EvaluationHistory(tmp_path / "history.sqlite3")
+    references = {"a.wav": "train the custom model", "b.wav": "transcribe the audio file"}
+
+    full = history.record("model-1", [("a.wav", _results("train a custom model")),
+                                      ("b.wav", _results("transcribe the audio file"))], references=references)
+    # perfect, but on a single utterance of the new run
+    history.record("model-2", [("a.wav", _results("train the custom model"))], references=references)
+    # without references: its regressions cannot be scored
+    history.record("model-3", [("a.wav", _results("train the custom model")),
+                               ("b.wav", _results("transcribe the audio file"))])
+    new = history.record("model-4", [("a.wav", _results("train the custom model")),
+                                     ("b.wav", _results("transcribe an audio file"))], references=references)
+
+    comparison = history.compare(new)
+
+    assert comparison['baseline']['id'] == full
+    assert comparison['common'] == 2 and comparison['scored'] == 2
+    assert comparison['improved'] == 1 and len(comparison['regressions']) == 1
+
+    unscored = history.record("model-5", [("a.wav", _results("train the custom model"))])
+    comparison = history.compare(unscored)
+
+    assert comparison['scored'] == 0 and comparison['regressions'] == []
@@ -0,0 +1,69 @@
+import pytest
+
+from unittest.mock import patch
+
+from cli import batch
+from cli.journal import JobJournal
+
+def test_journal_survives_restart(tmp_path):
+    journal = JobJournal("job", directory=tmp_path)
+    journal.record('evaluate', 'audio.wav', '1234', result={'results': []})
+
+    # a crash while writing leaves an incomplete line behind
+    with open(journal.path, 'a') as f:
+        f.write('{"unit": ["evaluate", "other.wav"')
+
+    resumed = JobJournal("job", directory=tmp_path)
+    assert resumed.is_done('evaluate', 'audio.wav', '1234')
+    assert resumed.result('evaluate', 'audio.wav', '1234') == {'results': []}
+    assert not resumed.is_done('evaluate', 'other.wav', '1234')
+
+    resumed.finish()
+    assert not journal.path.exists()
+
+def test_journal_invalid_job_id(tmp_path):
+    with pytest.raises(TypeError, match=r".* 'job_id' .*"):
+        JobJournal("", directory=tmp_path)
+
+@patch('cli.batch.WatsonSTT')
+def test_evaluate_skips_completed_units(mock, tmp_path):
+    mock.return_value.transcribe.return_value = {'results': ['new']}
+
+    journal = JobJournal("job", directory=tmp_path)
+    journal.record('evaluate', 'a.wav', '1234', result={'results': ['old']})
+
+    results = list(batch.evaluate("http://localhost", ['a.wav', 'b.wav'], ['1234'], journal=journal))
+
+    assert results[0][2] == {'results': ['old']}
+    assert results[1][2] == {'results': ['new']}
+    assert mock.return_value.transcribe.call_count == 1
+    assert journal.is_done('evaluate', 'b.wav', '1234')
+
+@patch('cli.batch.WatsonSTT')
+def test_train_model_resumes_without_creating_twice(mock, tmp_path):
+    journal = JobJournal("job", directory=tmp_path)
+    journal.record('create', 'model', result='1234')
+    journal.record('corpus', '1234', 'corpus.txt')
+
+    customization_id = batch.train_model("http://localhost", ['corpus.txt'], name='model', descr='descr', journal=journal)
+
+    assert customization_id == '1234'
+    mock.return_value.create_model.assert_not_called()
+    mock.return_value.add_corpus.assert_not_called()
+    mock.return_value.training.assert_called_once()
+
+@patch('cli.scheduler.requests.post')
+def test_failed_corpus_is_not_journaled(mock, tmp_path):
+    corpus = tmp_path / "corpus.txt"
+    corpus.write_text("custom speech")
+
+    mock.return_value.status_code = 400
+    mock.return_value.text = '{"error": "Malformed corpus"}'
+
+    journal = JobJournal("job", directory=tmp_path)
+    journal.record('create', 'model', result='1234')
+
+    with pytest.raises(Exception, match="Malformed corpus"):
+        batch.train_model("http://localhost", [str(corpus)], name='model', descr='descr', journal=journal)
+
+    assert not journal.is_done('corpus', '1234', str(corpus))
@@ -0,0 +1,80 @@
+import pytest
+import requests
+
+from unittest.mock import Mock, patch
+
+from cli.pool import Instance, InstancePool
+from cli.stt import APIError
+
+def _pool(**kwargs):
+    return InstancePool([Instance("http://a", "key-a"), Instance("http://b", "key-b")], **kwargs)
+
+def test_least_loaded_routing():
+    pool = _pool()
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+
+    pool.release(first, ok=True)
+    assert pool.acquire() is first
+
+def test_round_robin_routing():
+    pool = _pool(strategy='round_robin')
+    urls = []
+
+    for _ in range(4):
+        instance = pool.acquire()
+        urls.append(instance.url)
+        pool.release(instance, ok=True)
+
+    assert urls == ["http://a", "http://b", "http://a", "http://b"]
+
+def test_unhealthy_instance_is_skipped():
+    pool = _pool(max_failures=1, cooldown=60)
+
+    instance = pool.acquire()
+    pool.release(instance, ok=False)
+
+    assert [stats['healthy'] for stats in pool.stats()] == [False, True]
+    assert pool.acquire().url == "http://b"
+
+def _api_error(status_code, text):
+    response = Mock()
+    response.status_code = status_code
+    response.text = text
+
+    return APIError(response)
+
+@patch('cli.pool.WatsonSTT')
+def test_transcribe_fails_over(mock):
+    mock.return_value.transcribe.side_effect = [_api_error(503, "instance down"), {'results': []}]
+
+    pool = _pool()
+    assert pool.transcribe("audio.wav", "1234") == {'results': []}
+    assert [call[1]['url'] for call in mock.call_args_list] == ["http://a", "http://b"]
+
+    mock.return_value.transcribe.side_effect = requests.ConnectionError("down everywhere")
+    with pytest.raises(requests.ConnectionError, match="down everywhere"):
+        pool.transcribe("audio.wav", "1234")
+
+@patch('cli.pool.WatsonSTT')
+def test_invalid_request_does_not_fail_over(mock):
+    mock.return_value.transcribe.side_effect = _api_error(400, "unknown customization")
+
+    pool = _pool(max_failures=1)
+    with pytest.raises(APIError, match="unknown customization"):
+        pool.transcribe("audio.wav", "1234")
+
+    # the instance is not to blame
+    assert mock.call_count == 1
+    assert [stats['healthy'] for stats in pool.stats()] == [True, True]
+
+def test_pool_from_config(tmp_path):
+    conf = tmp_path / "conf.ini"
+    conf.write_text("[URL]\nwatson_stt_url = http://a\n[API_KEY]\nwatson_stt_api = key-a\n"
+                    "[URL_2]\nwatson_stt_url = http://b\n[API_KEY_2]\nwatson_stt_api = key-b\n")
+
+    pool = InstancePool.from_config(path=conf)
+    assert [(instance.url, instance.api_key) for instance in pool.instances] == [("http://a", "key-a"), ("http://b", "key-b")]
+    assert pool.has_url("http://b/") and not pool.has_url("http://c")
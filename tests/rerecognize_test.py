@@ -0,0 +1,103 @@
+import json
+import wave
+
+from io import BytesIO
+
+from unittest.mock import Mock, patch
+
+from cli.rerecognize import cut, find_spans, rerecognize
+from cli.transcript import Transcript
+
+first_pass = {
+    "result_index": 0,
+    "results": [{
+        "final": True,
+        "alternatives": [{
+            "transcript": "train the custard model ",
+            "confidence": 0.7,
+            "timestamps": [["train", 0.1, 0.5], ["the", 0.5, 0.7], ["custard", 1.0, 1.6], ["model", 1.7, 2.2]],
+            "word_confidence": [["train", 0.95], ["the", 0.9], ["custard", 0.3], ["model", 0.92]]
+        }]
+    }]
+}
+
+second_pass = {
+    "result_index": 0,
+    "results": [{
+        "final": True,
+        "alternatives": [{
+            "transcript": "custom ",
+            "confidence": 0.85,
+            "timestamps": [["custom", 0.2, 0.75]],
+            "word_confidence": [["custom", 0.85]]
+        }]
+    }]
+}
+
+def _wav(path, seconds=3, rate=8000):
+    with wave.open(str(path), 'wb') as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(rate)
+        audio.writeframes(b"\x00\x00" * int(seconds * rate))
+
+def _response(body):
+    response = Mock()
+    response.status_code = 200
+    response.text = json.dumps(body)
+    response.iter_content.side_effect = lambda chunk_size: iter([response.text.encode('utf-8')])
+
+    return response
+
+def test_find_spans():
+    spans = find_spans(Transcript.from_response(first_pass), threshold=0.6, padding=0.5)
+
+    assert len(spans) == 1
+    # padded up to the neighbouring words, not into them
+    assert (spans[0].first, spans[0].last, spans[0].start, spans[0].end) == (2, 3, 0.7, 1.7)
+
+    assert find_spans(Transcript.from_response(first_pass), threshold=0.2) == []
+
+def test_cut(tmp_path):
+    audio = tmp_path / "audio.wav"
+    _wav(audio)
+
+    spans = find_spans(Transcript.from_response(first_pass), padding=0.5)
+    piece = cut(audio, spans)[0]
+
+    with wave.open(BytesIO(piece)) as wav:
+        assert wav.getnframes() == 8000
+
+@patch('cli.scheduler.requests.post')
+def test_rerecognize(mock, tmp_path):
+    audio = tmp_path / "audio.wav"
+    _wav(audio)
+
+    mock.side_effect = [_response(first_pass), _response(second_pass)]
+
+    transcript, report = rerecognize("http://localhost", str(audio), "1234", second_customization_id="5678",
+                                     customization_weight=0.5, padding=0.5)
+
+    best = transcript.results[0].best
+    assert best.words == ("train", "the", "custom", "model")
+    assert best.starts[2] == 0.9 and best.ends[2] == 1.45
+    assert transcript.text == "train the custom model"
+    assert report == {'spans': 1, 'replaced': 1, 'audio_seconds': 3.0, 'resent_seconds': 1.0}
+
+    params = mock.call_args[1]['params']
+    assert ('language_customization_id', '5678') in params
+    assert ('customization_weight', '0.5') in params
+
+@patch('cli.scheduler.requests.post')
+def test_rerecognize_keeps_better_first_pass(mock, tmp_path):
+    audio = tmp_path / "audio.wav"
+    _wav(audio)
+
+    worse = json.loads(json.dumps(second_pass))
+    worse['results'][0]['alternatives'][0]['word_confidence'] = [["mustard", 0.1]]
+    mock.side_effect = [_response(first_pass), _response(worse)]
+
+    transcript, report = rerecognize("http://localhost", str(audio), "1234")
+
+    assert transcript.results[0].best.words == ("train", "the", "custard", "model")
+    assert report['replaced'] == 0
@@ -0,0 +1,98 @@
+import json
+import pytest
+
+from unittest.mock import patch
+
+from cli.response_parser import iter_results, parse_transcript
+from cli.stt import WatsonSTT
+from cli.transcript import Transcript
+
+response = {
+    "result_index": 0,
+    "warnings": ["Unknown arguments: \"] } {\""],
+    "results": [{
+        "final": True,
+        "alternatives": [{
+            "transcript": "he said \"hi\" {to} [me] ",
+            "confidence": 0.8,
+            "timestamps": [["he", 0.1, 0.2], ["said", 0.2, 0.5]],
+            "word_confidence": [["he", 0.9], ["said", 0.7]]
+        }],
+        "word_alternatives": [{"start_time": 0.1, "end_time": 0.2, "alternatives": [{"word": "hé", "confidence": 0.9}]}]
+    } for _ in range(20)]
+}
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64, 100000])
+def test_iter_results_chunked(size):
+    data = json.dumps(response, ensure_ascii=False).encode('utf-8')
+
+    assert list(iter_results(chunked(data, size))) == response['results']
+
+def test_iter_results_fields():
+    data = json.dumps(response).encode('utf-8')
+    result = next(iter_results(chunked(data, 16), fields=('transcript',)))
+
+    assert result == {'final': True, 'alternatives': [{'transcript': "he said \"hi\" {to} [me] "}]}
+
+def test_iter_results_empty():
+    assert list(iter_results([b'{"result_index": 0, "results": []}'])) == []
+    assert list(iter_results([b'{"result_index": 0}'])) == []
+
+def test_iter_results_truncated():
+    data = json.dumps(response).encode('utf-8')
+
+    with pytest.raises(ValueError):
+        list(iter_results(chunked(data[:len(data) // 2], 64)))
+
+def test_parse_transcript():
+    transcript = parse_transcript([json.dumps(response).encode('utf-8')])
+
+    assert isinstance(transcript, Transcript)
+    assert len(transcript.results) == 20
+    assert transcript.results[0].best.words == ("he", "said")
+
+@pytest.mark.parametrize("size", [1, 5, 100000])
+def test_parse_transcript_keeps_result_index(size):
+    first = dict(response, result_index=3)
+    # the result_index may also come after the results
+    last = {'results': response['results'], 'result_index': 3}
+
+    for data in (first, last):
+        transcript = parse_transcript(chunked(json.dumps(data).encode('utf-8'), size))
+
+        assert transcript.to_dict() == Transcript.from_response(data).to_dict()
+        assert transcript.result_index == 3
+
+@patch('cli.scheduler.requests.post')
+def test_transcribe_iter(mock, tmp_path):
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+
+    data = json.dumps(response).encode('utf-8')
+    mock.return_value.status_code = 200
+    mock.return_value.iter_content.side_effect = lambda chunk_size: iter(chunked(data, chunk_size))
+
+    stt = WatsonSTT(url="http://localhost", customization_id="1234")
+    results = list(stt.transcribe_iter(str(audio), fields=('transcript',), chunk_size=32))
+
+    assert len(results) == 20
+    assert mock.call_args[1]['stream'] is True
+    mock.return_value.close.assert_called_once()
+
+@patch('cli.scheduler.requests.post')
+def test_transcribe_parse_streams(mock, tmp_path):
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+
+    data = json.dumps(dict(response, result_index=2)).encode('utf-8')
+    mock.return_value.status_code = 200
+    mock.return_value.iter_content.side_effect = lambda chunk_size: iter(chunked(data, 100))
+
+    transcript = WatsonSTT(url="http://localhost", customization_id="1234").transcribe(str(audio), parse=True)
+
+    assert transcript.to_dict() == Transcript.from_response(json.loads(data)).to_dict()
+    assert mock.call_args[1]['stream'] is True
+    mock.return_value.close.assert_called_once()
@@ -0,0 +1,68 @@
+import pytest
+import requests
+
+from unittest.mock import Mock, patch
+from time import monotonic
+
+from cli.scheduler import RateLimiter, RequestScheduler
+
+def _response(status_code, headers=None):
+    response = Mock()
+    response.status_code = status_code
+    response.headers = headers or {}
+
+    return response
+
+@patch('cli.scheduler.requests.post')
+def test_throttled_request_is_retried(mock):
+    mock.side_effect = [_response(429, {'Retry-After': '0'}), _response(201)]
+
+    scheduler = RequestScheduler(rate=100)
+    response = scheduler.request('post', 'http://localhost/v1/customizations')
+
+    assert response.status_code == 201
+    assert scheduler.stats()['throttled'] == 1
+    assert scheduler.stats()['requests'] == 2
+
+@patch('cli.scheduler.requests.post')
+def test_server_error_not_retried_when_not_idempotent(mock):
+    mock.return_value = _response(500)
+
+    scheduler = RequestScheduler(rate=100)
+    response = scheduler.request('post', 'http://localhost/v1/customizations')
+
+    assert response.status_code == 500
+    assert mock.call_count == 1
+
+@patch('cli.scheduler.requests.get')
+def test_idempotent_request_retried_after_connection_error(mock):
+    mock.side_effect = [requests.ConnectionError(), _response(503, {'Retry-After': '0'}), _response(200)]
+
+    scheduler = RequestScheduler(rate=100, backoff=0.001)
+    response = scheduler.request('get', 'http://localhost/v1/customizations')
+
+    assert response.status_code == 200
+    assert scheduler.stats()['retries'] == 2
+
+@patch('cli.scheduler.requests.get')
+def test_retries_exhausted(mock):
+    mock.side_effect = requests.ConnectionError()
+
+    with pytest.raises(requests.ConnectionError):
+        RequestScheduler(rate=100, max_retries=2, backoff=0.001).request('get', 'http://localhost')
+
+    assert mock.call_count == 3
+
+def test_rate_limiter_enforces_rate():
+    limiter = RateLimiter(rate=50, capacity=1)
+
+    start = monotonic()
+    for _ in range(6):
+        limiter.acquire()
+
+    assert monotonic() - start >= 0.09
+
+def test_retry_after_http_date():
+    response = _response(429, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+
+    assert RequestScheduler._retry_after(response) == 0.0
@@ -0,0 +1,50 @@
+import json
+import pytest
+
+from unittest.mock import Mock
+
+from cli.scheduler import RequestScheduler
+from cli.status_watcher import StatusWatcher
+
+def _response(status_code, body):
+    response = Mock()
+    response.status_code = status_code
+    response.text = json.dumps(body)
+
+    return response
+
+def test_watcher_uses_one_listing_for_many_models():
+    listings = [{'customizations': [{'customization_id': 'a', 'status': 'training'},
+                                    {'customization_id': 'b', 'status': 'training'}]},
+                {'customizations': [{'customization_id': 'a', 'status': 'available'},
+                                    {'customization_id': 'b', 'status': 'failed'}]}]
+
+    scheduler = Mock(spec=RequestScheduler)
+    scheduler.request.side_effect = lambda method, url, **kwargs: _response(200, listings.pop(0) if len(listings) > 1 else listings[0])
+
+    notified = []
+    watcher = StatusWatcher("http://localhost", "key", interval=0.01, scheduler=scheduler)
+    a = watcher.watch('a', callback=lambda _id, status: notified.append((_id, status)))
+    b = watcher.watch('b')
+
+    assert a.result(timeout=5) == 'available'
+    with pytest.raises(Exception, match="Model b failed"):
+        b.result(timeout=5)
+
+    assert notified == [('a', 'available')]
+    assert all(call[0][1] == "http://localhost/v1/customizations" for call in scheduler.request.call_args_list)
+
+def test_watcher_falls_back_on_model_endpoint():
+    def request(method, url, **kwargs):
+        if url.endswith('/v1/customizations'):
+            return _response(200, {'customizations': []})
+
+        return _response(200, {'status': 'ready'})
+
+    scheduler = Mock(spec=RequestScheduler)
+    scheduler.request.side_effect = request
+
+    watcher = StatusWatcher("http://localhost", "key", interval=0.01, scheduler=scheduler)
+
+    assert watcher.watch('c', targets=('ready',)).result(timeout=5) == 'ready'
+    assert watcher.statuses() == {'c': 'ready'}
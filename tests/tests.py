@@ -26,7 +26,7 @@ url = config['URL']["watson_stt_url"]
 def error_codes(request):
     return request.param
 
-@patch('cli.stt.requests.post')
+@patch('cli.scheduler.requests.post')
 def test_create_model(mock, error_codes):
     if error_codes == 201:
         mock.return_value.status_code = 201
@@ -0,0 +1,79 @@
+import json
+import pytest
+
+from array import array
+from unittest.mock import patch
+
+from cli.stt import WatsonSTT
+from cli.transcript import Transcript, word_table
+
+response = {
+    "result_index": 0,
+    "results": [{
+        "final": True,
+        "alternatives": [{
+            "transcript": "hello world ",
+            "confidence": 0.91,
+            "timestamps": [["hello", 0.1, 0.5], ["world", 0.5, 0.9]],
+            "word_confidence": [["hello", 0.98], ["world", 0.62]]
+        },
+        {
+            "transcript": "hello word "
+        }]
+    },
+    {
+        "final": True,
+        "alternatives": [{
+            "transcript": "goodbye ",
+            "confidence": 0.7,
+            "timestamps": [["goodbye", 1.2, 1.8]],
+            "word_confidence": [["goodbye", 0.7]]
+        }]
+    }]
+}
+
+def test_transcript_from_response():
+    transcript = Transcript.from_response(response)
+
+    assert transcript.text == "hello world goodbye"
+    assert transcript.results[0].best.words == ("hello", "world")
+    assert transcript.results[0].best.starts == array('d', [0.1, 0.5])
+    assert transcript.results[0].alternatives[1].confidence is None
+
+    words, starts, ends, confidences = transcript.word_arrays()
+    assert words == ("hello", "world", "goodbye")
+    assert ends == array('d', [0.5, 0.9, 1.8])
+    assert confidences == array('d', [0.98, 0.62, 0.7])
+
+def test_transcript_round_trip():
+    transcript = Transcript.from_json(json.dumps(response))
+
+    assert transcript.to_dict() == response
+
+def test_transcript_invalid_response():
+    with pytest.raises(TypeError, match=r".* 'dict'"):
+        Transcript.from_response("not a dict")
+
+def test_word_table():
+    transcripts = [Transcript.from_response(response), Transcript.from_response(response)]
+    table = word_table(transcripts)
+
+    assert list(table['transcript']) == [0, 0, 0, 1, 1, 1]
+    assert len(table['word']) == len(table['start']) == len(table['confidence']) == 6
+
+@patch('cli.scheduler.requests.post')
+def test_transcribe_parse(mock, tmp_path):
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"RIFF")
+
+    mock.return_value.status_code = 200
+    mock.return_value.text = json.dumps(response)
+    mock.return_value.content = json.dumps(response).encode('utf-8')
+
+    transcript = WatsonSTT(url="http://localhost", customization_id="1234").transcribe(str(audio),
+                                                                                    timestamps=True,
+                                                                                    word_confidence=True,
+                                                                                    parse=True)
+
+    assert isinstance(transcript, Transcript)
+    assert ('timestamps', 'true') in mock.call_args[1]['params']
@@ -0,0 +1,118 @@
+import json
+import pytest
+import requests
+
+from unittest.mock import Mock
+
+from cli.batch import evaluate
+from cli.scheduler import RequestScheduler
+from cli.stt import WatsonSTT
+from cli.transport import RecordingTransport, ReplayTransport, constant, parse_latency, transport_from_config
+
+def _interaction(method, path, body, status_code=200, elapsed=0.0, data=None):
+    return {'request': {'method': method, 'path': path, 'params': [], 'body': data},
+            'status_code': status_code,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps(body),
+            'elapsed': elapsed}
+
+def test_record_then_replay(tmp_path):
+    fixture = tmp_path / "fixtures.jsonl"
+
+    live = Mock()
+    live.send.return_value.status_code = 200
+    live.send.return_value.headers = {'Content-Type': 'application/json', 'Set-Cookie': 'secret'}
+    live.send.return_value.content = b'{"customizations": []}'
+
+    recorder = RecordingTransport(fixture, transport=live)
+    recorder.send('get', 'https://live/v1/customizations', auth=('apikey', 'secret'), params={'language': 'en-US'})
+
+    assert 'secret' not in fixture.read_text()
+
+    replay = ReplayTransport(fixture, latency=constant(0))
+    response = replay.send('get', 'http://localhost/v1/customizations', params={'language': 'en-US'})
+
+    assert response.status_code == 200
+    assert response.json() == {'customizations': []}
+    assert replay.send('get', 'http://localhost/v1/customizations/1234').status_code == 404
+
+def test_replay_in_order():
+    replay = ReplayTransport(latency=constant(0))
+    replay.add(_interaction('get', '/v1/customizations/1234', {'status': 'pending'}))
+    replay.add(_interaction('get', '/v1/customizations/1234', {'status': 'available'}))
+
+    statuses = [replay.send('get', 'http://localhost/v1/customizations/1234').json()['status'] for _ in range(3)]
+
+    assert statuses == ['pending', 'available', 'available']
+
+def test_replay_faults():
+    replay = ReplayTransport(latency=constant(0), throttle_rate=1.0, retry_after=2)
+    replay.add(_interaction('get', '/v1/customizations', {}))
+
+    response = replay.send('get', 'http://localhost/v1/customizations')
+    assert response.status_code == 429
+    assert response.headers['retry-after'] == '2'
+
+    replay = ReplayTransport(latency=constant(0), error_rate=1.0)
+    with pytest.raises(requests.ConnectionError):
+        replay.send('get', 'http://localhost/v1/customizations')
+
+    replay = ReplayTransport(latency=constant(0.05))
+    with pytest.raises(requests.Timeout):
+        replay.send('get', 'http://localhost/v1/customizations', timeout=0.01)
+
+    with pytest.raises(ValueError):
+        ReplayTransport(failure_rate=2)
+
+def _live(method, url, **kwargs):
+    response = Mock()
+    response.status_code = 200
+    response.headers = {}
+    response.text = json.dumps({'results': [], 'index': int(kwargs['data'][4:])})
+    response.content = response.text.encode('utf-8')
+
+    return response
+
+def test_replay_under_load(tmp_path):
+    fixture = tmp_path / "fixtures.jsonl"
+    audio_files = []
+
+    for index in range(8):
+        audio = tmp_path / f"audio{index}.wav"
+        audio.write_bytes(b"RIFF%d" % index)
+        audio_files.append(str(audio))
+
+    # record against the live service, then replay with throttling and failures the scheduler has to absorb
+    recorder = RecordingTransport(fixture, transport=Mock(send=Mock(side_effect=_live)))
+    for audio_file in audio_files:
+        WatsonSTT("http://live", "1234", scheduler=RequestScheduler(rate=1000, transport=recorder)).transcribe(audio_file)
+
+    replay = ReplayTransport(fixture, latency=constant(0.01), throttle_rate=0.2, failure_rate=0.2, retry_after=0, seed=0)
+    scheduler = RequestScheduler(rate=1000, max_retries=10, backoff=0, transport=replay)
+    original, RequestScheduler._shared = RequestScheduler._shared, scheduler
+
+    try:
+        results = {audio_file: results for audio_file, _, results, error in evaluate("http://localhost", audio_files, ["1234"], workers=4)}
+    finally:
+        RequestScheduler._shared = original
+
+    assert [results[audio_file]['index'] for audio_file in audio_files] == list(range(8))
+    assert replay.stats()['requests'] == scheduler.stats()['requests']
+    assert replay.stats()['throttled'] + replay.stats()['failed'] > 0
+
+def test_transport_from_config(tmp_path):
+    fixture = tmp_path / "fixtures.jsonl"
+    fixture.write_text(json.dumps(_interaction('get', '/v1/customizations', {})) + '\n')
+
+    conf = tmp_path / "conf.ini"
+    conf.write_text(f"[TRANSPORT]\nmode = replay\nfixtures = {fixture}\nlatency = uniform 0 0.01\nseed = 1\n")
+
+    transport = transport_from_config(conf)
+
+    assert isinstance(transport, ReplayTransport)
+    assert transport_from_config(conf) is transport
+    assert RequestScheduler.from_config(conf).transport is transport
+    assert transport_from_config(tmp_path / "missing.ini") is None
+
+    with pytest.raises(ValueError):
+        parse_latency("gaussian 1")
@@ -0,0 +1,81 @@
+import json
+
+from unittest.mock import Mock, patch
+
+from cli.vocabulary import VocabularyCache, VocabularyIndex, tokenize
+
+def _response(body):
+    response = Mock()
+    response.status_code = 200
+    response.text = json.dumps(body)
+
+    return response
+
+def test_tokenize():
+    assert tokenize("Don't use IBM_Watson speech-to-text, OK?") == ["don't", "use", "ibm", "watson", "speech-to-text", "ok"]
+
+def test_coverage():
+    index = VocabularyIndex(["Kubernetes", "IBM_Watson", "speech-to-text", "the"])
+
+    assert "kubernetes" in index
+    assert "ibm watson" in index
+    assert "watson" not in index
+
+    report = index.coverage(["The IBM Watson speech-to-text runs on Kubernetes\n",
+                             "Watson runs on kubernetes\n"])
+
+    # 'watson' is covered inside the phrase only
+    assert report.tokens == 11
+    assert dict(report.uncovered) == {"runs": 2, "on": 2, "watson": 1}
+    assert report.top(1) == [("runs", 2)]
+    assert round(report.coverage, 2) == 0.55
+
+def test_longest_phrase_wins():
+    index = VocabularyIndex(["IBM_Watson", "IBM_Watson_Studio", "studio_one"])
+
+    report = index.coverage(["ibm watson studio one\n", "watson studio\n"])
+
+    # 'one' is not covered: 'studio' was taken by the longer phrase
+    assert dict(report.uncovered) == {"one": 1, "watson": 1, "studio": 1}
+
+def test_coverage_of_files(tmp_path):
+    corpus = tmp_path / "corpus.txt"
+    corpus.write_text("custom speech models\n" * 1000)
+
+    transcript = tmp_path / "reference.json"
+    transcript.write_text(json.dumps({"results": [{"alternatives": [{"transcript": "custom acoustic "}]}]}))
+
+    report = VocabularyIndex(["custom", "speech"]).coverage_of_files([corpus, transcript])
+
+    assert report.tokens == 3002
+    assert report.uncovered == {"models": 1000, "acoustic": 1}
+
+@patch('cli.scheduler.requests.get')
+def test_cache_refreshes_only_when_the_model_changed(mock, tmp_path):
+    details = {'customization_id': '1234', 'updated': '2026-01-01T00:00:00Z'}
+    words = {'words': [{'word': 'IBM_Watson', 'display_as': 'Watson', 'sounds_like': ['watson'], 'count': 2}]}
+    mock.side_effect = [_response(details), _response(words), _response(details)]
+
+    cache = VocabularyCache("http://localhost", api_key="key", directory=tmp_path)
+
+    assert cache.words("1234") == [{'word': 'IBM_Watson', 'display_as': 'Watson', 'count': 2}]
+    # unchanged: only the details of the model are requested
+    index = cache.index("1234")
+    assert mock.call_count == 3
+    assert mock.call_args_list[1][0][0] == "http://localhost/v1/customizations/1234/words"
+
+    assert "ibm watson" in index and "watson" in index
+
+    # without refresh the local copy is used as is
+    cache.words("1234", refresh=False)
+    assert mock.call_count == 3
+
+def test_base_vocabulary_is_merged(tmp_path):
+    base = tmp_path / "base.txt"
+    base.write_text("the\non\nruns\n")
+
+    index = VocabularyIndex(["Kubernetes"])
+    index.update(VocabularyIndex.from_file(base))
+
+    report = index.coverage(["The cluster runs on Kubernetes\n"])
+    assert dict(report.uncovered) == {"cluster": 1}
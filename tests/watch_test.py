@@ -0,0 +1,138 @@
+import json
+import pytest
+
+from threading import Event, Lock, Thread
+from time import monotonic, sleep
+
+from cli.deadline import Deadline
+from cli.journal import JobJournal
+from cli.watch import DirectorySink, FolderWatcher, JsonlSink
+
+class _FakePool(object):
+    """ Transcribes instantly, or waits until released, and tracks the transcriptions running at once """
+
+    def __init__(self, release=None, fail=()):
+        self.release = release
+        self.fail = fail
+        self.running = 0
+        self.max_running = 0
+        self._lock = Lock()
+
+    def transcribe(self, path, customization_id, deadline=None):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+        try:
+            if self.release is not None:
+                self.release.wait(5)
+
+            if path.endswith(self.fail):
+                raise Exception("Bad audio")
+
+            return {'results': [], 'audio': path}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+def _start(watcher):
+    deadline = Deadline(10)
+    thread = Thread(target=watcher.run, args=(deadline,))
+    thread.start()
+
+    return deadline, thread
+
+def _wait_for(condition):
+    until = monotonic() + 5
+    while not condition() and monotonic() < until:
+        sleep(0.01)
+
+    assert condition()
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watch_transcribes_new_files(tmp_path, use_inotify):
+    drop = tmp_path / "drop"
+    drop.mkdir()
+    (drop / "existing.wav").write_bytes(b"RIFF")
+
+    sink = JsonlSink(tmp_path / "out" / "results.jsonl")
+    watcher = FolderWatcher(drop, "http://localhost", "1234", sink, workers=2, settle=0.05, interval=0.02,
+                            pool=_FakePool(), journal=JobJournal("watch", directory=tmp_path / ".jobs"),
+                            use_inotify=use_inotify)
+    deadline, thread = _start(watcher)
+
+    try:
+        (drop / "notes.txt").write_text("not audio")
+        (drop / "new.wav").write_bytes(b"RIFF")
+
+        _wait_for(lambda: watcher.stats()['transcribed'] == 2)
+    finally:
+        deadline.cancel()
+        thread.join()
+
+    entries = [json.loads(line) for line in sink.path.read_text().splitlines()]
+    assert sorted(entry['audio_file'].split('/')[-1] for entry in entries) == ["existing.wav", "new.wav"]
+
+def test_watch_skips_completed_and_failed_files(tmp_path):
+    drop = tmp_path / "drop"
+    drop.mkdir()
+    (drop / "done.wav").write_bytes(b"RIFF")
+    (drop / "bad.wav").write_bytes(b"RIFF")
+
+    journal = JobJournal("watch", directory=tmp_path / ".jobs")
+    journal.record('watch', "done.wav", (drop / "done.wav").stat().st_mtime)
+
+    sink = DirectorySink(tmp_path / "out")
+    pool = _FakePool(fail=("bad.wav",))
+    watcher = FolderWatcher(drop, "http://localhost", "1234", sink, settle=0.05, interval=0.02, pool=pool,
+                            journal=journal, use_inotify=False)
+    deadline, thread = _start(watcher)
+
+    try:
+        _wait_for(lambda: watcher.stats()['failed'] == 1)
+        sleep(0.2)
+    finally:
+        deadline.cancel()
+        thread.join()
+
+    # the failed file is not retried in a loop, and the completed one is not sent again
+    assert watcher.stats()['failed'] == 1
+    assert watcher.stats()['transcribed'] == 0
+    assert (tmp_path / "out" / "bad.error.json").is_file()
+
+def test_watch_backpressure(tmp_path):
+    drop = tmp_path / "drop"
+    drop.mkdir()
+
+    for index in range(6):
+        (drop / f"audio{index}.wav").write_bytes(b"RIFF")
+
+    release = Event()
+    pool = _FakePool(release=release)
+    watcher = FolderWatcher(drop, "http://localhost", "1234", JsonlSink(tmp_path / "results.jsonl"), workers=2,
+                            queue_size=1, settle=0.05, interval=0.02, pool=pool,
+                            journal=JobJournal("watch", directory=tmp_path / ".jobs"), use_inotify=False)
+    picked = []
+    deadline = Deadline(10)
+    thread = Thread(target=watcher.run, args=(deadline, picked.append))
+    thread.start()
+
+    try:
+        _wait_for(lambda: pool.running == 2 and watcher.stats()['queued'] == 1)
+        sleep(0.1)
+
+        # 2 running, 1 queued and 1 waiting for a slot: the other files are left on disk
+        assert len(picked) == 4
+
+        release.set()
+        _wait_for(lambda: watcher.stats()['transcribed'] == 6)
+    finally:
+        deadline.cancel()
+        thread.join()
+
+    assert pool.max_running == 2
+    assert watcher.stats()['backpressure_seconds'] > 0
+
+def test_watch_missing_directory(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        FolderWatcher(tmp_path / "missing", "http://localhost", "1234", JsonlSink(tmp_path / "results.jsonl"))